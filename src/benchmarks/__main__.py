@@ -0,0 +1,94 @@
+"""
+Benchmarks of the library.
+    python -m src.benchmarks run [--quick] [--only NAME ...] [-o results.json]
+                                 [--flamegraph phases.folded]
+    python -m src.benchmarks compare old.json new.json [--threshold 0.1]
+compare exits with status 1 if a case regressed. See src.benchmarks.suite for the cases
+and python -m src.benchmarks.inverse for the modular inversion backends.
+"""
+
+import argparse
+import sys
+
+from src.utils.instrumentation import FlameGraph
+
+from . import harness, suite
+
+QUICK = {"ns": (8, 16), "ms": (1, 2, 4), "sizes": (2, 16, 128, 1024), "runs": 3}
+
+
+def run(args) -> int:
+    ns = args.n or (QUICK["ns"] if args.quick else suite.NS)
+    ms = args.m or (QUICK["ms"] if args.quick else suite.MS)
+    sizes = args.sizes or (QUICK["sizes"] if args.quick else suite.SIZES)
+    runs = args.runs or (QUICK["runs"] if args.quick else 5)
+
+    def keep(name: str) -> bool:
+        return not args.only or any(name.startswith(prefix) for prefix in args.only)
+
+    results = []
+    flame = FlameGraph(sizes=True) if args.flamegraph else None
+    print("{:<36} {:>10} {:>10} {:>10} {:>10}".format("case", "ops/s", "p50 ms", "p99 ms", "peak KiB"))
+    for name, params, f in suite.all_cases(ns, ms, sizes, keep):
+        result = harness.measure(name, f, params, runs, memory=not args.no_memory, tracer=flame)
+        results.append(result)
+        print(
+            "{:<36} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.0f}".format(
+                result.key, result.ops_per_s, result.p50 * 1e3, result.p99 * 1e3,
+                result.peak_memory / 1024,
+            )
+        )
+    if args.output:
+        harness.save(results, args.output)
+    if args.flamegraph:
+        with open(args.flamegraph, "w") as f:
+            f.write(flame.folded())
+    return 0
+
+
+def compare(args) -> int:
+    regressions, improvements, changes = harness.compare(
+        harness.load(args.old), harness.load(args.new), args.threshold, args.metric
+    )
+    for change in changes:
+        flag = "REGRESSION" if change in regressions else "improved" if change in improvements else ""
+        print(
+            "{:<36} {:>10.2f} {:>10.2f} ms  x{:.2f} {}".format(
+                change.key, change.old * 1e3, change.new * 1e3, change.ratio, flag
+            )
+        )
+    print("{} cases, {} regressions, {} improvements".format(len(changes), len(regressions), len(improvements)))
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_run = commands.add_parser("run", help="run the benchmarks")
+    parser_run.add_argument("--quick", action="store_true", help="small grid and 3 runs per case")
+    parser_run.add_argument("--n", type=int, nargs="+", help="bit sizes of the proofs")
+    parser_run.add_argument("--m", type=int, nargs="+", help="numbers of aggregated values")
+    parser_run.add_argument("--sizes", type=int, nargs="+", help="multiexp sizes")
+    parser_run.add_argument("--runs", type=int, help="timed runs per case (default 5)")
+    parser_run.add_argument("--only", nargs="+", help="run the cases whose name starts with one of these")
+    parser_run.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser_run.add_argument("-o", "--output", help="write the results as JSON to this file")
+    parser_run.add_argument(
+        "--flamegraph", help="write the time spent per protocol phase to this file, folded for flamegraph.pl"
+    )
+    parser_run.set_defaults(func=run)
+
+    parser_compare = commands.add_parser("compare", help="compare two JSON results")
+    parser_compare.add_argument("old")
+    parser_compare.add_argument("new")
+    parser_compare.add_argument("--threshold", type=float, default=0.1, help="relative change flagged (0.1 = 10%%)")
+    parser_compare.add_argument("--metric", choices=("p50", "p99"), default="p50")
+    parser_compare.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
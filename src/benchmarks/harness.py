@@ -0,0 +1,128 @@
+"""
+Timing of benchmark cases and comparison of two runs.
+A run is a list of results, saved as JSON:
+    {"version": 1, "results": [{"name": ..., "params": {...}, "runs": ..., "ops_per_s": ...,
+                                "p50": ..., "p99": ..., "peak_memory": ...}, ...]}
+Latencies are in seconds and peak_memory in bytes, as seen by tracemalloc.
+"""
+
+import json
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from src.utils.instrumentation import Tracer, add_tracer, remove_tracer
+
+RESULTS_VERSION = 1
+
+
+class Result(NamedTuple):
+    name: str
+    params: Dict[str, int]
+    runs: int
+    ops_per_s: float
+    p50: float
+    p99: float
+    peak_memory: int
+
+    @property
+    def key(self) -> str:
+        """Identifies the case across runs, e.g. prove/aggregated m=4 n=16"""
+        return " ".join([self.name] + ["{}={}".format(k, v) for k, v in sorted(self.params.items())])
+
+
+def percentile(xs: List[float], q: float) -> float:
+    """q-th percentile of xs, interpolated between the closest ranks"""
+    xs = sorted(xs)
+    k = (len(xs) - 1) * q / 100
+    i = int(k)
+    if i + 1 >= len(xs):
+        return xs[-1]
+    return xs[i] + (xs[i + 1] - xs[i]) * (k - i)
+
+
+def measure(
+    name: str,
+    f: Callable[[], object],
+    params: Optional[Dict[str, int]] = None,
+    runs: int = 5,
+    memory: bool = True,
+    tracer: Optional[Tracer] = None,
+) -> Result:
+    """
+    Times runs calls of f, after a warm-up call. The peak memory is measured on a
+    separate call, since tracemalloc slows the allocations down.
+    The tracer, if any, only receives the phases of the timed calls.
+    """
+    f()
+    latencies = []
+    if tracer is not None:
+        add_tracer(tracer)
+    try:
+        for _ in range(runs):
+            start = time.perf_counter()
+            f()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        if tracer is not None:
+            remove_tracer(tracer)
+    peak = 0
+    if memory:
+        tracemalloc.start()
+        try:
+            f()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return Result(
+        name,
+        dict(params or {}),
+        runs,
+        runs / sum(latencies),
+        percentile(latencies, 50),
+        percentile(latencies, 99),
+        peak,
+    )
+
+
+def save(results: List[Result], path: str):
+    with open(path, "w") as f:
+        json.dump(
+            {"version": RESULTS_VERSION, "results": [r._asdict() for r in results]}, f, indent=1
+        )
+
+
+def load(path: str) -> List[Result]:
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("version") != RESULTS_VERSION:
+        raise ValueError("Unsupported benchmark results version in {}".format(path))
+    return [Result(**r) for r in data["results"]]
+
+
+class Change(NamedTuple):
+    key: str
+    old: float
+    new: float
+
+    @property
+    def ratio(self) -> float:
+        """new / old latency, above 1 for a slowdown"""
+        return self.new / self.old if self.old else float("inf")
+
+
+def compare(old: List[Result], new: List[Result], threshold: float = 0.1, metric: str = "p50"):
+    """
+    Returns (regressions, improvements, changes) between two runs, comparing the given
+    latency metric of the cases present in both. A case regressed if it is more than
+    threshold slower (0.1 = 10%) and improved if it is more than threshold faster.
+    """
+    old_by_key = {r.key: r for r in old}
+    changes = [
+        Change(r.key, getattr(old_by_key[r.key], metric), getattr(r, metric))
+        for r in new
+        if r.key in old_by_key
+    ]
+    regressions = [c for c in changes if c.ratio > 1 + threshold]
+    improvements = [c for c in changes if c.ratio < 1 / (1 + threshold)]
+    return regressions, improvements, changes
@@ -0,0 +1,59 @@
+"""
+Micro-benchmark of the modular inversion backends against the original recursive egcd.
+Run with: python -m src.benchmarks.inverse
+"""
+
+import timeit
+from random import randint
+
+from src.pippenger import CURVE
+from src.utils.utils import (
+    DEFAULT_INVERSE_BACKEND,
+    INVERSE_BACKENDS,
+    gmpy2,
+    mod_inverse,
+)
+
+
+def recursive_egcd(a, b):
+    """The recursive extended euclid algorithm previously used by ModP.inv"""
+    if a == 0:
+        return (b, 0, 1)
+    else:
+        g, y, x = recursive_egcd(b % a, a)
+        return (g, x - (b // a) * y, y)
+
+
+def recursive_inverse(x, p):
+    g, a, _ = recursive_egcd(x, p)
+    if g != 1:
+        raise Exception("modular inverse does not exist")
+    return a % p
+
+
+def bench(f, xs, p, number=5):
+    """Returns the number of inversions per second of f on xs"""
+    t = min(timeit.repeat(lambda: [f(x, p) for x in xs], number=number, repeat=3))
+    return number * len(xs) / t
+
+
+def main(n=2000):
+    p = CURVE.q
+    xs = [randint(1, p - 1) for _ in range(n)]
+    results = [("recursive egcd", bench(recursive_inverse, xs, p))]
+    for name, backend in INVERSE_BACKENDS.items():
+        if name == "gmpy2" and gmpy2 is None:
+            continue
+        results.append((name, bench(backend, xs, p)))
+    # A proof inverts the same few challenges over and over
+    challenges = [xs[i % 8] for i in range(n)]
+    results.append(
+        (DEFAULT_INVERSE_BACKEND + " + cache, 8 distinct values", bench(mod_inverse, challenges, p))
+    )
+    base = results[0][1]
+    for name, rate in results:
+        print("{:<32} {:>12.0f} inv/s  x{:.1f}".format(name, rate, rate / base))
+
+
+if __name__ == "__main__":
+    main()
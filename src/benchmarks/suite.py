@@ -0,0 +1,164 @@
+"""
+Benchmark cases of the library, each one timing a single operation:
+    - generators/elliptic_hash, generators/derive: derivation of count generators
+    - multiexp, vector_commitment: over size random generators
+    - ipa/prove, ipa/verify: FastNIProver2 and Verifier2 over n generators
+    - prove/single, verify/single: NIRangeProver and RangeVerifier for n bits
+    - prove/aggregated, verify/aggregated: AggregNIRangeProver and AggregRangeVerifier
+      for m values of n bits
+Inputs are built once per case and are not timed. The cases of a family are only built if
+keep(name) is true for one of their names.
+"""
+
+import os
+from random import randint
+from typing import Callable, Dict, Iterator, Sequence, Tuple
+
+from src.innerproduct.inner_product_prover import FastNIProver2
+from src.innerproduct.inner_product_verifier import Verifier2
+from src.pippenger import CURVE, PipCURVE
+from src.rangeproofs import AggregNIRangeProver, AggregRangeVerifier, NIRangeProver, RangeVerifier
+from src.utils.commitments import commitment, vector_commitment
+from src.utils.elliptic_curve_hash import elliptic_hash
+from src.utils.generators import GeneratorSet, derive_generator
+from src.utils.utils import ModP, inner_product, mod_hash
+
+NS = (8, 16, 32, 64)
+MS = (1, 2, 4, 8, 16, 32)
+SIZES = tuple(2 ** k for k in range(1, 13))
+
+Case = Tuple[str, Dict[str, int], Callable[[], object]]
+Keep = Callable[[str], bool]
+
+
+def _keep_all(name: str) -> bool:
+    return True
+
+
+class Setup:
+    """Generators and points shared by all the cases, derived on demand"""
+
+    def __init__(self, seed: bytes = b"benchmarks"):
+        self.gs = GeneratorSet.get(seed + b"/gs")
+        self.hs = GeneratorSet.get(seed + b"/hs")
+        self.g, self.h, self.u = [derive_generator(seed, i) for i in range(3)]
+
+    def generators(self, size: int):
+        return self.gs.vector()[:size], self.hs.vector()[:size]
+
+
+def scalars(size: int) -> list:
+    return [ModP(randint(0, CURVE.q - 1), CURVE.q) for _ in range(size)]
+
+
+def generator_cases(count: int = 16, keep: Keep = _keep_all) -> Iterator[Case]:
+    if not (keep("generators/elliptic_hash") or keep("generators/derive")):
+        return
+    seed = os.urandom(10)
+    yield (
+        "generators/elliptic_hash",
+        {"count": count},
+        lambda: [elliptic_hash(str(i).encode() + seed, CURVE) for i in range(count)],
+    )
+    yield (
+        "generators/derive",
+        {"count": count},
+        lambda: [derive_generator(seed, i) for i in range(count)],
+    )
+
+
+def multiexp_cases(
+    setup: Setup, sizes: Sequence[int] = SIZES, keep: Keep = _keep_all
+) -> Iterator[Case]:
+    if not (keep("multiexp") or keep("vector_commitment")):
+        return
+    for size in sizes:
+        gs, hs = setup.generators(size)
+        gs, a, b = list(gs), scalars(size), scalars(size)
+        yield "multiexp", {"size": size}, lambda gs=gs, a=a: PipCURVE.multiexp(gs, a)
+        yield (
+            "vector_commitment",
+            {"size": size},
+            lambda gs=gs, hs=list(hs), a=a, b=b: vector_commitment(gs, hs, a, b),
+        )
+
+
+def ipa_cases(setup: Setup, ns: Sequence[int] = NS, keep: Keep = _keep_all) -> Iterator[Case]:
+    if not (keep("ipa/prove") or keep("ipa/verify")):
+        return
+    for n in ns:
+        g, h = [list(v) for v in setup.generators(n)]
+        a, b = scalars(n), scalars(n)
+        P = commitment(vector_commitment(g, h, a, b), setup.u, 1, inner_product(a, b))
+        proof = FastNIProver2(g, h, setup.u, P, a, b, CURVE).prove()
+        yield (
+            "ipa/prove",
+            {"n": n},
+            lambda g=g, h=h, P=P, a=a, b=b: FastNIProver2(g, h, setup.u, P, a, b, CURVE).prove(),
+        )
+        yield (
+            "ipa/verify",
+            {"n": n},
+            lambda g=g, h=h, P=P, proof=proof: Verifier2(g, h, setup.u, P, proof).verify(),
+        )
+
+
+def range_proof_cases(
+    setup: Setup, ns: Sequence[int] = NS, ms: Sequence[int] = MS, keep: Keep = _keep_all
+) -> Iterator[Case]:
+    g, h, u = setup.g, setup.h, setup.u
+    for n in ns if keep("prove/single") or keep("verify/single") else []:
+        gs, hs = [list(v) for v in setup.generators(n)]
+        v, gamma = ModP(randint(0, 2 ** n - 1), CURVE.q), mod_hash(os.urandom(10), CURVE.q)
+        V = commitment(g, h, v, gamma)
+
+        def prove_single(gs=gs, hs=hs, v=v, gamma=gamma, n=n):
+            return NIRangeProver(v, n, g, h, gs, hs, gamma, u, CURVE, os.urandom(10)).prove()
+
+        proof = prove_single()
+        yield "prove/single", {"n": n}, prove_single
+        yield (
+            "verify/single",
+            {"n": n},
+            lambda gs=gs, hs=hs, V=V, proof=proof: RangeVerifier(V, g, h, gs, hs, u, proof).verify(),
+        )
+    for n in ns if keep("prove/aggregated") or keep("verify/aggregated") else []:
+        for m in ms:
+            gs, hs = [list(v) for v in setup.generators(n * m)]
+            vs = [ModP(randint(0, 2 ** n - 1), CURVE.q) for _ in range(m)]
+            gammas = [mod_hash(os.urandom(10), CURVE.q) for _ in range(m)]
+            Vs = [commitment(g, h, v, gamma) for v, gamma in zip(vs, gammas)]
+
+            def prove_aggregated(gs=gs, hs=hs, vs=vs, gammas=gammas, n=n):
+                return AggregNIRangeProver(
+                    vs, n, g, h, gs, hs, gammas, u, CURVE, os.urandom(10)
+                ).prove()
+
+            proof = prove_aggregated()
+            yield "prove/aggregated", {"n": n, "m": m}, prove_aggregated
+            yield (
+                "verify/aggregated",
+                {"n": n, "m": m},
+                lambda gs=gs, hs=hs, Vs=Vs, proof=proof: AggregRangeVerifier(
+                    Vs, g, h, gs, hs, u, proof
+                ).verify(),
+            )
+
+
+def all_cases(
+    ns: Sequence[int] = NS,
+    ms: Sequence[int] = MS,
+    sizes: Sequence[int] = SIZES,
+    keep: Keep = _keep_all,
+) -> Iterator[Case]:
+    """All the cases whose name passes keep, built one family at a time"""
+    setup = Setup()
+    for cases in [
+        generator_cases(keep=keep),
+        multiexp_cases(setup, sizes, keep),
+        ipa_cases(setup, ns, keep),
+        range_proof_cases(setup, ns, ms, keep),
+    ]:
+        for name, params, f in cases:
+            if keep(name):
+                yield name, params, f
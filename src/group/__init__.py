@@ -0,0 +1,4 @@
+from .group import Group, MultIntModP, EC
+from .jacobian import JacobianEC
+
+__all__ = ["Group", "MultIntModP", "EC", "JacobianEC"]
@@ -0,0 +1,133 @@
+from abc import ABC, abstractmethod
+
+from src.utils.utils import ModP
+from fastecdsa.curve import Curve
+from fastecdsa.point import Point
+
+
+class Group(ABC):
+    def __init__(self, unit, order):
+        self.unit = unit
+        self.order = order
+
+    @abstractmethod
+    def mult(self, x, y):
+        pass
+
+    @abstractmethod
+    def inverse(self, x):
+        pass
+
+    def square(self, x):
+        return self.mult(x, x)
+
+    def power(self, x, e: int):
+        """Returns x^e by square-and-multiply, e >= 0"""
+        ans = self.unit
+        for bit in bin(e)[2:]:
+            ans = self.square(ans)
+            if bit == "1":
+                ans = self.mult(ans, x)
+        return ans
+
+    # Long computations (e.g. multiexps) lift the elements to the representation of
+    # self.internal, compute there and lower the result back. Groups without a faster
+    # representation are their own internal group.
+    @property
+    def internal(self) -> "Group":
+        return self
+
+    def lift(self, x):
+        return x
+
+    def lower(self, x):
+        return x
+
+    def lower_many(self, xs):
+        return [self.lower(x) for x in xs]
+
+    def sum_many(self, lists):
+        """Returns the product of the elements of every list, None for the empty ones"""
+        out = []
+        for elems in lists:
+            total = None
+            for x in elems:
+                total = x if total is None else self.mult(total, x)
+            out.append(total)
+        return out
+
+
+class MultIntModP(Group):
+    def __init__(self, p, order):
+        Group.__init__(self, ModP(1, p), order)
+
+    def mult(self, x, y):
+        return x * y
+
+    def inverse(self, x):
+        return x.inv()
+
+    def power(self, x, e: int):
+        return x ** e
+
+
+class EC(Group):
+    """
+    Group of the points of a curve, in affine coordinates.
+    Its internal group is the same curve in Jacobian coordinates, see JacobianEC.
+    """
+
+    def __init__(self, curve: Curve):
+        Group.__init__(self, curve.G.IDENTITY_ELEMENT, curve.q)
+        from .jacobian import JacobianEC
+
+        self.curve = curve
+        self._internal = JacobianEC(curve)
+
+    def mult(self, x, y):
+        return x + y
+
+    def inverse(self, x):
+        return -x
+
+    def power(self, x, e: int):
+        return e * x
+
+    @property
+    def internal(self) -> Group:
+        return self._internal
+
+    def lift(self, x: Point) -> tuple:
+        return self._internal.lift(x)
+
+    def lower(self, x: tuple) -> Point:
+        return self._internal.lower(x)
+
+    def lower_many(self, xs: list) -> list:
+        """Lowers all the elements of xs with a single inversion"""
+        return self._internal.lower_many(xs)
+
+    def add_many(self, xs: list, ys: list) -> list:
+        """Returns [x + y for x, y in zip(xs, ys)] with a single inversion"""
+        if len(xs) != len(ys):
+            raise Exception("Different number of points")
+        pairs = [(self._affine(x), self._affine(y)) for x, y in zip(xs, ys)]
+        return [
+            self.unit if S is None else Point(S[0], S[1], self.curve)
+            for S in self._internal.add_affine_many(pairs)
+        ]
+
+    @staticmethod
+    def _affine(P: Point):
+        return None if P.curve is None else (P.x, P.y)
+
+    def elem_to_cairo(p: Point) -> list[int]:
+        """
+            Take in an ec point and convert it into a cairo struct of type `EcPoint`
+            struct EcPoint:
+                member x : felt
+                member y : felt
+            end
+            @return a list of 2 felt elements
+        """
+        return [p.x, p.y]
@@ -0,0 +1,220 @@
+"""
+Points of a short Weierstrass curve y^2 = x^3 + a*x + b in Jacobian coordinates.
+The tuple (X, Y, Z) stands for the affine point (X / Z^2, Y / Z^3) and any tuple with
+Z = 0 for the identity. Additions and doublings need no field inversion: points are
+lifted from fastecdsa Points, added many times, and lowered back to affine once.
+Formulas from the Explicit-Formulas Database: dbl-2007-bl, add-2007-bl and madd-2007-bl
+(the latter when the second point has Z = 1, as lifted points do).
+Many points can also be normalized to Z = 1, or added in affine coordinates, with a
+single inversion shared through Montgomery's trick (see lower_many and sum_many).
+"""
+
+from fastecdsa.curve import Curve
+from fastecdsa.point import Point
+
+from src.utils.utils import _inverse_raw, batch_inverse_ints
+from .group import Group
+
+IDENTITY = (1, 1, 0)
+# Below this number of additions per round, sum_many adds in Jacobian coordinates since
+# the shared inversion would cost more than it saves
+BATCH_MIN = 16
+
+
+class JacobianEC(Group):
+    """Internal group of EC: same curve, elements are (X, Y, Z) tuples"""
+
+    def __init__(self, curve: Curve):
+        Group.__init__(self, IDENTITY, curve.q)
+        self.curve = curve
+        self.p = curve.p
+        self.a = curve.a % curve.p
+
+    def lift(self, P: Point) -> tuple:
+        if P.curve is None:
+            return IDENTITY
+        return (P.x, P.y, 1)
+
+    def lower(self, J: tuple) -> Point:
+        X, Y, Z = J
+        if Z == 0:
+            return Point.IDENTITY_ELEMENT
+        if Z == 1:
+            return Point(X, Y, self.curve)
+        p = self.p
+        zi = _inverse_raw(Z, p)
+        zi2 = zi * zi % p
+        return Point(X * zi2 % p, Y * zi2 * zi % p, self.curve)
+
+    def normalize_many(self, Js: list) -> list:
+        """Returns the elements of Js scaled to Z = 1 (Z = 0 for the identity), with one inversion"""
+        p = self.p
+        zs = [Z for _, _, Z in Js if Z not in (0, 1)]
+        zs_inv = iter(batch_inverse_ints(zs, p))
+        out = []
+        for X, Y, Z in Js:
+            if Z in (0, 1):
+                out.append(IDENTITY if Z == 0 else (X, Y, 1))
+                continue
+            zi = next(zs_inv)
+            zi2 = zi * zi % p
+            out.append((X * zi2 % p, Y * zi2 * zi % p, 1))
+        return out
+
+    def lower_many(self, Js: list) -> list:
+        """Same as [self.lower(J) for J in Js], with one inversion"""
+        return [
+            Point.IDENTITY_ELEMENT if Z == 0 else Point(X, Y, self.curve)
+            for X, Y, Z in self.normalize_many(Js)
+        ]
+
+    def add_affine_many(self, pairs: list) -> list:
+        """
+        Returns the sums P + Q of the pairs of affine points (x, y), with None standing
+        for the identity, as affine points or None. All the slopes share one inversion.
+        """
+        p = self.p
+        dens = []
+        for P, Q in pairs:
+            if P is None or Q is None:
+                continue
+            if P[0] != Q[0]:
+                dens.append(Q[0] - P[0])
+            elif P[1] == Q[1] and P[1]:
+                dens.append(2 * P[1])
+        dens_inv = iter(batch_inverse_ints(dens, p))
+        out = []
+        for P, Q in pairs:
+            if P is None or Q is None:
+                out.append(Q if P is None else P)
+                continue
+            x1, y1 = P
+            x2, y2 = Q
+            if x1 != x2:
+                lamb = (y2 - y1) * next(dens_inv) % p
+            elif y1 == y2 and y1:
+                lamb = (3 * x1 * x1 + self.a) * next(dens_inv) % p
+            else:
+                out.append(None)
+                continue
+            x3 = (lamb * lamb - x1 - x2) % p
+            out.append((x3, (lamb * (x1 - x3) - y1) % p))
+        return out
+
+    def sum_many(self, lists: list) -> list:
+        """
+        Returns the sum of the elements of every list, None for the empty ones.
+        Elements with Z = 1 are summed in affine coordinates by rounds of pairwise
+        additions across all the lists, each round sharing a single inversion.
+        """
+        current = []
+        rest = []
+        for elems in lists:
+            current.append([(X, Y) for X, Y, Z in elems if Z == 1])
+            rest.append(self._fold([J for J in elems if J[2] != 1]))
+        while sum(len(points) // 2 for points in current) >= BATCH_MIN:
+            pairs = [
+                (points[j], points[j + 1])
+                for points in current
+                for j in range(0, len(points) - 1, 2)
+            ]
+            sums = iter(self.add_affine_many(pairs))
+            current = [
+                [S for S in (next(sums) for _ in range(len(points) // 2)) if S is not None]
+                + points[len(points) - len(points) % 2 :]
+                for points in current
+            ]
+        out = []
+        for elems, points, other in zip(lists, current, rest):
+            if not elems:
+                out.append(None)
+                continue
+            total = self._fold([(x, y, 1) for x, y in points] + ([] if other is None else [other]))
+            out.append(IDENTITY if total is None else total)
+        return out
+
+    def _fold(self, elems: list):
+        """Sum of elems in Jacobian coordinates, None if elems is empty"""
+        total = None
+        for J in elems:
+            total = J if total is None else self.mult(total, J)
+        return total
+
+    def mult(self, x: tuple, y: tuple) -> tuple:
+        if x[2] == 0:
+            return y
+        if y[2] == 0:
+            return x
+        if y[2] == 1:
+            return self._madd(x, y)
+        if x[2] == 1:
+            return self._madd(y, x)
+        return self._add(x, y)
+
+    def square(self, x: tuple) -> tuple:
+        return self._double(x)
+
+    def inverse(self, x: tuple) -> tuple:
+        X, Y, Z = x
+        return (X, -Y % self.p, Z)
+
+    def _double(self, J: tuple) -> tuple:
+        """dbl-2007-bl"""
+        X1, Y1, Z1 = J
+        if Z1 == 0 or Y1 == 0:
+            return IDENTITY
+        p = self.p
+        XX = X1 * X1 % p
+        YY = Y1 * Y1 % p
+        YYYY = YY * YY % p
+        ZZ = Z1 * Z1 % p
+        S = 2 * ((X1 + YY) ** 2 - XX - YYYY) % p
+        M = (3 * XX + self.a * ZZ * ZZ) % p
+        X3 = (M * M - 2 * S) % p
+        Y3 = (M * (S - X3) - 8 * YYYY) % p
+        Z3 = ((Y1 + Z1) ** 2 - YY - ZZ) % p
+        return (X3, Y3, Z3)
+
+    def _add(self, J1: tuple, J2: tuple) -> tuple:
+        """add-2007-bl"""
+        X1, Y1, Z1 = J1
+        X2, Y2, Z2 = J2
+        p = self.p
+        Z1Z1 = Z1 * Z1 % p
+        Z2Z2 = Z2 * Z2 % p
+        U1 = X1 * Z2Z2 % p
+        U2 = X2 * Z1Z1 % p
+        S1 = Y1 * Z2 * Z2Z2 % p
+        S2 = Y2 * Z1 * Z1Z1 % p
+        H = (U2 - U1) % p
+        r = 2 * (S2 - S1) % p
+        if H == 0:
+            return self._double(J1) if r == 0 else IDENTITY
+        I = 4 * H * H % p
+        J = H * I % p
+        V = U1 * I % p
+        X3 = (r * r - J - 2 * V) % p
+        Y3 = (r * (V - X3) - 2 * S1 * J) % p
+        Z3 = ((Z1 + Z2) ** 2 - Z1Z1 - Z2Z2) * H % p
+        return (X3, Y3, Z3)
+
+    def _madd(self, J1: tuple, J2: tuple) -> tuple:
+        """madd-2007-bl, J2 has Z = 1"""
+        X1, Y1, Z1 = J1
+        X2, Y2, _ = J2
+        p = self.p
+        Z1Z1 = Z1 * Z1 % p
+        U2 = X2 * Z1Z1 % p
+        S2 = Y2 * Z1 * Z1Z1 % p
+        H = (U2 - X1) % p
+        r = 2 * (S2 - Y1) % p
+        if H == 0:
+            return self._double(J1) if r == 0 else IDENTITY
+        HH = H * H % p
+        I = 4 * HH % p
+        J = H * I % p
+        V = X1 * I % p
+        X3 = (r * r - J - 2 * V) % p
+        Y3 = (r * (V - X3) - 2 * Y1 * J) % p
+        Z3 = ((Z1 + H) ** 2 - Z1Z1 - HH) % p
+        return (X3, Y3, Z3)
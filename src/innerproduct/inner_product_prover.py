@@ -3,14 +3,30 @@
 from typing import Optional
 
 from src.innerproduct.inner_product_verifier import Proof1, Proof2
-from src.utils.commitments import vector_commitment
-from src.utils.utils import inner_product
+from src.utils.commitments import commitment, vector_commitment
+from src.utils.utils import ScalarVector
 from src.utils.transcript import Transcript
+from src.utils.instrumentation import phase
 
 
 class NIProver:
     """Class simulating a NI prover for the inner-product argument (Protocol 1)"""
-    def __init__(self, g, h, u, P, c, a, b, group, prime=None, seed=0):
+    def __init__(
+        self,
+        g,
+        h,
+        u,
+        P,
+        c,
+        a,
+        b,
+        group,
+        prime=None,
+        seed=0,
+        scalar_folding=False,
+        h_factors=None,
+        executor=None,
+    ):
         assert len(g) == len(h) == len(a) == len(b)
         self.g = g
         self.prime = group.q if prime is None else prime
@@ -21,6 +37,9 @@ class NIProver:
         self.a = a
         self.b = b
         self.group = group
+        self.scalar_folding = scalar_folding
+        self.h_factors = h_factors
+        self.executor = executor
         self.transcript = Transcript(seed)
 
     def prove(self) -> Proof1:
@@ -31,7 +50,7 @@ class NIProver:
         # x = mod_hash(self.transcript.digest, self.group.order)
         x = self.transcript.get_modp(self.prime)
         self.transcript.add_number(x)
-        P_new = self.P + (x * self.c) * self.u
+        P_new = commitment(self.P, self.u, 1, x * self.c)
         u_new = x * self.u
         Prov2 = FastNIProver2(
             self.g,
@@ -41,14 +60,39 @@ class NIProver:
             self.a,
             self.b,
             self.group,
-            self.transcript.digest,
+            prime=self.prime,
+            transcript=self.transcript.digest,
+            scalar_folding=self.scalar_folding,
+            h_factors=self.h_factors,
+            executor=self.executor,
         )
         return Proof1(u_new, P_new, Prov2.prove(), self.transcript.digest)
 
 
 class FastNIProver2:
-    """Class simulating a NI prover for the inner-product argument (Protocol 2)"""
-    def __init__(self, g, h, u, P, a, b, group, prime=None, transcript: Optional[list[int]]=None):
+    """
+    Class simulating a NI prover for the inner-product argument (Protocol 2)
+    With scalar_folding=True the generators are never folded: the prover keeps, for every
+    original generator, the product of the challenges applied to it so far and computes
+    L and R as multiexps over the original g and h (which may be FixedBaseTables).
+    In this mode the generators can be given as h_factors[i] * h[i] without computing
+    them, and L and R can be computed by a ParallelMultiexp executor holding g and h.
+    """
+    def __init__(
+        self,
+        g,
+        h,
+        u,
+        P,
+        a,
+        b,
+        group,
+        prime=None,
+        transcript: Optional[list[int]] = None,
+        scalar_folding=False,
+        h_factors=None,
+        executor=None,
+    ):
         assert len(g) == len(h) == len(a) == len(b)
         assert len(a) & (len(a) - 1) == 0
         self.log_n = len(a).bit_length() - 1
@@ -58,12 +102,15 @@ class FastNIProver2:
         self.h = h
         self.u = u
         self.P = P
-        self.a = a
-        self.b = b
+        self.a = a if isinstance(a, ScalarVector) else ScalarVector(a, self.prime)
+        self.b = b if isinstance(b, ScalarVector) else ScalarVector(b, self.prime)
         self.group = group
+        self.scalar_folding = scalar_folding or h_factors is not None or executor is not None
+        self.h_factors = h_factors
+        self.executor = executor
         self.transcript = Transcript()
         if transcript:
-            self.transcript.digest += transcript
+            self.transcript.extend(transcript)
             self.init_transcript_length = len(self.transcript.digest)
         else:
             self.init_transcript_length = 1
@@ -74,6 +121,8 @@ class FastNIProver2:
         Proves the inner-product argument following Protocol 2 in the paper
         Returns a Proof2 object.
         """
+        if self.scalar_folding:
+            return self._prove_scalar_folding()
         gp = self.g
         hp = self.h
         ap = self.a
@@ -95,18 +144,88 @@ class FastNIProver2:
                     self.init_transcript_length,
                 )
             np = len(ap) // 2
-            cl = inner_product(ap[:np], bp[np:])
-            cr = inner_product(ap[np:], bp[:np])
-            L = vector_commitment(gp[np:], hp[:np], ap[:np], bp[np:]) + cl * self.u
-            R = vector_commitment(gp[:np], hp[np:], ap[np:], bp[:np]) + cr * self.u
-            Ls.append(L)
-            Rs.append(R)
-            self.transcript.add_list_points([L, R])
-            # x = mod_hash(self.transcript.digest, self.group.order)
-            x = self.transcript.get_modp(self.prime)
-            xs.append(x)
-            self.transcript.add_number(x)
-            gp = [x.inv() * gi_fh + x * gi_sh for gi_fh, gi_sh in zip(gp[:np], gp[np:])]
-            hp = [x * hi_fh + x.inv() * hi_sh for hi_fh, hi_sh in zip(hp[:np], hp[np:])]
-            ap = [x * ai_fh + x.inv() * ai_sh for ai_fh, ai_sh in zip(ap[:np], ap[np:])]
-            bp = [x.inv() * bi_fh + x * bi_sh for bi_fh, bi_sh in zip(bp[:np], bp[np:])]
+            with phase("IPA round {}".format(len(xs) + 1), size=np):
+                cl = ap[:np].inner(bp[np:])
+                cr = ap[np:].inner(bp[:np])
+                L = commitment(vector_commitment(gp[np:], hp[:np], ap[:np], bp[np:]), self.u, 1, cl)
+                R = commitment(vector_commitment(gp[:np], hp[np:], ap[np:], bp[:np]), self.u, 1, cr)
+                Ls.append(L)
+                Rs.append(R)
+                self.transcript.add_list_points([L, R])
+                # x = mod_hash(self.transcript.digest, self.group.order)
+                x = self.transcript.get_modp(self.prime)
+                xs.append(x)
+                self.transcript.add_number(x)
+                x_inv = x.inv()
+                gp = [commitment(gi_fh, gi_sh, x_inv, x) for gi_fh, gi_sh in zip(gp[:np], gp[np:])]
+                hp = [commitment(hi_fh, hi_sh, x, x_inv) for hi_fh, hi_sh in zip(hp[:np], hp[np:])]
+                ap = ap.fold(x, x_inv)
+                bp = bp.fold(x_inv, x)
+
+    def _prove_scalar_folding(self):
+        """
+        Same proof as prove(), without point multiplications in the folding.
+        After k rounds, the current generator gp[j] is sum(g_scalars[i] * g[i]) over the
+        original indices i with i % len(gp) == j, and likewise for hp.
+        """
+        ap = self.a
+        bp = self.b
+        n = self.n
+        q = self.prime
+        g_scalars = [1] * n
+        h_scalars = [1] * n if self.h_factors is None else ScalarVector(self.h_factors, q).xs
+
+        xs = []
+        Ls = []
+        Rs = []
+
+        while len(ap) > 1:
+            np = len(ap) // 2
+            with phase("IPA round {}".format(len(xs) + 1), size=np):
+                cl = ap[:np].inner(bp[np:])
+                cr = ap[np:].inner(bp[:np])
+                a_, b_ = ap.xs, bp.xs
+                # Position of each original generator in the current half vectors
+                pos = [i % (2 * np) for i in range(n)]
+                L_coefs = (
+                    [a_[r - np] * s % q if r >= np else 0 for r, s in zip(pos, g_scalars)],
+                    [b_[r + np] * s % q if r < np else 0 for r, s in zip(pos, h_scalars)],
+                )
+                R_coefs = (
+                    [a_[r + np] * s % q if r < np else 0 for r, s in zip(pos, g_scalars)],
+                    [b_[r - np] * s % q if r >= np else 0 for r, s in zip(pos, h_scalars)],
+                )
+                if self.executor is None:
+                    L = vector_commitment(self.g, self.h, *L_coefs)
+                    R = vector_commitment(self.g, self.h, *R_coefs)
+                else:
+                    pending = [self.executor.submit(*L_coefs), self.executor.submit(*R_coefs)]
+                    L, R = [p.result() for p in pending]
+                L = commitment(L, self.u, 1, cl)
+                R = commitment(R, self.u, 1, cr)
+                Ls.append(L)
+                Rs.append(R)
+                self.transcript.add_list_points([L, R])
+                x = self.transcript.get_modp(self.prime)
+                xs.append(x)
+                self.transcript.add_number(x)
+                x_inv = x.inv()
+                xi, xi_inv = x.x, x_inv.x
+                g_scalars = [
+                    s * xi_inv % q if r < np else s * xi % q for r, s in zip(pos, g_scalars)
+                ]
+                h_scalars = [
+                    s * xi % q if r < np else s * xi_inv % q for r, s in zip(pos, h_scalars)
+                ]
+                ap = ap.fold(x, x_inv)
+                bp = bp.fold(x_inv, x)
+
+        return Proof2(
+            ap[0],
+            bp[0],
+            xs,
+            Ls,
+            Rs,
+            self.transcript.digest,
+            self.init_transcript_length,
+        )
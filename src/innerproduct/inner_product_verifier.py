@@ -5,9 +5,17 @@ from src.pippenger import CURVE
 from src.group import EC
 from src.utils.cairo_constants import PROOF_VAR_NAME
 
+from src.utils.commitments import commitment
 from src.utils.transcript import Transcript
-from src.utils.utils import ModP
+from src.utils.utils import ModP, batch_inverse
+from src.utils.serialization import (
+    INNER_PRODUCT_PROOF_1,
+    INNER_PRODUCT_PROOF_2,
+    ProofReader,
+    ProofWriter,
+)
 from src.pippenger import PipCURVE
+from src.utils.instrumentation import phase
 
 SUPERCURVE: Curve = CURVE
 
@@ -21,6 +29,38 @@ class Proof1:
         self.proof2 = proof2
         self.transcript = transcript
 
+    def write(self, writer: ProofWriter):
+        writer.int(self.transcript[0])
+        writer.point(self.u_new)
+        writer.point(self.P_new)
+        self.proof2.write(writer)
+
+    @classmethod
+    def read(cls, reader: ProofReader) -> "Proof1":
+        """Decodes a proof written by write, recomputing its transcript as NIProver does"""
+        transcript = Transcript(reader.int())
+        x = transcript.get_modp(reader.prime)
+        transcript.add_number(x)
+        u_new = reader.point()
+        P_new = reader.point()
+        proof2 = Proof2.read(reader, transcript.digest)
+        return cls(u_new, P_new, proof2, transcript.digest)
+
+    def to_bytes(self) -> bytes:
+        """Binary encoding of the proof, see src.utils.serialization"""
+        writer = ProofWriter()
+        self.write(writer)
+        return writer.to_bytes(INNER_PRODUCT_PROOF_1)
+
+    @classmethod
+    def from_bytes(cls, data, curve=CURVE, prime=None) -> "Proof1":
+        reader = ProofReader.from_bytes(
+            data, INNER_PRODUCT_PROOF_1, curve, curve.q if prime is None else prime
+        )
+        proof = cls.read(reader)
+        reader.end()
+        return proof
+
 
 class Verifier1:
     """Verifier class for Protocol 1"""
@@ -43,8 +83,7 @@ class Verifier1:
         """Verify a transcript to assure Fiat-Shamir was done properly"""
         lTranscript = self.proof1.transcript
         self.assertThat(
-            lTranscript[1]
-            == Transcript.digest_to_hash(lTranscript[:1], self.prime)
+            lTranscript[1] == Transcript.prefix_hashes(lTranscript, [1], self.prime)[0]
         )
 
     def verify(self):
@@ -54,7 +93,7 @@ class Verifier1:
         lTranscript = self.proof1.transcript
         x = lTranscript[1]
         x = ModP(x, self.prime)
-        self.assertThat(self.proof1.P_new == self.P + (x * self.c) * self.u)
+        self.assertThat(self.proof1.P_new == commitment(self.P, self.u, 1, x * self.c))
         self.assertThat(self.proof1.u_new == x * self.u)
 
         Verif2 = Verifier2(
@@ -78,6 +117,53 @@ class Proof2:
             start_transcript
         )  # Start of transcript to be used if Protocol 2 is run in Protocol 1
 
+    def write(self, writer: ProofWriter):
+        writer.scalar(self.a)
+        writer.scalar(self.b)
+        writer.byte(len(self.Ls))
+        writer.points(self.Ls)
+        writer.points(self.Rs)
+
+    @classmethod
+    def read(cls, reader: ProofReader, transcript=None) -> "Proof2":
+        """
+        Decodes a proof written by write. The challenges and the transcript are recomputed
+        as FastNIProver2 does, transcript being the one it was given
+        """
+        a = reader.scalar()
+        b = reader.scalar()
+        rounds = reader.byte()
+        Ls = reader.points(rounds)
+        Rs = reader.points(rounds)
+        lTranscript = Transcript()
+        if transcript:
+            lTranscript.extend(transcript)
+            start_transcript = len(lTranscript.digest)
+        else:
+            start_transcript = 1
+        xs = []
+        for L, R in zip(Ls, Rs):
+            lTranscript.add_list_points([L, R])
+            x = lTranscript.get_modp(reader.prime)
+            xs.append(x)
+            lTranscript.add_number(x)
+        return cls(a, b, xs, Ls, Rs, lTranscript.digest, start_transcript)
+
+    def to_bytes(self) -> bytes:
+        """Binary encoding of the proof, see src.utils.serialization"""
+        writer = ProofWriter()
+        self.write(writer)
+        return writer.to_bytes(INNER_PRODUCT_PROOF_2)
+
+    @classmethod
+    def from_bytes(cls, data, transcript=None, curve=CURVE, prime=None) -> "Proof2":
+        reader = ProofReader.from_bytes(
+            data, INNER_PRODUCT_PROOF_2, curve, curve.q if prime is None else prime
+        )
+        proof = cls.read(reader, transcript)
+        reader.end()
+        return proof
+
     def convert_to_cairo(self, ids, memory, segments, n_elems):
         """
            Convert the transcript into a cairo so that the verifier can 
@@ -107,17 +193,21 @@ class Verifier2:
             raise Exception("Proof invalid")
 
     def get_ss(self, xs):
-        """See page 15 in paper"""
+        """
+        See page 15 in paper
+        s_i only differs from s_(i - 2^k), with 2^k the most significant bit of i,
+        by a factor x_j^2, so each s_i costs a single multiplication
+        """
         n = len(self.g)
         log_n = n.bit_length() - 1
-        ss = []
-        for i in range(1, n + 1):
-            tmp = ModP(1, self.prime)
-            for j in range(0, log_n):
-                b = 1 if bin(i - 1)[2:].zfill(log_n)[j] == "1" else -1
-                curr_mult= xs[j] if b == 1 else xs[j].inv()
-                tmp *= curr_mult
-            ss.append(tmp)
+        tmp = ModP(1, self.prime)
+        for xi_inv in batch_inverse(xs):
+            tmp *= xi_inv
+        xs_sq = [xi * xi for xi in xs]
+        ss = [tmp]
+        for i in range(1, n):
+            k = i.bit_length() - 1
+            ss.append(ss[i - (1 << k)] * xs_sq[log_n - 1 - k])
         return ss
 
     def verify_transcript(self):
@@ -129,37 +219,44 @@ class Verifier2:
         Rs = self.proof.Rs
         xs = self.proof.xs
         lTranscript = self.proof.transcript
+        self.assertThat(len(lTranscript) >= init_len + 3 * log_n)
+        # The challenges of all the rounds are recomputed in a single pass
+        hashes = Transcript.prefix_hashes(
+            lTranscript, [init_len + i * 3 + 2 for i in range(log_n)], self.prime
+        )
         for i in range(log_n):
             self.assertThat(lTranscript[init_len + i * 3] == Ls[i])
             self.assertThat(lTranscript[init_len + i * 3 + 1] == Rs[i])
-            self.assertThat(
-                xs[i]
-                == lTranscript[init_len + i * 3 + 2]
-                ==
-                Transcript.digest_to_hash(
-                    lTranscript[: init_len + i * 3 + 2],
-                    self.prime,
-                )
-            )
+            self.assertThat(xs[i] == lTranscript[init_len + i * 3 + 2] == hashes[i])
 
     def verify(self):
-        """Verifies the proof given by a prover. Raises an execption if it is invalid"""
-        self.verify_transcript()
+        """
+        Verifies the proof given by a prover. Raises an execption if it is invalid
+        The rounds are checked at once: their challenges are recomputed in one pass over
+        the transcript, and their L and R are part of a single equation.
+        """
+        n = len(self.g)
+        with phase("IPA challenges", rounds=len(self.proof.Ls)):
+            self.verify_transcript()
 
         proof = self.proof
         Pip = PipCURVE
-        ss = self.get_ss(self.proof.xs)
-        LHS = Pip.multiexp(
-            self.g + self.h + [self.u],
-            [proof.a * ssi for ssi in ss]
-            + [proof.b * ssi.inv() for ssi in ss]
-            + [proof.a * proof.b],
-        )
-        RHS = self.P + Pip.multiexp(
-            proof.Ls + proof.Rs,
-            [xi ** 2 for xi in proof.xs] + [xi.inv() ** 2 for xi in proof.xs],
-        )
+        with phase("IPA scalars", size=n):
+            ss = self.get_ss(self.proof.xs)
+            xs_inv = batch_inverse(proof.xs)
+        # s_(n-1-i) has all the bits of s_i flipped, hence is its inverse
+        with phase("IPA multiexp", size=2 * n + 1):
+            LHS = Pip.multiexp(
+                self.g + self.h + [self.u],
+                [proof.a * ssi for ssi in ss]
+                + [proof.b * ssi_inv for ssi_inv in reversed(ss)]
+                + [proof.a * proof.b],
+            )
+        with phase("IPA rounds", rounds=len(proof.Ls)):
+            RHS = self.P + Pip.multiexp(
+                proof.Ls + proof.Rs,
+                [xi ** 2 for xi in proof.xs] + [xi_inv ** 2 for xi_inv in xs_inv],
+            )
 
         self.assertThat(LHS == RHS)
-        print("OK")
         return True
@@ -1,9 +1,13 @@
-from .pippenger import Pippenger
+from .pippenger import Pippenger, STRATEGIES, register_strategy
 from src.group import EC
 from .curve import CURVE as _CURVE
+from .fixed_base import FixedBaseTable, FixedBasePoint
+from .parallel import ParallelMultiexp, pickle_points
+from .straus import linear_combination, straus, wnaf
 
 
 PipCURVE = Pippenger(EC(_CURVE))
 CURVE = _CURVE
 
-__all__ = ["Pippenger", "EC", "PipCURVE", "CURVE"]
+__all__ = ["Pippenger", "STRATEGIES", "register_strategy", "EC", "PipCURVE", "CURVE", "FixedBaseTable", "FixedBasePoint", "ParallelMultiexp",
+           "pickle_points", "linear_combination", "straus", "wnaf"]
@@ -0,0 +1,156 @@
+"""Precomputed tables for multiplications by fixed generators"""
+
+from fastecdsa.point import Point
+from fastecdsa.util import validate_type
+
+from src.group import EC
+from .curve import CURVE
+from .pippenger import Pippenger, register_strategy
+
+
+class FixedBaseTable:
+    """
+    Vector of generators with the multiples 2^(c*j) * g_i precomputed for every window j.
+    A multiexp over the table shares a single set of buckets across all windows and
+    needs no doublings, so the per-call cost is about N * (lambda / c) additions.
+    The table behaves like a list of points: indexing returns the generators and
+    slicing or concatenating tables returns new tables sharing the precomputation.
+    """
+
+    def __init__(self, gs, window=None, pippenger=None):
+        self.pip = Pippenger(EC(CURVE)) if pippenger is None else pippenger
+        self.window = self.window_size(len(gs)) if window is None else window
+        self.n_windows = (self.pip.lamb + self.window - 1) // self.window
+        self.rows = self._rows(gs)
+
+    @classmethod
+    def _from_rows(cls, rows, window, pippenger):
+        table = cls.__new__(cls)
+        table.pip = pippenger
+        table.window = window
+        table.n_windows = (pippenger.lamb + window - 1) // window
+        table.rows = rows
+        return table
+
+    def window_size(self, N):
+        """Window minimizing the N * lambda / c additions plus the 2^(c+1) of the bucket sum"""
+        lamb = self.pip.lamb
+        return min(
+            range(1, 17), key=lambda c: N * ((lamb + c - 1) // c) + (1 << (c + 1))
+        )
+
+    def _rows(self, gs):
+        """
+        The multiples of every g, doubled in the internal group and lowered back to group
+        elements all at once
+        """
+        group = self.pip.group
+        multiples = []
+        for g in gs:
+            J = group.lift(g)
+            for _ in range(1, self.n_windows):
+                J = self.pip._pow2powof2(J, self.window)
+                multiples.append(J)
+        multiples = iter(group.lower_many(multiples))
+        return [[g] + [next(multiples) for _ in range(1, self.n_windows)] for g in gs]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return (row[0] for row in self.rows)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return FixedBaseTable._from_rows(self.rows[i], self.window, self.pip)
+        return self.rows[i][0]
+
+    def __add__(self, other):
+        if isinstance(other, FixedBaseTable) and other.window == self.window:
+            return FixedBaseTable._from_rows(self.rows + other.rows, self.window, self.pip)
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def multiexp(self, es):
+        """Returns sum es[i] * gs[i]"""
+        if len(es) != len(self.rows):
+            raise Exception("Different number of group elements and exponents")
+        c = self.window
+        mask = (1 << c) - 1
+        G, lift = self.pip.G, self.pip.group.lift
+        buckets = [[] for _ in range(mask)]
+        for row, e in zip(self.rows, es):
+            e = e % G.order
+            k = 0
+            while e:
+                d = e & mask
+                if d:
+                    buckets[d - 1].append(lift(row[k]))
+                e >>= c
+                k += 1
+        total = self.pip._sum_buckets(G.sum_many(buckets))
+        return self.pip.group.lower(G.unit if total is None else total)
+
+
+@register_strategy("fixed")
+def _fixed(pip, gs, es):
+    """Multiexp over a FixedBaseTable, other sequences get a table built for the call"""
+    if not isinstance(gs, FixedBaseTable):
+        gs = FixedBaseTable(gs, pippenger=pip)
+    return gs.multiexp(es)
+
+
+class FixedBasePoint(Point):
+    """
+    Point with a precomputed table d * 2^(w*j) * P for all digits d and windows j.
+    Scalar multiplications then cost lambda / w additions and no doublings.
+    It can be used anywhere a Point is expected, e.g. as g, h or u in commitments.
+    """
+
+    def __init__(self, x, y, curve=CURVE, window=6):
+        Point.__init__(self, x, y, curve)
+        self.window = window
+        n_windows = (curve.q.bit_length() + window - 1) // window
+        # The multiples are computed in Jacobian coordinates and lowered all at once
+        J = self._jacobian = EC(curve).internal
+        multiples = []
+        base = J.lift(Point(x, y, curve))
+        for _ in range(n_windows):
+            row = [base]
+            for _ in range(2, 1 << window):
+                row.append(J.mult(row[-1], base))
+            multiples += row
+            # row[-1] + base = 2^w * base, normalized to keep the cheaper mixed additions
+            base = J.normalize_many([J.mult(row[-1], base)])[0]
+        multiples = J.lower_many(multiples)
+        size = (1 << window) - 1
+        self.table = [multiples[j : j + size] for j in range(0, len(multiples), size)]
+
+    @classmethod
+    def from_point(cls, P: Point, window=6):
+        return cls(P.x, P.y, P.curve, window)
+
+    def __mul__(self, scalar: int):
+        validate_type(scalar, int)
+        return self._jacobian.lower(self._multiple(scalar))
+
+    def _multiple(self, scalar) -> tuple:
+        """scalar * self in Jacobian coordinates, one mixed addition per window"""
+        J = self._jacobian
+        e = scalar % self.curve.q
+        w = self.window
+        mask = (1 << w) - 1
+        ans = J.unit
+        j = 0
+        while e:
+            d = e & mask
+            if d:
+                ans = J.mult(ans, J.lift(self.table[j][d - 1]))
+            e >>= w
+            j += 1
+        return ans
+
+    def __rmul__(self, scalar: int):
+        return self.__mul__(scalar)
@@ -0,0 +1,131 @@
+"""Multiexps over a fixed set of generators split across a pool of processes"""
+
+import copyreg
+import io
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from fastecdsa.point import Point
+
+from .curve import CURVE
+from .fixed_base import FixedBasePoint
+
+
+def _rebuild_point(x, y, curve):
+    # Unpickled curves are copies, but fastecdsa compares points with `curve is other.curve`
+    if curve is None:
+        return Point.IDENTITY_ELEMENT
+    if curve.name == CURVE.name:
+        curve = CURVE
+    return Point(x, y, curve)
+
+
+def _reduce_point(P):
+    return _rebuild_point, (P.x, P.y, P.curve)
+
+
+def pickle_points(obj) -> bytes:
+    """
+    Pickles obj with the points reduced to their coordinates, for the worker processes:
+    pickle.loads rebuilds them on the module's curve. The reducers are scoped to this
+    pickler, the pickling of points elsewhere in the process is left untouched.
+    """
+    f = io.BytesIO()
+    pickler = pickle.Pickler(f)
+    pickler.dispatch_table = copyreg.dispatch_table.copy()
+    pickler.dispatch_table[Point] = _reduce_point
+    # Tables of fixed points are not worth shipping, they are sent as plain points
+    pickler.dispatch_table[FixedBasePoint] = _reduce_point
+    pickler.dump(obj)
+    return f.getvalue()
+
+
+# Generators of the worker process, set once by the pool initializer
+_worker_gs = None
+_worker_hs = None
+
+
+def _init_worker(generators: bytes):
+    global _worker_gs, _worker_hs
+    _worker_gs, _worker_hs = pickle.loads(generators)
+
+
+def _commit_chunk(start, a, b):
+    """
+    Returns sum a[i] * gs[start + i] + b[i] * hs[start + i] in the worker, as its
+    coordinates (None for the identity)
+    """
+    from src.utils.commitments import vector_commitment
+
+    stop = start + len(a)
+    P = vector_commitment(_worker_gs[start:stop], _worker_hs[start:stop], a, b)
+    return None if P.curve is None else (P.x, P.y)
+
+
+class PendingMultiexp:
+    """Result of a multiexp whose chunks are still being computed by the pool"""
+
+    def __init__(self, futures, curve=CURVE):
+        self.futures = futures
+        self.curve = curve
+
+    def result(self) -> Point:
+        total = Point.IDENTITY_ELEMENT
+        for f in self.futures:
+            xy = f.result()
+            if xy is not None:
+                total = total + Point(*xy, self.curve)
+        return total
+
+
+class ParallelMultiexp:
+    """
+    Process pool computing vector commitments sum a_i * gs_i + b_i * hs_i over fixed gs and hs.
+    The generators (lists of points or FixedBaseTables) are sent to every worker once,
+    when the pool starts. A commitment is split into chunks over ranges of generators
+    which are computed by the workers and summed, and independent commitments can be
+    submitted together so that their chunks run concurrently.
+    """
+
+    def __init__(self, gs, hs, workers=None, min_chunk=32):
+        assert len(gs) == len(hs)
+        self.size = len(gs)
+        self.workers = os.cpu_count() if workers is None else workers
+        self.min_chunk = min_chunk
+        self.curve = next((P.curve for P in gs if P.curve is not None), CURVE)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, initargs=(pickle_points((gs, hs)),)
+        )
+
+    def submit(self, a, b, offset=0) -> PendingMultiexp:
+        """
+        Schedules sum a_i * gs_(offset+i) + b_i * hs_(offset+i)
+        and returns a PendingMultiexp.
+        """
+        assert len(a) == len(b) and offset + len(a) <= self.size
+        a = [x if isinstance(x, int) else x.x for x in a]
+        b = [x if isinstance(x, int) else x.x for x in b]
+        n = len(a)
+        n_chunks = max(1, min(self.workers, n // self.min_chunk))
+        bounds = [n * k // n_chunks for k in range(n_chunks + 1)]
+        return PendingMultiexp(
+            [
+                self.executor.submit(_commit_chunk, offset + lo, a[lo:hi], b[lo:hi])
+                for lo, hi in zip(bounds, bounds[1:])
+                if hi > lo
+            ],
+            self.curve,
+        )
+
+    def vector_commitment(self, a, b, offset=0) -> Point:
+        return self.submit(a, b, offset).result()
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,16 +1,61 @@
 from sympy import integer_nthroot
 from math import log2, floor
 from itertools import combinations
+from random import randrange
+from time import perf_counter
+
+from src.utils import instrumentation
 
 def subset_of(l):
     return sum(map(lambda r: list(combinations(l, r)), range(1, len(l)+1)), [])
 
+
+# Multiexp strategies by name, see register_strategy
+STRATEGIES = {}
+
+
+def register_strategy(name):
+    """
+    Registers f(pip, gs, es) -> Prod gs[i]^es[i] as a multiexp strategy usable through
+    Pippenger.multiexp(gs, es, method=name). gs and the result are elements of pip.group.
+    """
+
+    def decorator(f):
+        STRATEGIES[name] = f
+        return f
+
+    return decorator
+
+
 class Pippenger:
-    def __init__(self, group):
-        self.G = group
+    """
+    Multi-exponentiation over a group, with the strategy selectable per call through
+    `method` (see STRATEGIES):
+        - "naive": one exponentiation per element
+        - "straus": interleaved wNAF exponentiations sharing their squarings
+        - "subset": the original subset-table algorithm
+        - "bucket": signed-digit bucket method
+        - "fixed": precomputed tables, for gs given as a FixedBaseTable
+        - "auto" (default): picks one from the number of elements, see select
+    The elements are lifted to the internal group of `group` (e.g. Jacobian coordinates
+    for EC) and only the result is lowered back, the engines and the helpers below work
+    on elements of self.G = group.internal.
+    """
+
+    # Default strategies of the auto selector: (largest N, strategy), None for no bound.
+    # Measured on the Starknet curve, run calibrate to adapt them to other groups or hosts.
+    DEFAULT_THRESHOLDS = [(1, "naive"), (32, "straus"), (None, "bucket")]
+
+    def __init__(self, group, method="auto", thresholds=None):
+        if method != "auto" and method not in STRATEGIES:
+            raise ValueError("Unknown multiexp method: {}".format(method))
+        self.group = group
+        self.G = group.internal
         self.order = group.order
         self.lamb = group.order.bit_length()
-    
+        self.method = method
+        self.thresholds = list(self.DEFAULT_THRESHOLDS if thresholds is None else thresholds)
+
     # Returns g^(2^j)
     def _pow2powof2(self, g, j):
         tmp = g
@@ -19,7 +64,63 @@ class Pippenger:
         return tmp
 
     # Returns Prod g_i ^ e_i
-    def multiexp(self, gs, es):
+    def multiexp(self, gs, es, method=None):
+        if len(gs) != len(es):
+            raise Exception('Different number of group elements and exponents')
+
+        method = self.method if method is None else method
+        if method == "auto":
+            method = self.select(gs)
+        if method not in STRATEGIES:
+            raise ValueError("Unknown multiexp method: {}".format(method))
+        if instrumentation.active is not None:
+            instrumentation.active.multiexp(len(gs))
+        return STRATEGIES[method](self, gs, es)
+
+    def select(self, gs) -> str:
+        """Strategy used by "auto" for the elements gs"""
+        from .fixed_base import FixedBaseTable
+
+        if isinstance(gs, FixedBaseTable):
+            return "fixed"
+        N = len(gs)
+        for bound, method in self.thresholds:
+            if bound is None or N <= bound:
+                return method
+        return self.thresholds[-1][1]
+
+    def calibrate(self, gs, sizes=None, methods=("naive", "straus", "bucket"), repeat=3):
+        """
+        Times the methods on the first N elements of gs for every N in sizes (powers of 2
+        up to len(gs) by default), with random exponents, and sets the thresholds of the
+        auto selector to the fastest method of each size.
+        Returns the timings as {N: {method: best time in seconds}}.
+        """
+        sizes = sizes or [1 << k for k in range(len(gs).bit_length()) if 1 << k <= len(gs)]
+        timings = {}
+        for N in sorted(sizes):
+            es = [randrange(self.order) for _ in range(N)]
+            timings[N] = {}
+            for method in methods:
+                best = None
+                for _ in range(repeat):
+                    start = perf_counter()
+                    self.multiexp(gs[:N], es, method=method)
+                    elapsed = perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                timings[N][method] = best
+        thresholds = []
+        for N in sorted(timings):
+            fastest = min(timings[N], key=timings[N].get)
+            if thresholds and thresholds[-1][1] == fastest:
+                thresholds[-1] = (N, fastest)
+            else:
+                thresholds.append((N, fastest))
+        thresholds[-1] = (None, thresholds[-1][1])
+        self.thresholds = thresholds
+        return timings
+
+    def multiexp_subset(self, gs, es):
         if len(gs) != len(es):
             raise Exception('Different number of group elements and exponents')
 
@@ -47,7 +148,7 @@ class Pippenger:
                     tmp2.append(int( bin(es[i])[2:].zfill(s*t)[-(j+s*k+1)]) )
                 tmp1.append(tmp2)
             es_bin.append(tmp1)
-        
+
         Gs = self._multiexp_bin(
                 [gs_bin[i][j] for i in range(N) for j in range(s)],
                 [es_bin[i][j] for i in range(N) for j in range(s)]
@@ -59,7 +160,7 @@ class Pippenger:
             ans2 = self.G.mult(ans2, Gs[k])
 
         return ans2
-        
+
     def _multiexp_bin(self, gs, es):
         assert len(gs) == len(es)
         M = len(gs)
@@ -79,7 +180,7 @@ class Pippenger:
                     T[sub] = self.G.mult(T[sub[:-1]], gs[sub[-1]])
             for sub in T:
                 set_sub(sub)
-            
+
         Gs = []
         for k in range(len(es[0])):
             tmp = self.G.unit
@@ -90,8 +191,109 @@ class Pippenger:
                     continue
                 tmp = self.G.mult(tmp, T[sub_es])
             Gs.append(tmp)
-            
+
         return Gs
 
-            
+    def window_size(self, N):
+        """
+        Bucket window size (in bits) for a multiexp of N terms.
+        Minimizes the number of windows times the per-window cost N + 2^c.
+        """
+        return min(
+            range(2, 17),
+            key=lambda c: ((self.lamb + c - 1) // c + 1) * (N + (1 << c)),
+        )
+
+    @staticmethod
+    def signed_digits(e, c, n_windows):
+        """
+        Recode e into n_windows signed digits in [-2^(c-1), 2^(c-1)]
+        such that e = sum(d_k * 2^(c*k))
+        """
+        digits = []
+        mask = (1 << c) - 1
+        half = 1 << (c - 1)
+        carry = 0
+        for _ in range(n_windows):
+            d = (e & mask) + carry
+            e >>= c
+            if d > half:
+                d -= 1 << c
+                carry = 1
+            else:
+                carry = 0
+            digits.append(d)
+        return digits
+
+    def multiexp_bucket(self, gs, es):
+        """
+        Bucket method with signed digits.
+        Each window of c bits costs N group operations plus 2^c operations
+        to sum the 2^(c-1) buckets, with memory bounded by 2^(c-1) elements.
+        """
+        if len(gs) != len(es):
+            raise Exception('Different number of group elements and exponents')
+
+        es = [ei % self.G.order for ei in es]
+        pairs = [(g, e) for g, e in zip(gs, es) if e]
+        if not pairs:
+            return self.G.unit
+
+        c = self.window_size(len(pairs))
+        # One extra window absorbs the carry of the top digit
+        n_windows = (self.lamb + c - 1) // c + 1
+        digits = [self.signed_digits(e, c, n_windows) for _, e in pairs]
+        negs = [None] * len(pairs)
+
+        ans = None
+        for k in range(n_windows - 1, -1, -1):
+            if ans is not None:
+                ans = self._pow2powof2(ans, c)
+            buckets = [[] for _ in range(1 << (c - 1))]
+            for i, (g, _) in enumerate(pairs):
+                d = digits[i][k]
+                if d == 0:
+                    continue
+                if d < 0:
+                    if negs[i] is None:
+                        negs[i] = self.G.inverse(g)
+                    g, d = negs[i], -d
+                buckets[d - 1].append(g)
+            # The group may add the contents of all the buckets at once (see JacobianEC)
+            window = self._sum_buckets(self.G.sum_many(buckets))
+            if window is not None:
+                ans = window if ans is None else self.G.mult(ans, window)
+
+        return self.G.unit if ans is None else ans
+
+    def _sum_buckets(self, buckets):
+        """Returns Prod buckets[d-1]^d using the running sum trick"""
+        running = None
+        total = None
+        for b in reversed(buckets):
+            if b is not None:
+                running = b if running is None else self.G.mult(running, b)
+            if running is not None:
+                total = running if total is None else self.G.mult(total, running)
+        return total
+
+
+@register_strategy("naive")
+def _naive(pip, gs, es):
+    group = pip.group
+    ans = group.unit
+    for g, e in zip(gs, es):
+        e = e % pip.order
+        if e:
+            ans = group.mult(ans, group.power(g, e))
+    return ans
+
+
+@register_strategy("subset")
+def _subset(pip, gs, es):
+    return pip.group.lower(pip.multiexp_subset([pip.group.lift(g) for g in gs], es))
+
 
+@register_strategy("bucket")
+def _bucket(pip, gs, es):
+    return pip.group.lower(pip.multiexp_bucket([pip.group.lift(g) for g in gs], es))
@@ -2,10 +2,22 @@ from .rangeproof_prover import NIRangeProver
 from .rangeproof_verifier import RangeVerifier
 from .rangeproof_aggreg_prover import AggregNIRangeProver
 from .rangeproof_aggreg_verifier import AggregRangeVerifier
+from .batch_verifier import BatchRangeVerifier
+from .batch_prover import prove_many, RangeProofParams, ProvingStats
+from .archive import ProofArchive, ProofArchiveWriter
+from .challenge_powers import ChallengePowers, delta
 
 __all__ = [
     "NIRangeProver",
     "RangeVerifier",
     "AggregNIRangeProver",
     "AggregRangeVerifier",
+    "BatchRangeVerifier",
+    "prove_many",
+    "RangeProofParams",
+    "ProvingStats",
+    "ProofArchive",
+    "ProofArchiveWriter",
+    "ChallengePowers",
+    "delta",
 ]
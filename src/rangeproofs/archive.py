@@ -0,0 +1,163 @@
+"""
+Files storing many range proofs with the commitments they are about.
+
+Layout of an archive:
+    - the magic bytes b"BPARCHV1"
+    - the records, each one is the number m of commitments (1 byte), the m compressed
+      commitments and the encoded proof (see src.utils.serialization)
+    - the index: the offset of every record as a big-endian uint64
+    - the footer: offset of the index, number of records and the magic bytes b"BPIX"
+An archive without its index (e.g. a writer that was not closed) can still be read,
+the index is then rebuilt by scanning the records. A partly written last record is
+skipped.
+"""
+
+import mmap
+import struct
+from typing import Iterator, List, Tuple
+
+from src.pippenger import CURVE
+from src.utils.serialization import POINT_SIZE, RANGE_PROOF, ProofReader, read_header
+from src.utils.utils import Point, bytes_to_point, point_to_bytes
+from .rangeproof_verifier import Proof
+
+MAGIC = b"BPARCHV1"
+INDEX_MAGIC = b"BPIX"
+OFFSET = struct.Struct(">Q")
+FOOTER = struct.Struct(">QQ4s")
+
+
+class ProofArchiveWriter:
+    """Appends proofs to a new archive, the index is written by close()"""
+
+    def __init__(self, path: str):
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        self.offsets = []
+
+    def append(self, Vs, proof: Proof):
+        """Adds a proof with its commitments Vs (a list, or a single point for m = 1)"""
+        Vs = Vs if isinstance(Vs, (list, tuple)) else [Vs]
+        if not 0 < len(Vs) < 256:
+            raise ValueError("A record holds between 1 and 255 commitments")
+        self.offsets.append(self.file.tell())
+        self.file.write(bytes([len(Vs)]) + b"".join(point_to_bytes(V) for V in Vs))
+        self.file.write(proof.to_bytes())
+
+    def close(self):
+        if self.file.closed:
+            return
+        index_offset = self.file.tell()
+        self.file.write(b"".join(OFFSET.pack(offset) for offset in self.offsets))
+        self.file.write(FOOTER.pack(index_offset, len(self.offsets), INDEX_MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ProofArchive:
+    """
+    Memory-mapped reader of an archive.
+    Iterating decodes the proofs lazily, one record at a time, and archive[i] decodes
+    the i-th proof through the offset index. Nothing but the index is loaded in memory.
+    """
+
+    def __init__(self, path: str, curve=CURVE, prime=None):
+        self.curve = curve
+        self.prime = curve.q if prime is None else prime
+        self.file = open(path, "rb")
+        try:
+            self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # e.g. an empty file
+            self.file.close()
+            raise
+        if self.mmap[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("Not a proof archive")
+        self._read_index()
+
+    def _read_index(self):
+        size = len(self.mmap)
+        if size >= len(MAGIC) + FOOTER.size:
+            index_offset, count, magic = FOOTER.unpack_from(self.mmap, size - FOOTER.size)
+            if magic == INDEX_MAGIC and index_offset + count * OFFSET.size == size - FOOTER.size:
+                self.index_offset, self.count = index_offset, count
+                self._offsets = None
+                return
+        # No index, find the records by scanning the file up to the first incomplete one
+        offsets = []
+        offset = len(MAGIC)
+        while offset < size:
+            try:
+                end = self._record_end(offset)
+            except ValueError:
+                break
+            offsets.append(offset)
+            offset = end
+        self.index_offset, self.count = offset, len(offsets)
+        self._offsets = offsets
+
+    def _offset(self, i: int) -> int:
+        if self._offsets is not None:
+            return self._offsets[i]
+        return OFFSET.unpack_from(self.mmap, self.index_offset + i * OFFSET.size)[0]
+
+    def _record_end(self, offset: int) -> int:
+        start = offset + 1 + self.mmap[offset] * POINT_SIZE
+        with memoryview(self.mmap) as view:
+            _, body, end = read_header(view, start)
+            body.release()
+        return end
+
+    def _record(self, offset: int) -> Tuple[List[Point], Proof]:
+        """Decodes the record at offset, the views of the map are released before returning"""
+        starts = [offset + 1 + k * POINT_SIZE for k in range(self.mmap[offset])]
+        with memoryview(self.mmap) as view:
+            Vs = [bytes_to_point(view[k : k + POINT_SIZE], self.curve) for k in starts]
+            kind, body, _ = read_header(view, offset + 1 + len(starts) * POINT_SIZE)
+            if kind != RANGE_PROOF:
+                raise ValueError("Expected a range proof, got kind {}".format(kind))
+            reader = ProofReader(body, self.curve, self.prime)
+            proof = Proof.read(reader)
+            reader.end()
+            reader.view.release()
+            body.release()
+        return Vs, proof
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i: int) -> Proof:
+        return self.record(i)[1]
+
+    def record(self, i: int) -> Tuple[List[Point], Proof]:
+        """Returns the commitments and the proof of the i-th record"""
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("Record index out of range")
+        return self._record(self._offset(i))
+
+    def records(self) -> Iterator[Tuple[List[Point], Proof]]:
+        """Yields the commitments and the proof of every record"""
+        for i in range(self.count):
+            yield self._record(self._offset(i))
+
+    def __iter__(self) -> Iterator[Proof]:
+        for _, proof in self.records():
+            yield proof
+
+    def close(self):
+        self.mmap.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,115 @@
+import os
+import pickle
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from src.pippenger import FixedBasePoint, FixedBaseTable, pickle_points
+from src.utils.utils import ModP, Point
+from .rangeproof_prover import NIRangeProver
+from .rangeproof_verifier import Proof
+
+
+class RangeProofParams(NamedTuple):
+    """Public parameters shared by the proofs of n bits, with len(gs) == len(hs) == n"""
+
+    n: int
+    g: Point
+    h: Point
+    gs: List[Point]
+    hs: List[Point]
+    u: Point
+    group: object
+
+
+class ProvingStats:
+    """Number of proofs and elapsed time of a prove_many call, updated as proofs are produced"""
+
+    def __init__(self):
+        self.count = 0
+        self.start = None
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Proofs per second"""
+        return self.count / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return "{} proofs in {:.2f}s ({:.2f} proofs/s)".format(
+            self.count, self.elapsed, self.throughput
+        )
+
+
+# Parameters of the worker process, with the tables built once by the pool initializer
+_worker_params = None
+
+
+def _init_worker(params: bytes, fixed_base: bool):
+    global _worker_params
+    params = pickle.loads(params)
+    if fixed_base:
+        params = params._replace(
+            g=FixedBasePoint.from_point(params.g),
+            h=FixedBasePoint.from_point(params.h),
+            gs=FixedBaseTable(params.gs),
+            hs=FixedBaseTable(params.hs),
+        )
+    _worker_params = params
+
+
+def _prove(index, v, gamma, seed):
+    n, g, h, gs, hs, u, group = _worker_params
+    # Folding scalars instead of points pays off with tables for gs and hs
+    scalar_folding = isinstance(gs, FixedBaseTable)
+    Prov = NIRangeProver(v, n, g, h, gs, hs, gamma, u, group, seed, scalar_folding)
+    return index, pickle_points(Prov.prove())
+
+
+def prove_many(
+    values: Iterable,
+    blindings: Iterable,
+    params: RangeProofParams,
+    workers: Optional[int] = None,
+    seeds: Optional[Iterable[bytes]] = None,
+    fixed_base: bool = True,
+    stats: Optional[ProvingStats] = None,
+) -> Iterator[Tuple[int, Proof]]:
+    """
+    Generates single value range proofs of values[i] with the blindings[i] over a pool of
+    workers processes, and yields the pairs (i, proof) in order of completion.
+    Each worker precomputes fixed-base tables of the generators once (unless fixed_base is
+    False) and reuses them for all its proofs. The proofs use random seeds unless seeds
+    are given. values and blindings are consumed lazily, at most 2 * workers proofs are
+    in flight at any time. If given, stats is updated after every proof.
+    """
+    workers = os.cpu_count() if workers is None else workers
+    stats = ProvingStats() if stats is None else stats
+    q = params.group.q
+    jobs = enumerate(zip(values, blindings))
+    seeds = None if seeds is None else iter(seeds)
+    pending = set()
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(pickle_points(params), fixed_base)
+    ) as executor:
+
+        def submit_next() -> bool:
+            job = next(jobs, None)
+            if job is None:
+                return False
+            i, (v, gamma) = job
+            seed = os.urandom(32) if seeds is None else next(seeds)
+            pending.add(executor.submit(_prove, i, ModP(v, q), ModP(gamma, q), seed))
+            return True
+
+        stats.start = time.perf_counter()
+        while len(pending) < 2 * workers and submit_next():
+            pass
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stats.count += 1
+                stats.elapsed = time.perf_counter() - stats.start
+                index, proof = future.result()
+                yield index, pickle.loads(proof)
+                submit_next()
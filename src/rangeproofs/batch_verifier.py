@@ -0,0 +1,100 @@
+import secrets
+from typing import List, Tuple
+
+from fastecdsa.point import Point
+
+from src.pippenger import CURVE, PipCURVE
+from src.utils.generators import generator_prefix
+from .rangeproof_aggreg_verifier import MAX_GENERATORS, AggregRangeVerifier, proof_size
+from .rangeproof_verifier import Proof
+
+
+class BatchRangeVerifier:
+    """
+    Verifier for many (aggregated) range proofs sharing the same generators.
+    The range check and the inner-product check of every proof are combined
+    with random weights into a single multiexp over the shared generators
+    g, h, u, gs, hs plus the points specific to each proof.
+    A proof of n*m bits uses the first n*m elements of gs and hs, which can be
+    GeneratorVectors grown to the largest proof. Proofs of more than max_size bits, or
+    not of n bits per value if n is given, are invalid (see proof_size).
+    """
+
+    def __init__(
+        self, g, h, gs, hs, u, proofs: List[Tuple[object, Proof]], prime=None, n=None,
+        max_size=MAX_GENERATORS,
+    ):
+        self.g = g
+        self.h = h
+        self.u = u
+        self.n = n
+        self.max_size = max_size
+        self.proofs = [
+            (Vs if isinstance(Vs, (list, tuple)) else [Vs], proof)
+            for Vs, proof in proofs
+        ]
+        sizes = [proof_size(proof, len(Vs), n, max_size) for Vs, proof in self.proofs]
+        nm = max([nm for nm in sizes if nm is not None], default=1)
+        self.gs = generator_prefix(gs, nm)
+        self.hs = generator_prefix(hs, nm)
+        self.prime = CURVE.q if prime is None else prime
+
+    def assertThat(self, expr: bool):
+        """Assert that expr is truthy else raise exception"""
+        if not expr:
+            raise Exception("Proof invalid")
+
+    def verify(self):
+        """Verifies all the proofs at once. Raises an exception if any of them is invalid"""
+        self.assertThat(self._check(range(len(self.proofs))))
+        return True
+
+    def find_invalid(self) -> List[int]:
+        """Returns the indices of the invalid proofs, found by bisection"""
+        return self._bisect(list(range(len(self.proofs))))
+
+    def _bisect(self, indices):
+        if not indices or self._check(indices):
+            return []
+        if len(indices) == 1:
+            return indices
+        mid = len(indices) // 2
+        return self._bisect(indices[:mid]) + self._bisect(indices[mid:])
+
+    def _check(self, indices) -> bool:
+        q = self.prime
+        g_coef = h_coef = u_coef = 0
+        gs_coef = [0] * len(self.gs)
+        hs_coef = [0] * len(self.hs)
+        points = []
+        scalars = []
+        for i in indices:
+            Vs, proof = self.proofs[i]
+            try:
+                terms = self._proof_terms(Vs, proof)
+            except Exception:
+                return False
+            g_c, h_c, u_c, gs_c, hs_c, proof_points, proof_scalars = terms
+            w = secrets.randbelow(q - 1) + 1
+            g_coef += w * g_c
+            h_coef += w * h_c
+            u_coef += w * u_c
+            for j, (gc, hc) in enumerate(zip(gs_c, hs_c)):
+                gs_coef[j] += w * gc
+                hs_coef[j] += w * hc
+            points += proof_points
+            scalars += [w * s for s in proof_scalars]
+        total = PipCURVE.multiexp(
+            [self.g, self.h, self.u] + list(self.gs) + list(self.hs) + points,
+            [g_coef, h_coef, u_coef] + gs_coef + hs_coef + scalars,
+        )
+        return total == Point.IDENTITY_ELEMENT
+
+    def _proof_terms(self, Vs, proof: Proof):
+        """Returns the fused verification equation of one proof, see AggregRangeVerifier.get_fused_terms"""
+        nm = proof_size(proof, len(Vs), self.n, self.max_size)
+        self.assertThat(nm is not None and nm <= len(self.gs) and nm <= len(self.hs))
+        RangeVerif = AggregRangeVerifier(
+            Vs, self.g, self.h, self.gs[:nm], self.hs[:nm], self.u, proof, self.n, self.max_size
+        )
+        return RangeVerif.get_fused_terms()
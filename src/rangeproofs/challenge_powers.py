@@ -0,0 +1,77 @@
+from functools import cached_property, lru_cache
+
+from src.utils.utils import ModP, ScalarVector, _inverse_raw
+
+
+@lru_cache(maxsize=64)
+def two_powers(n: int, p: int) -> ScalarVector:
+    """Returns (1, 2, ..., 2^(n-1)) mod p, shared by all the proofs of n bits"""
+    return ScalarVector.powers(2, n, p)
+
+
+def delta(y: ModP, z: ModP, n: int, m: int = 1) -> ModP:
+    """
+    delta(y, z) = (z - z^2) * sum(y^i, i < nm) - sum(z^(j+2), 1 <= j <= m) * (2^n - 1),
+    the part of t(x)'s constant term known to the verifier. Both sums are geometric
+    series, computed in closed form with a single inversion.
+    """
+    p = y.p
+    yx, zx = y.x % p, z.x % p
+    # sum(y^i, i < nm) = y_num / y_den and sum(z^j, j < m) = z_num / z_den
+    y_num, y_den = pow(yx, n * m, p) - 1, yx - 1
+    z_num, z_den = pow(zx, m, p) - 1, zx - 1
+    # A series of 1s sums to its length
+    if y_den == 0:
+        y_num, y_den = n * m, 1
+    if z_den == 0:
+        z_num, z_den = m, 1
+    inv = _inverse_raw(y_den * z_den, p)
+    y_sum = y_num * z_den * inv
+    z_sum = z_num * y_den * inv
+    return ModP(((zx - zx * zx) * y_sum - pow(zx, 3, p) * z_sum * ((1 << n) - 1)) % p, p)
+
+
+class ChallengePowers:
+    """
+    Powers of the challenges y and z of a range proof of m values of n bits, each series
+    computed once by successive multiplications when first used:
+        y_n      (1, y, ..., y^(nm-1))
+        y_inv_n  (1, y^-1, ..., y^-(nm-1))
+        z_j      (z^2, ..., z^(m+1)), z_j[j] weighs the j-th value
+        two_n    (1, 2, ..., 2^(n-1))
+        z_two    z^(2 + i//n) * 2^(i%n) for i < nm
+    The provers and the verifiers share one instance per proof instead of computing
+    y ** i and z ** (2 + j) element by element.
+    """
+
+    def __init__(self, y: ModP, z: ModP, n: int, m: int = 1):
+        self.y = y
+        self.z = z
+        self.n = n
+        self.m = m
+        self.p = y.p
+
+    @cached_property
+    def y_n(self) -> ScalarVector:
+        return ScalarVector.powers(self.y, self.n * self.m, self.p)
+
+    @cached_property
+    def y_inv_n(self) -> ScalarVector:
+        return ScalarVector.powers(self.y.inv(), self.n * self.m, self.p)
+
+    @cached_property
+    def z_j(self) -> ScalarVector:
+        return ScalarVector.powers(self.z, self.m, self.p) * (self.z * self.z)
+
+    @property
+    def two_n(self) -> ScalarVector:
+        return two_powers(self.n, self.p)
+
+    @cached_property
+    def z_two(self) -> ScalarVector:
+        two_n = self.two_n
+        return ScalarVector.concat([two_n * zj for zj in self.z_j.xs])
+
+    def delta(self) -> ModP:
+        """delta(y, z) of the proof, see delta"""
+        return delta(self.y, self.z, self.n, self.m)
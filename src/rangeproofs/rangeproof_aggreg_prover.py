@@ -1,8 +1,11 @@
 from typing import List
-from src.utils.utils import Point, ModP, inner_product, mod_hash
+from src.utils.utils import Point, ModP, ScalarVector, mod_hash_many
 from src.utils.transcript import Transcript
 from src.utils.commitments import vector_commitment, commitment
+from src.utils.generators import generator_prefix
+from src.utils.instrumentation import phase
 from .rangeproof_verifier import Proof
+from .challenge_powers import ChallengePowers
 from src.innerproduct.inner_product_prover import NIProver
 from src.pippenger import PipCURVE
 
@@ -20,20 +23,31 @@ class AggregNIRangeProver:
         u: Point,
         group,
         seed: bytes = 0,
+        executor=None,
     ):
+        """
+        If executor is a ParallelMultiexp over gs and hs, the multiexps of A, S, P
+        and of the inner-product rounds are computed by its pool of processes.
+        gs and hs can be GeneratorVectors, of which the first n * m generators are used.
+        """
         self.vs = vs
         self.n = n
         self.g = g
         self.h = h
-        self.gs = gs
-        self.hs = hs
+        self.gs = generator_prefix(gs, n * len(vs))
+        self.hs = generator_prefix(hs, n * len(vs))
         self.gammas = gammas
         self.u = u
         self.group = group
         self.transcript = Transcript(seed)
         self.m = len(vs)
+        self.executor = executor
 
     def prove(self):
+        with phase("prove", n=self.n, m=self.m):
+            return self._prove()
+
+    def _prove(self):
         vs = self.vs
         n = self.n
         m = self.m
@@ -41,45 +55,54 @@ class AggregNIRangeProver:
         hs = self.hs
         h = self.h
 
+        q = self.group.q
         aL = []
         for v in vs:
             aL += list(map(int, reversed(bin(v.x)[2:].zfill(n))))[:n]
-        aR = [
-            (x - 1) % self.group.q for x in aL
-        ]  # TODO implement inverse of elliptic curve point  to compute -1 * g instead of multiplying by p-1
+        aL = ScalarVector(aL, q)
+        aR = aL - 1
 
-        alpha = mod_hash(b"alpha" + self.transcript.digest, self.group.q)
-        A = vector_commitment(gs, hs, aL, aR) + alpha * h
-        sL = [
-            mod_hash(str(i).encode() + self.transcript.digest, self.group.q)
-            for i in range(n * m)
-        ]
-        sR = [
-            mod_hash(str(i).encode() + self.transcript.digest, self.group.q)
-            for i in range(n * m, 2 * n * m)
-        ]
-        rho = mod_hash(str(2 * n).encode() + self.transcript.digest, self.group.q)
-        S = vector_commitment(gs, hs, sL, sR) + rho * h
+        # The blinding factors are derived from the transcript, which holds the seed, keyed
+        # with the witness: the seed is part of the proof, the blindings must not be
+        # computable from it
+        secret = Transcript.digest_to_bytes(list(vs) + list(self.gammas))
+        transcript_bytes = secret + self.transcript.to_bytes()
+        alpha, rho = mod_hash_many(b"alpha/rho" + transcript_bytes, 2, q)
+        sL = mod_hash_many(b"sL" + transcript_bytes, n * m, q)
+        sR = mod_hash_many(b"sR" + transcript_bytes, n * m, q)
+        with phase("A/S commit", size=n * m):
+            if self.executor is None:
+                A = vector_commitment(gs, hs, aL, aR)
+                S = vector_commitment(gs, hs, sL, sR)
+            else:
+                pending = [self.executor.submit(aL, aR), self.executor.submit(sL, sR)]
+                A, S = [p.result() for p in pending]
+            A = commitment(A, h, 1, alpha)
+            S = commitment(S, h, 1, rho)
         self.transcript.add_list_points([A, S])
         y = self.transcript.get_modp(self.group.q)
         self.transcript.add_number(y)
         z = self.transcript.get_modp(self.group.q)
         self.transcript.add_number(z)
+        powers = ChallengePowers(y, z, n, m)
 
-        t1, t2 = self._get_polynomial_coeffs(aL, aR, sL, sR, y, z)
-        tau1 = mod_hash(b"tau1" + self.transcript.digest, self.group.q)
-        tau2 = mod_hash(b"tau2" + self.transcript.digest, self.group.q)
-        T1 = commitment(self.g, h, t1, tau1)
-        T2 = commitment(self.g, h, t2, tau2)
+        with phase("t1/t2", size=n * m):
+            t1, t2 = self._get_polynomial_coeffs(aL, aR, sL, sR, powers)
+            tau1, tau2 = mod_hash_many(b"tau" + secret + self.transcript.to_bytes(), 2, q)
+            T1 = commitment(self.g, h, t1, tau1)
+            T2 = commitment(self.g, h, t2, tau2)
         self.transcript.add_list_points([T1, T2])
         x = self.transcript.get_modp(self.group.q)
         self.transcript.add_number(x)
-        taux, mu, t_hat, ls, rs = self._final_compute(
-            aL, aR, sL, sR, y, z, x, tau1, tau2, alpha, rho
-        )
+        with phase("l/r", size=n * m):
+            taux, mu, t_hat, ls, rs = self._final_compute(
+                aL, aR, sL, sR, powers, x, tau1, tau2, alpha, rho
+            )
 
         # return Proof(taux, mu, t_hat, ls, rs, T1, T2, A, S), x,y,z
-        hsp = [(y.inv() ** i) * hs[i] for i in range(n * m)]
+        if self.executor is not None:
+            innerProof = self._parallel_inner_proof(A, S, x, powers, mu, t_hat, ls, rs)
+            return Proof(taux, mu, t_hat, T1, T2, A, S, innerProof, self.transcript.digest)
         # P = (
         #     A
         #     + x * S
@@ -89,58 +112,62 @@ class AggregNIRangeProver:
         #         Point(None, None, None),
         #     )
         # )
-        P = (
-            A
-            + x * S
-            + PipCURVE.multiexp(
+        with phase("P", size=n * m):
+            hsp = [
+                yi_inv * hi
+                for yi_inv, hi in zip(powers.y_inv_n, hs)
+            ]
+            P = commitment(A, S, 1, x) + PipCURVE.multiexp(
                 gs + hsp,
                 [-z for _ in range(n * m)]
-                + [
-                    (z * (y ** i)) + (z ** (2 + (i // self.n))) * (2 ** (i % self.n))
-                    for i in range(n * m)
-                ],
+                + list(powers.y_n * z + powers.z_two),
             )
-        )
-        InnerProv = NIProver(gs, hsp, self.u, P + (-mu) * h, t_hat, ls, rs, self.group)
-        innerProof = InnerProv.prove()
-
-        ### DEBUG ###
-        delta_yz = (z - z ** 2) * sum(
-            [y ** i for i in range(n * m)], ModP(0, self.group.q)
-        ) - sum(
-            [(z ** (j + 2)) * ModP(2 ** n - 1, self.group.q) for j in range(1, m + 1)]
-        )
-        t0 = sum([vs[j] * (z ** (2 + j)) for j in range(m)]) + delta_yz
-        ### DEBUG ###
+        with phase("IPA", size=n * m):
+            InnerProv = NIProver(
+                gs, hsp, self.u, commitment(P, h, 1, -mu), t_hat, ls, rs, self.group
+            )
+            innerProof = InnerProv.prove()
         return Proof(taux, mu, t_hat, T1, T2, A, S, innerProof, self.transcript.digest)
 
-    def _get_polynomial_coeffs(self, aL, aR, sL, sR, y, z):
-        t1 = inner_product(
-            sL,
-            [
-                (y ** i) * (aR[i] + z)
-                + (z ** (2 + (i // self.n))) * (2 ** (i % self.n))
-                for i in range(self.n * self.m)
-            ],
-        ) + inner_product(
-            [aL[i] - z for i in range(self.n * self.m)],
-            [(y ** i) * sR[i] for i in range(self.n * self.m)],
+    def _parallel_inner_proof(self, A, S, x, powers, mu, t_hat, ls, rs):
+        """
+        Inner-product proof over the generators gs and y^(-i) * hs, which are never
+        computed: their factors are folded into the scalars sent to the executor.
+        """
+        nm = self.n * self.m
+        z = powers.z
+        y_inv = powers.y_inv_n
+        P = commitment(A, S, 1, x) + self.executor.vector_commitment(
+            [-z] * nm, (powers.y_n * z + powers.z_two) * y_inv
+        )
+        InnerProv = NIProver(
+            self.gs,
+            self.hs,
+            self.u,
+            commitment(P, self.h, 1, -mu),
+            t_hat,
+            ls,
+            rs,
+            self.group,
+            h_factors=y_inv,
+            executor=self.executor,
         )
-        t2 = inner_product(sL, [(y ** i) * sR[i] for i in range(self.n * self.m)])
+        return InnerProv.prove()
+
+    def _get_polynomial_coeffs(self, aL, aR, sL, sR, powers):
+        z = powers.z
+        yn = powers.y_n
+        r0 = yn * (aR + z) + powers.z_two
+        r1 = yn * sR
+        t1 = sL.inner(r0) + (aL - z).inner(r1)
+        t2 = sL.inner(r1)
         return t1, t2
 
-    def _final_compute(self, aL, aR, sL, sR, y, z, x, tau1, tau2, alpha, rho):
-        ls = [aL[i] - z + sL[i] * x for i in range(self.n * self.m)]
-        rs = [
-            (y ** i) * (aR[i] + z + sR[i] * x)
-            + (z ** (2 + (i // self.n))) * (2 ** (i % self.n))
-            for i in range(self.n * self.m)
-        ]
-        t_hat = inner_product(ls, rs)
-        taux = (
-            tau2 * (x ** 2)
-            + tau1 * x
-            + sum([(z ** (2 + j)) * self.gammas[j] for j in range(self.m)])
-        )
+    def _final_compute(self, aL, aR, sL, sR, powers, x, tau1, tau2, alpha, rho):
+        z = powers.z
+        ls = aL - z + sL * x
+        rs = powers.y_n * (aR + z + sR * x) + powers.z_two
+        t_hat = ls.inner(rs)
+        taux = tau2 * (x ** 2) + tau1 * x + powers.z_j.inner(ScalarVector(self.gammas, self.group.q))
         mu = alpha + rho * x
         return taux, mu, t_hat, ls, rs
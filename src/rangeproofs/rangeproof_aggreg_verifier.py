@@ -1,10 +1,44 @@
 
-from src.utils.utils import ModP, point_to_b64
-from src.innerproduct.inner_product_verifier import Verifier1
+import secrets
+
+from fastecdsa.point import Point
+
+from src.utils.utils import ModP, batch_inverse
+from src.utils.transcript import Transcript
+from src.utils.generators import generator_prefix
+from src.utils.serialization import RANGE_PROOF, ProofReader, ProofWriter, read_header
+from src.innerproduct.inner_product_verifier import Proof1, Verifier1, Verifier2
 from src.pippenger import CURVE, PipCURVE
+from src.utils.commitments import commitment
+from src.utils.instrumentation import phase
+from .challenge_powers import ChallengePowers
+
+
+# Largest number n*m of generators accepted from a proof, unless the caller sets another.
+# It bounds the generators derived for untrusted proofs over unbounded GeneratorVectors.
+MAX_GENERATORS = 1 << 14
+
+
+def proof_size(proof, m: int, n: int = None, max_size: int = MAX_GENERATORS):
+    """
+    Returns the number n*m of generators used by a proof of m values, read from its number
+    of inner-product rounds, or None if the proof is malformed, uses more than max_size
+    generators, or is not a proof of m values (of n bits each if n is given)
+    """
+    try:
+        rounds = len(proof.innerProof.proof2.Ls)
+    except (AttributeError, TypeError):
+        return None
+    if m < 1 or rounds >= max_size.bit_length():
+        return None
+    nm = 1 << rounds
+    if nm > max_size or nm % m or (n is not None and nm != n * m):
+        return None
+    return nm
+
 
 class Proof:
-    """Proof class for Protocol 1"""
+    """Proof class for range proofs, aggregated or not"""
 
     def __init__(self, taux, mu, t_hat, T1, T2, A, S, innerProof, transcript):
         self.taux = taux
@@ -17,16 +51,83 @@ class Proof:
         self.innerProof = innerProof
         self.transcript = transcript
 
+    def write(self, writer: ProofWriter):
+        writer.int(self.transcript[0])
+        writer.scalar(self.taux)
+        writer.scalar(self.mu)
+        writer.scalar(self.t_hat)
+        writer.points([self.A, self.S, self.T1, self.T2])
+        self.innerProof.write(writer)
+
+    @classmethod
+    def read(cls, reader: ProofReader) -> "Proof":
+        """Decodes a proof written by write, recomputing its transcript as the provers do"""
+        p = reader.prime
+        transcript = Transcript(reader.int())
+        taux = reader.scalar()
+        mu = reader.scalar()
+        t_hat = reader.scalar()
+        A, S, T1, T2 = reader.points(4)
+        transcript.add_list_points([A, S])
+        y = transcript.get_modp(p)
+        transcript.add_number(y)
+        z = transcript.get_modp(p)
+        transcript.add_number(z)
+        transcript.add_list_points([T1, T2])
+        x = transcript.get_modp(p)
+        transcript.add_number(x)
+        innerProof = Proof1.read(reader)
+        return cls(taux, mu, t_hat, T1, T2, A, S, innerProof, transcript.digest)
+
+    def to_bytes(self) -> bytes:
+        """Binary encoding of the proof, see src.utils.serialization"""
+        writer = ProofWriter()
+        self.write(writer)
+        return writer.to_bytes(RANGE_PROOF)
+
+    @classmethod
+    def from_bytes(cls, data, curve=CURVE, prime=None) -> "Proof":
+        reader = ProofReader.from_bytes(
+            data, RANGE_PROOF, curve, curve.q if prime is None else prime
+        )
+        proof = cls.read(reader)
+        reader.end()
+        return proof
+
+    @classmethod
+    def iter_from_bytes(cls, data, curve=CURVE, prime=None):
+        """
+        Decodes the concatenated encodings of many proofs one at a time.
+        The proofs are read through a memoryview of data, without copying it.
+        """
+        prime = curve.q if prime is None else prime
+        view = memoryview(data)
+        offset = 0
+        while offset < len(view):
+            kind, body, offset = read_header(view, offset)
+            if kind != RANGE_PROOF:
+                raise ValueError("Expected a range proof, got kind {}".format(kind))
+            reader = ProofReader(body, curve, prime)
+            yield cls.read(reader)
+            reader.end()
+
 
 class AggregRangeVerifier:
     """Verifier class for Range Proofs"""
 
-    def __init__(self, Vs, g, h, gs, hs, u, proof: Proof):
+    def __init__(self, Vs, g, h, gs, hs, u, proof: Proof, n=None, max_size=MAX_GENERATORS):
+        """
+        gs and hs can be GeneratorVectors, the number of generators is then read from the
+        number of rounds of the inner-product proof. It must be n * len(Vs) if n is given,
+        and at most max_size: other proofs are rejected before deriving any generator.
+        """
         self.Vs = Vs
         self.g = g
         self.h = h
-        self.gs = gs
-        self.hs = hs
+        nm = proof_size(proof, len(Vs), n, max_size)
+        self.assertThat(nm is not None)
+        self.gs = generator_prefix(gs, nm)
+        self.hs = generator_prefix(hs, nm)
         self.u = u
         self.proof = proof
 
@@ -39,17 +140,32 @@ class AggregRangeVerifier:
         """Verify a transcript to assure Fiat-Shamir was done properly"""
         proof = self.proof
         p = proof.taux.p
-        lTranscript = proof.transcript.split(b"&")
-        self.assertThat(lTranscript[1] == point_to_b64(proof.A))
-        self.assertThat(lTranscript[2] == point_to_b64(proof.S))
-        self.y = ModP(int(lTranscript[3]), p)
-        self.z = ModP(int(lTranscript[4]), p)
-        self.assertThat(lTranscript[5] == point_to_b64(proof.T1))
-        self.assertThat(lTranscript[6] == point_to_b64(proof.T2))
-        self.x = ModP(int(lTranscript[7]), p)
-
-    def verify(self):
-        """Verifies the proof given by a prover. Raises an execption if it is invalid"""
+        lTranscript = proof.transcript
+        self.assertThat(lTranscript[1] == proof.A)
+        self.assertThat(lTranscript[2] == proof.S)
+        y_hash, z_hash, x_hash = Transcript.prefix_hashes(lTranscript, [3, 4, 7], p)
+        self.y = ModP(lTranscript[3], p)
+        self.assertThat(self.y == y_hash)
+        self.z = ModP(lTranscript[4], p)
+        self.assertThat(self.z == z_hash)
+        self.assertThat(lTranscript[5] == proof.T1)
+        self.assertThat(lTranscript[6] == proof.T2)
+        self.x = ModP(lTranscript[7], p)
+        self.assertThat(self.x == x_hash)
+
+    def verify(self, fused=False):
+        """
+        Verifies the proof given by a prover. Raises an execption if it is invalid
+        With fused=True, everything is checked with a single multiexp, see verify_fused
+        """
+        sizes = {"n": len(self.gs) // len(self.Vs), "m": len(self.Vs)}
+        if fused:
+            with phase("verify fused", **sizes):
+                return self.verify_fused()
+        with phase("verify", **sizes):
+            return self._verify()
+
+    def _verify(self):
         self.verify_transcript()
 
         g = self.g
@@ -65,40 +181,97 @@ class AggregRangeVerifier:
         m = len(self.Vs)
         n = nm // m
 
-        delta_yz = (z - z ** 2) * sum(
-            [y ** i for i in range(nm)], ModP(0, CURVE.q)
-        ) - sum(
-            [
-                (z ** (j + 2)) * ModP(2 ** n - 1, CURVE.q)
-                for j in range(1, m + 1)
-            ]
-        )
-        hsp = [(y.inv() ** i) * hs[i] for i in range(nm)]
+        powers = ChallengePowers(y, z, n, m)
+        with phase("verify t", size=nm):
+            delta_yz = powers.delta()
+            self.assertThat(
+                commitment(g, h, proof.t_hat, proof.taux)
+                == PipCURVE.multiexp(
+                    self.Vs + [g, proof.T1, proof.T2],
+                    list(powers.z_j) + [delta_yz, x, x ** 2],
+                )
+            )
 
-        self.assertThat(
-            proof.t_hat * g + proof.taux * h
-            == PipCURVE.multiexp(
-                self.Vs + [g, proof.T1, proof.T2],
-                [z ** (j + 2) for j in range(m)] + [delta_yz, x, x ** 2],
+        with phase("verify P", size=nm):
+            hsp = [yi_inv * hi for yi_inv, hi in zip(powers.y_inv_n, hs)]
+            P = self._getP(x, powers, proof.A, proof.S, gs, hsp)
+        with phase("IPA", size=nm):
+            InnerVerif = Verifier1(
+                gs, hsp, self.u, commitment(P, h, 1, -proof.mu), proof.t_hat, proof.innerProof
             )
+            return InnerVerif.verify()
+
+    def _getP(self, x, powers, A, S, gs, hsp):
+        z = powers.z
+        return commitment(A, S, 1, x) + PipCURVE.multiexp(
+            gs + hsp, [-z] * len(gs) + list(powers.y_n * z + powers.z_two)
         )
 
-        P = self._getP(x, y, z, proof.A, proof.S, gs, hsp, n, m)
-        InnerVerif = Verifier1(
-            gs, hsp, self.u, P + (-proof.mu) * h, proof.t_hat, proof.innerProof
+    def verify_fused(self):
+        """
+        Verifies the proof with a single multiexp.
+        The range check and the inner-product check are combined with a random weight,
+        so neither hsp = y^-i * hs nor P are ever computed.
+        """
+        g_c, h_c, u_c, gs_c, hs_c, points, scalars = self.get_fused_terms()
+        total = PipCURVE.multiexp(
+            [self.g, self.h, self.u] + list(self.gs) + list(self.hs) + points,
+            [g_c, h_c, u_c] + gs_c + hs_c + scalars,
         )
-        return InnerVerif.verify()
-
-    def _getP(self, x, y, z, A, S, gs, hsp, n, m):
-        return (
-            A
-            + x * S
-            + PipCURVE.multiexp(
-                gs + hsp,
-                [-z for _ in range(n * m)]
-                + [
-                    (z * (y ** i)) + (z ** (2 + (i // n))) * (2 ** (i % n))
-                    for i in range(n * m)
-                ],
-            )
+        self.assertThat(total == Point.IDENTITY_ELEMENT)
+        return True
+
+    def get_fused_terms(self):
+        """
+        Checks the transcripts and returns the scalars of the fused verification equation
+        as (g, h, u, gs, hs, proof points, proof scalars). The proof is valid iff
+        g_c*g + h_c*h + u_c*u + <gs_c, gs> + <hs_c, hs> + <scalars, points> is the identity.
+        """
+        proof = self.proof
+        proof1 = proof.innerProof
+        proof2 = proof1.proof2
+        q = CURVE.q
+        nm = len(self.gs)
+        m = len(self.Vs)
+        n = nm // m
+        self.assertThat(nm == 2 ** len(proof2.Ls) == len(self.hs) and nm % m == 0)
+
+        self.verify_transcript()
+        Verifier1(self.gs, None, self.u, None, proof.t_hat, proof1, prime=q).verify_transcript()
+        Verif2 = Verifier2(self.gs, None, self.u, None, proof2, prime=q)
+        Verif2.verify_transcript()
+
+        x, z = self.x.x, self.z.x
+        x_ip = ModP(proof1.transcript[1], q).x
+        a, b = proof2.a.x, proof2.b.x
+        t_hat, taux, mu = proof.t_hat.x, proof.taux.x, proof.mu.x
+
+        ss = [s.x for s in Verif2.get_ss(proof2.xs)]
+        powers = ChallengePowers(self.y, self.z, n, m)
+        zs = powers.z_j.xs
+
+        # Folds the y^-i scaling of hs and the terms of P into the generator scalars
+        gs_c = [(a * s + z) % q for s in ss]
+        # The bits of i are flipped in s_(nm-1-i), so it is the inverse of s_i
+        hs_c = [
+            (y_inv_pow * (b * s_inv - z_two) - z) % q
+            for y_inv_pow, s_inv, z_two in zip(powers.y_inv_n.xs, reversed(ss), powers.z_two.xs)
+        ]
+
+        delta_yz = powers.delta().x
+
+        xs = [xi.x for xi in proof2.xs]
+        xs_inv = [xi_inv.x for xi_inv in batch_inverse(proof2.xs)]
+        # Weight of the range check relative to the inner-product check
+        c = secrets.randbelow(q - 1) + 1
+        g_c = c * (t_hat - delta_yz)
+        h_c = mu + c * taux
+        u_c = x_ip * (a * b - t_hat)
+        points = list(self.Vs) + [proof.T1, proof.T2, proof.A, proof.S] + proof2.Ls + proof2.Rs
+        scalars = (
+            [-c * zj for zj in zs]
+            + [-c * x, -c * x * x, -1, -x]
+            + [-xi * xi for xi in xs]
+            + [-xi * xi for xi in xs_inv]
         )
+        return g_c, h_c, u_c, gs_c, hs_c, points, scalars
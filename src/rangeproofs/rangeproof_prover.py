@@ -1,10 +1,12 @@
 from typing import List
-from src.utils.utils import Point, ModP, inner_product, mod_hash
+from src.utils.utils import Point, ModP, ScalarVector, mod_hash_many
 from src.utils.transcript import Transcript
 from src.utils.commitments import vector_commitment, commitment
 from .rangeproof_verifier import Proof
+from .challenge_powers import ChallengePowers
 from src.innerproduct.inner_product_prover import NIProver
 from src.pippenger import PipCURVE
+from src.utils.instrumentation import phase
 
 
 class NIRangeProver:
@@ -20,7 +22,13 @@ class NIRangeProver:
         u: Point,
         group,
         seed: bytes = 0,
+        scalar_folding: bool = False,
     ):
+        """
+        With scalar_folding=True, the inner-product proof works on the generators
+        gs and y^(-i) * hs without computing them, and computes its multiexps over
+        gs and hs. This is faster when gs and hs are FixedBaseTables.
+        """
         self.v = v
         self.n = n
         self.g = g
@@ -30,83 +38,97 @@ class NIRangeProver:
         self.gamma = gamma
         self.u = u
         self.group = group
+        self.scalar_folding = scalar_folding
         self.transcript = Transcript(seed)
 
     def prove(self):
+        with phase("prove", n=self.n):
+            return self._prove()
+
+    def _prove(self):
         v = self.v
         n = self.n
         gs = self.gs
         hs = self.hs
         h = self.h
 
-        aL = list(map(int, reversed(bin(v.x)[2:].zfill(n))))[:n]
-        aR = [
-            (x - 1) % self.group.q for x in aL
-        ]  # TODO implement inverse of elliptic curve point  to compute -1 * g instead of multiplying by p-1
-        alpha = mod_hash(b"alpha" + self.transcript.digest, self.group.q)
-        A = vector_commitment(gs, hs, aL, aR) + alpha * h
-        sL = [
-            mod_hash(str(i).encode() + self.transcript.digest, self.group.q)
-            for i in range(n)
-        ]
-        sR = [
-            mod_hash(str(i).encode() + self.transcript.digest, self.group.q)
-            for i in range(n, 2 * n)
-        ]
-        rho = mod_hash(str(2 * n).encode() + self.transcript.digest, self.group.q)
-        S = vector_commitment(gs, hs, sL, sR) + rho * h
+        q = self.group.q
+        aL = ScalarVector(list(map(int, reversed(bin(v.x)[2:].zfill(n))))[:n], q)
+        aR = aL - 1
+        # The blinding factors are derived from the transcript, which holds the seed, keyed
+        # with the witness: the seed is part of the proof, the blindings must not be
+        # computable from it
+        secret = Transcript.digest_to_bytes([v, self.gamma])
+        transcript_bytes = secret + self.transcript.to_bytes()
+        alpha, rho = mod_hash_many(b"alpha/rho" + transcript_bytes, 2, q)
+        sL = mod_hash_many(b"sL" + transcript_bytes, n, q)
+        sR = mod_hash_many(b"sR" + transcript_bytes, n, q)
+        with phase("A/S commit", size=n):
+            A = commitment(vector_commitment(gs, hs, aL, aR), h, 1, alpha)
+            S = commitment(vector_commitment(gs, hs, sL, sR), h, 1, rho)
         self.transcript.add_list_points([A, S])
         y = self.transcript.get_modp(self.group.q)
         self.transcript.add_number(y)
         z = self.transcript.get_modp(self.group.q)
         self.transcript.add_number(z)
+        powers = ChallengePowers(y, z, n)
 
-        t1, t2 = self._get_polynomial_coeffs(aL, aR, sL, sR, y, z)
-        tau1 = mod_hash(b"tau1" + self.transcript.digest, self.group.q)
-        tau2 = mod_hash(b"tau2" + self.transcript.digest, self.group.q)
-        T1 = commitment(self.g, h, t1, tau1)
-        T2 = commitment(self.g, h, t2, tau2)
+        with phase("t1/t2", size=n):
+            t1, t2 = self._get_polynomial_coeffs(aL, aR, sL, sR, powers)
+            tau1, tau2 = mod_hash_many(b"tau" + secret + self.transcript.to_bytes(), 2, q)
+            T1 = commitment(self.g, h, t1, tau1)
+            T2 = commitment(self.g, h, t2, tau2)
         self.transcript.add_list_points([T1, T2])
         x = self.transcript.get_modp(self.group.q)
         self.transcript.add_number(x)
-        taux, mu, t_hat, ls, rs = self._final_compute(
-            aL, aR, sL, sR, y, z, x, tau1, tau2, alpha, rho
-        )
+        with phase("l/r", size=n):
+            taux, mu, t_hat, ls, rs = self._final_compute(
+                aL, aR, sL, sR, powers, x, tau1, tau2, alpha, rho
+            )
 
         # return Proof(taux, mu, t_hat, ls, rs, T1, T2, A, S), x,y,z
-        hsp = [(y.inv() ** i) * hs[i] for i in range(n)]
-        P = (
-            A
-            + x * S
-            + PipCURVE.multiexp(
-                gs + hsp,
-                [-z for _ in range(n)]
-                + [(z * (y ** i)) + ((z ** 2) * (2 ** i)) for i in range(n)],
+        y_inv = powers.y_inv_n
+        if self.scalar_folding:
+            with phase("P", size=n):
+                P = commitment(A, S, 1, x) + vector_commitment(
+                    gs, hs, [-z] * n, (powers.y_n * z + powers.z_two) * y_inv
+                )
+            with phase("IPA", size=n):
+                InnerProv = NIProver(
+                    gs, hs, self.u, commitment(P, h, 1, -mu), t_hat, ls, rs, self.group,
+                    h_factors=y_inv,
+                )
+                innerProof = InnerProv.prove()
+            return Proof(taux, mu, t_hat, T1, T2, A, S, innerProof, self.transcript.digest)
+
+        with phase("P", size=n):
+            hsp = [yi_inv * hi for yi_inv, hi in zip(y_inv, hs)]
+            P = commitment(A, S, 1, x) + PipCURVE.multiexp(
+                gs + hsp, [-z for _ in range(n)] + list(powers.y_n * z + powers.z_two)
             )
-        )
 
-        InnerProv = NIProver(gs, hsp, self.u, P + (-mu) * h, t_hat, ls, rs, self.group)
-        innerProof = InnerProv.prove()
+        with phase("IPA", size=n):
+            InnerProv = NIProver(
+                gs, hsp, self.u, commitment(P, h, 1, -mu), t_hat, ls, rs, self.group
+            )
+            innerProof = InnerProv.prove()
 
         return Proof(taux, mu, t_hat, T1, T2, A, S, innerProof, self.transcript.digest)
 
-    def _get_polynomial_coeffs(self, aL, aR, sL, sR, y, z):
-        t1 = inner_product(
-            sL, [(y ** i) * (aR[i] + z) + (z ** 2) * (2 ** i) for i in range(self.n)]
-        ) + inner_product(
-            [aL[i] - z for i in range(self.n)],
-            [(y ** i) * sR[i] for i in range(self.n)],
-        )
-        t2 = inner_product(sL, [(y ** i) * sR[i] for i in range(self.n)])
+    def _get_polynomial_coeffs(self, aL, aR, sL, sR, powers):
+        z = powers.z
+        yn = powers.y_n
+        r0 = yn * (aR + z) + powers.z_two
+        r1 = yn * sR
+        t1 = sL.inner(r0) + (aL - z).inner(r1)
+        t2 = sL.inner(r1)
         return t1, t2
 
-    def _final_compute(self, aL, aR, sL, sR, y, z, x, tau1, tau2, alpha, rho):
-        ls = [aL[i] - z + sL[i] * x for i in range(self.n)]
-        rs = [
-            (y ** i) * (aR[i] + z + sR[i] * x) + (z ** 2) * (2 ** i)
-            for i in range(self.n)
-        ]
-        t_hat = inner_product(ls, rs)
-        taux = tau2 * (x ** 2) + tau1 * x + (z ** 2) * self.gamma
+    def _final_compute(self, aL, aR, sL, sR, powers, x, tau1, tau2, alpha, rho):
+        z = powers.z
+        ls = aL - z + sL * x
+        rs = powers.y_n * (aR + z + sR * x) + powers.z_two
+        t_hat = ls.inner(rs)
+        taux = tau2 * (x ** 2) + tau1 * x + powers.z_j[0] * self.gamma
         mu = alpha + rho * x
         return taux, mu, t_hat, ls, rs
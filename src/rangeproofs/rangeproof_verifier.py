@@ -1,22 +1,11 @@
-from src.utils.utils import ModP, point_to_b64
+from src.utils.utils import ModP
+from src.utils.transcript import Transcript
 from src.innerproduct.inner_product_verifier import Verifier1
-from src.pippenger import CURVE, PipCURVE
-
-
-
-class Proof:
-    """Proof class for Protocol 1"""
-
-    def __init__(self, taux, mu, t_hat, T1, T2, A, S, innerProof, transcript):
-        self.taux = taux
-        self.mu = mu
-        self.t_hat = t_hat
-        self.T1 = T1
-        self.T2 = T2
-        self.A = A
-        self.S = S
-        self.innerProof = innerProof
-        self.transcript = transcript
+from src.pippenger import PipCURVE, linear_combination
+from src.utils.commitments import commitment
+from src.utils.instrumentation import phase
+from .rangeproof_aggreg_verifier import AggregRangeVerifier, Proof
+from .challenge_powers import ChallengePowers
 
 
 class RangeVerifier:
@@ -40,17 +29,33 @@ class RangeVerifier:
         """Verify a transcript to assure Fiat-Shamir was done properly"""
         proof = self.proof
         p = proof.taux.p
-        lTranscript = proof.transcript.split(b"&")
-        self.assertThat(lTranscript[1] == point_to_b64(proof.A))
-        self.assertThat(lTranscript[2] == point_to_b64(proof.S))
-        self.y = ModP(int(lTranscript[3]), p)
-        self.z = ModP(int(lTranscript[4]), p)
-        self.assertThat(lTranscript[5] == point_to_b64(proof.T1))
-        self.assertThat(lTranscript[6] == point_to_b64(proof.T2))
-        self.x = ModP(int(lTranscript[7]), p)
+        lTranscript = proof.transcript
+        self.assertThat(lTranscript[1] == proof.A)
+        self.assertThat(lTranscript[2] == proof.S)
+        y_hash, z_hash, x_hash = Transcript.prefix_hashes(lTranscript, [3, 4, 7], p)
+        self.y = ModP(lTranscript[3], p)
+        self.assertThat(self.y == y_hash)
+        self.z = ModP(lTranscript[4], p)
+        self.assertThat(self.z == z_hash)
+        self.assertThat(lTranscript[5] == proof.T1)
+        self.assertThat(lTranscript[6] == proof.T2)
+        self.x = ModP(lTranscript[7], p)
+        self.assertThat(self.x == x_hash)
+
+    def verify(self, fused=False):
+        """
+        Verifies the proof given by a prover. Raises an execption if it is invalid
+        With fused=True, everything is checked with a single multiexp
+        """
+        if fused:
+            # A single range proof is an aggregated one with m = 1
+            return AggregRangeVerifier(
+                [self.V], self.g, self.h, self.gs, self.hs, self.u, self.proof
+            ).verify_fused()
+        with phase("verify", n=len(self.gs)):
+            return self._verify()
 
-    def verify(self):
-        """Verifies the proof given by a prover. Raises an execption if it is invalid"""
+    def _verify(self):
         self.verify_transcript()
 
         g = self.g
@@ -63,32 +68,31 @@ class RangeVerifier:
         proof = self.proof
 
         n = len(gs)
-        delta_yz = (z - z ** 2) * sum(
-            [y ** i for i in range(n)], ModP(0, CURVE.q)
-        ) - (z ** 3) * ModP(2 ** n - 1, CURVE.q)
-        hsp = [(y.inv() ** i) * hs[i] for i in range(n)]
-        self.assertThat(
-            proof.t_hat * g + proof.taux * h
-            == (z ** 2) * self.V + delta_yz * g + x * proof.T1 + (x ** 2) * proof.T2
-        )
+        powers = ChallengePowers(y, z, n)
+        with phase("verify t", size=n):
+            delta_yz = powers.delta()
+            self.assertThat(
+                commitment(g, h, proof.t_hat, proof.taux)
+                == linear_combination(
+                    [self.V, g, proof.T1, proof.T2], [powers.z_j[0], delta_yz, x, x ** 2]
+                )
+            )
 
-        P = self._getP(x, y, z, proof.A, proof.S, gs, hsp, n)
+        with phase("verify P", size=n):
+            hsp = [yi_inv * hi for yi_inv, hi in zip(powers.y_inv_n, hs)]
+            P = self._getP(x, powers, proof.A, proof.S, gs, hsp)
         # self.assertThat(
         #     P == vector_commitment(gs, hsp, proof.ls, proof.rs) + proof.mu * h
         # )
         # self.assertThat(proof.t_hat == inner_product(proof.ls, proof.rs))
-        InnerVerif = Verifier1(
-            gs, hsp, self.u, P + (-proof.mu) * h, proof.t_hat, proof.innerProof
-        )
-        return InnerVerif.verify()
-
-    def _getP(self, x, y, z, A, S, gs, hsp, n):
-        return (
-            A
-            + x * S
-            + PipCURVE.multiexp(
-                gs + hsp,
-                [-z for _ in range(n)]
-                + [(z * (y ** i)) + ((z ** 2) * (2 ** i)) for i in range(n)],
+        with phase("IPA", size=n):
+            InnerVerif = Verifier1(
+                gs, hsp, self.u, commitment(P, h, 1, -proof.mu), proof.t_hat, proof.innerProof
             )
+            return InnerVerif.verify()
+
+    def _getP(self, x, powers, A, S, gs, hsp):
+        z = powers.z
+        return commitment(A, S, 1, x) + PipCURVE.multiexp(
+            gs + hsp, [-z] * len(gs) + list(powers.y_n * z + powers.z_two)
         )
@@ -1,11 +1,23 @@
 import unittest
+import copyreg
 import os
+import tempfile
+from types import SimpleNamespace
 from random import randint
-from src.pippenger import CURVE
+from fastecdsa.point import Point
+
+from src.pippenger import CURVE, FixedBaseTable, FixedBasePoint, ParallelMultiexp
 from src.utils.commitments import commitment
 from src.utils.utils import mod_hash, ModP
 from src.utils.elliptic_curve_hash import elliptic_hash
-from src.rangeproofs import AggregNIRangeProver, AggregRangeVerifier
+from src.utils.generators import GeneratorSet
+from src.rangeproofs import (
+    AggregNIRangeProver,
+    AggregRangeVerifier,
+    BatchRangeVerifier,
+    ProofArchive,
+    ProofArchiveWriter,
+)
 
 
 p = CURVE.q
@@ -132,3 +144,188 @@ class AggregRangeProofTest(unittest.TestCase):
         with self.subTest(seeds=seeds, vs=vs, ind=ind):
             with self.assertRaisesRegex(Exception, "Proof invalid"):
                 Verif.verify()
+
+    def test_fused_verification(self):
+        for m in [1, 2, 4]:
+            seeds = [os.urandom(10) for _ in range(7)]
+            vs, n = [ModP(randint(0, 2 ** 16 - 1), p) for _ in range(m)], 16
+            gs = [elliptic_hash(str(i).encode() + seeds[0], CURVE) for i in range(n * m)]
+            hs = [elliptic_hash(str(i).encode() + seeds[1], CURVE) for i in range(n * m)]
+            g = elliptic_hash(seeds[2], CURVE)
+            h = elliptic_hash(seeds[3], CURVE)
+            u = elliptic_hash(seeds[4], CURVE)
+            gammas = [mod_hash(seeds[5], p) for _ in range(m)]
+            Vs = [commitment(g, h, vs[i], gammas[i]) for i in range(m)]
+            Prov = AggregNIRangeProver(vs, n, g, h, gs, hs, gammas, u, CURVE, seeds[6])
+            proof = Prov.prove()
+            with self.subTest(seeds=seeds, vs=vs, m=m):
+                Verif = AggregRangeVerifier(Vs, g, h, gs, hs, u, proof)
+                self.assertTrue(Verif.verify(fused=True))
+                proof.mu += 1
+                with self.assertRaisesRegex(Exception, "Proof invalid"):
+                    Verif.verify(fused=True)
+
+    def test_blindings_depend_on_witness(self):
+        m, n = 2, 16
+        seeds = [os.urandom(10) for _ in range(7)]
+        vs = [ModP(randint(0, 2 ** n - 1), p) for _ in range(m)]
+        gs = [elliptic_hash(str(i).encode() + seeds[0], CURVE) for i in range(n * m)]
+        hs = [elliptic_hash(str(i).encode() + seeds[1], CURVE) for i in range(n * m)]
+        g = elliptic_hash(seeds[2], CURVE)
+        h = elliptic_hash(seeds[3], CURVE)
+        u = elliptic_hash(seeds[4], CURVE)
+        gammas = [mod_hash(seeds[5], p) for _ in range(m)]
+        proof = AggregNIRangeProver(vs, n, g, h, gs, hs, gammas, u, CURVE, seeds[6]).prove()
+        # S only commits to blindings, which change with the witness under the same seed
+        other = AggregNIRangeProver(
+            vs, n, g, h, gs, hs, [gammas[0], gammas[1] + 1], u, CURVE, seeds[6]
+        ).prove()
+        self.assertNotEqual(other.S, proof.S)
+
+    def test_generator_vectors(self):
+        seeds = [os.urandom(10) for _ in range(5)]
+        gs = GeneratorSet(seeds[0]).vector()
+        hs = GeneratorSet(seeds[1]).vector()
+        g = elliptic_hash(seeds[2], CURVE)
+        h = elliptic_hash(seeds[3], CURVE)
+        u = elliptic_hash(seeds[4], CURVE)
+        n = 8
+        proofs = []
+        for m in [2, 1, 4]:
+            vs = [ModP(randint(0, 2 ** n - 1), p) for _ in range(m)]
+            gammas = [mod_hash(os.urandom(10), p) for _ in range(m)]
+            Vs = [commitment(g, h, vs[i], gammas[i]) for i in range(m)]
+            proof = AggregNIRangeProver(vs, n, g, h, gs, hs, gammas, u, CURVE).prove()
+            with self.subTest(m=m):
+                self.assertTrue(AggregRangeVerifier(Vs, g, h, gs, hs, u, proof).verify())
+                self.assertTrue(AggregRangeVerifier(Vs, g, h, gs, hs, u, proof).verify(fused=True))
+            proofs.append((Vs, proof))
+        self.assertEqual(len(gs), 4 * n)
+        self.assertEqual(
+            list(gs), [elliptic_hash(str(i).encode() + seeds[0], CURVE) for i in range(4 * n)]
+        )
+        self.assertTrue(BatchRangeVerifier(g, h, gs, hs, u, proofs).verify())
+
+        # Proofs claiming more generators than allowed are rejected before deriving them
+        Vs, proof = proofs[0]
+        huge = SimpleNamespace(innerProof=SimpleNamespace(proof2=SimpleNamespace(Ls=[None] * 24)))
+        for bad, kwargs in [(huge, {}), (proof, {"n": 16}), (proof, {"max_size": 8}), (object(), {})]:
+            with self.assertRaisesRegex(Exception, "Proof invalid"):
+                AggregRangeVerifier(Vs, g, h, gs, hs, u, bad, **kwargs)
+        batch = BatchRangeVerifier(g, h, gs, hs, u, proofs + [(Vs, huge)], n=n)
+        self.assertEqual(batch.find_invalid(), [3])
+        self.assertEqual(len(gs), 4 * n)
+
+    def test_parallel_prover(self):
+        seeds = [os.urandom(10) for _ in range(7)]
+        m, n = 2, 16
+        vs = [ModP(randint(0, 2 ** n - 1), p) for _ in range(m)]
+        gs = [elliptic_hash(str(i).encode() + seeds[0], CURVE) for i in range(n * m)]
+        hs = [elliptic_hash(str(i).encode() + seeds[1], CURVE) for i in range(n * m)]
+        g = elliptic_hash(seeds[2], CURVE)
+        h = elliptic_hash(seeds[3], CURVE)
+        u = elliptic_hash(seeds[4], CURVE)
+        gammas = [mod_hash(seeds[5], p) for _ in range(m)]
+        Vs = [commitment(g, h, vs[i], gammas[i]) for i in range(m)]
+        proof = AggregNIRangeProver(vs, n, g, h, gs, hs, gammas, u, CURVE, seeds[6]).prove()
+        for gens in [(gs, hs), (FixedBaseTable(gs), FixedBaseTable(hs))]:
+            with ParallelMultiexp(*gens, workers=2, min_chunk=8) as pool:
+                Prov = AggregNIRangeProver(
+                    vs, n, g, h, gs, hs, gammas, u, CURVE, seeds[6], executor=pool
+                )
+                parallel_proof = Prov.prove()
+            self.assertEqual(parallel_proof.transcript, proof.transcript)
+            Verif = AggregRangeVerifier(Vs, g, h, gs, hs, u, parallel_proof)
+            self.assertTrue(Verif.verify())
+        # The pool pickles points its own way, without changing how the process does
+        self.assertNotIn(Point, copyreg.dispatch_table)
+        self.assertNotIn(FixedBasePoint, copyreg.dispatch_table)
+
+
+class BatchRangeVerifierTest(unittest.TestCase):
+    def test_batch_verify(self):
+        seeds = [os.urandom(10) for _ in range(5)]
+        n, max_m = 8, 4
+        gs = [elliptic_hash(str(i).encode() + seeds[0], CURVE) for i in range(n * max_m)]
+        hs = [elliptic_hash(str(i).encode() + seeds[1], CURVE) for i in range(n * max_m)]
+        g = elliptic_hash(seeds[2], CURVE)
+        h = elliptic_hash(seeds[3], CURVE)
+        u = elliptic_hash(seeds[4], CURVE)
+        proofs = []
+        for m in [1, 2, 4, 1]:
+            vs = [ModP(randint(0, 2 ** n - 1), p) for _ in range(m)]
+            gammas = [mod_hash(os.urandom(10), p) for _ in range(m)]
+            Vs = [commitment(g, h, vs[i], gammas[i]) for i in range(m)]
+            Prov = AggregNIRangeProver(
+                vs, n, g, h, gs[: n * m], hs[: n * m], gammas, u, CURVE, os.urandom(10)
+            )
+            proofs.append((Vs, Prov.prove()))
+        Verif = BatchRangeVerifier(g, h, gs, hs, u, proofs)
+        self.assertTrue(Verif.verify())
+        self.assertEqual(Verif.find_invalid(), [])
+
+        Vs, proof = proofs[2]
+        proofs[2] = (Vs[:-1] + [Vs[-1] + g], proof)
+        proofs[3][1].taux += 1
+        Verif = BatchRangeVerifier(g, h, gs, hs, u, proofs)
+        with self.assertRaisesRegex(Exception, "Proof invalid"):
+            Verif.verify()
+        self.assertEqual(Verif.find_invalid(), [2, 3])
+
+
+class ProofArchiveTest(unittest.TestCase):
+    def test_archive(self):
+        seeds = [os.urandom(10) for _ in range(5)]
+        n, max_m = 8, 2
+        gs = [elliptic_hash(str(i).encode() + seeds[0], CURVE) for i in range(n * max_m)]
+        hs = [elliptic_hash(str(i).encode() + seeds[1], CURVE) for i in range(n * max_m)]
+        g = elliptic_hash(seeds[2], CURVE)
+        h = elliptic_hash(seeds[3], CURVE)
+        u = elliptic_hash(seeds[4], CURVE)
+        records = []
+        for m in [1, 2, 2, 1]:
+            vs = [ModP(randint(0, 2 ** n - 1), p) for _ in range(m)]
+            gammas = [mod_hash(os.urandom(10), p) for _ in range(m)]
+            Vs = [commitment(g, h, vs[i], gammas[i]) for i in range(m)]
+            Prov = AggregNIRangeProver(
+                vs, n, g, h, gs[: n * m], hs[: n * m], gammas, u, CURVE, os.urandom(10)
+            )
+            records.append((Vs, Prov.prove()))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "proofs.bin")
+            with ProofArchiveWriter(path) as writer:
+                for Vs, proof in records:
+                    writer.append(Vs, proof)
+            with ProofArchive(path) as archive:
+                self.assertEqual(len(archive), 4)
+                for (Vs, proof), (Vs_read, proof_read) in zip(records, archive.records()):
+                    self.assertEqual(Vs_read, Vs)
+                    self.assertEqual(proof_read.transcript, proof.transcript)
+                    nm = n * len(Vs)
+                    Verif = AggregRangeVerifier(Vs_read, g, h, gs[:nm], hs[:nm], u, proof_read)
+                    self.assertTrue(Verif.verify())
+                self.assertEqual(archive[2].transcript, records[2][1].transcript)
+                self.assertEqual(archive[-1].transcript, records[3][1].transcript)
+                self.assertEqual(len(list(archive)), 4)
+
+            # Without its index, the archive is scanned
+            writer = ProofArchiveWriter(path)
+            for Vs, proof in records[:3]:
+                writer.append(Vs, proof)
+            writer.file.close()
+            with ProofArchive(path) as archive:
+                self.assertEqual(len(archive), 3)
+                self.assertEqual(archive.record(1)[0], records[1][0])
+
+            # A crash in the middle of the last record leaves the previous ones readable
+            with open(path, "rb") as f:
+                data = f.read()
+            with open(path, "wb") as f:
+                f.write(data[:-20])
+            with ProofArchive(path) as archive:
+                self.assertEqual(len(archive), 2)
+                self.assertEqual(archive[1].transcript, records[1][1].transcript)
+
+            open(path, "wb").close()
+            with self.assertRaises(ValueError):
+                ProofArchive(path)
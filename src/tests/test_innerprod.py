@@ -2,11 +2,18 @@ import unittest
 import os
 from random import randint
 from fastecdsa.curve import Curve
+from fastecdsa.point import Point
 from src.pippenger import CURVE
 
 from src.group import EC
 from src.innerproduct.inner_product_prover import NIProver, FastNIProver2
-from src.innerproduct.inner_product_verifier import SUPERCURVE, Verifier1, Verifier2
+from src.innerproduct.inner_product_verifier import (
+    SUPERCURVE,
+    Proof1,
+    Proof2,
+    Verifier1,
+    Verifier2,
+)
 from src.utils.commitments import vector_commitment
 from src.utils.utils import ModP, mod_hash, inner_product
 from src.utils.elliptic_curve_hash import elliptic_hash
@@ -34,6 +41,26 @@ class Protocol2Test(unittest.TestCase):
             with self.subTest(seeds=seeds, N=N):
                 self.assertTrue(Verif.verify())
 
+    def test_protocol_2_scalar_folding(self):
+        for i in range(6):
+            seeds = [os.urandom(10) for _ in range(6)]
+            p = CURVE.q
+            N = 2 ** i
+            g = [elliptic_hash(str(i).encode() + seeds[0], CURVE) for i in range(N)]
+            h = [elliptic_hash(str(i).encode() + seeds[1], CURVE) for i in range(N)]
+            u = elliptic_hash(seeds[2], CURVE)
+            a = [mod_hash(str(i).encode() + seeds[3], p) for i in range(N)]
+            b = [mod_hash(str(i).encode() + seeds[4], p) for i in range(N)]
+            P = vector_commitment(g, h, a, b) + inner_product(a, b) * u
+
+            proof = FastNIProver2(g, h, u, P, a, b, CURVE).prove()
+            proof_sf = FastNIProver2(g, h, u, P, a, b, CURVE, scalar_folding=True).prove()
+            with self.subTest(seeds=seeds, N=N):
+                self.assertEqual(proof_sf.Ls, proof.Ls)
+                self.assertEqual(proof_sf.Rs, proof.Rs)
+                self.assertEqual((proof_sf.a, proof_sf.b), (proof.a, proof.b))
+                self.assertTrue(Verifier2(g, h, u, P, proof_sf).verify())
+
     def test_prover_cheating_false_P_protocol2(self):
         seeds = [os.urandom(10) for _ in range(6)]
         p = CURVE.q
@@ -115,12 +142,39 @@ class InnerProductArgumentTest(unittest.TestCase):
             b = [mod_hash(str(i).encode() + seeds[4], p) for i in range(N)]
             P = vector_commitment(g, h, a, b)
             c = inner_product(a, b)
-            Prov = NIProver(g, h, u, P, c, a, b, CURVE, seeds[5])
+            Prov = NIProver(g, h, u, P, c, a, b, CURVE, seed=seeds[5])
             proof = Prov.prove()
             Verif = Verifier1(g, h, u, P, c, proof)
             with self.subTest(seeds=seeds):
                 self.assertTrue(Verif.verify())
 
+    def test_serialization(self):
+        seeds = [os.urandom(10) for _ in range(6)]
+        p = CURVE.q
+        N = 16
+        g = [elliptic_hash(str(i).encode() + seeds[0], CURVE) for i in range(N)]
+        h = [elliptic_hash(str(i).encode() + seeds[1], CURVE) for i in range(N)]
+        u = elliptic_hash(seeds[2], CURVE)
+        a = [mod_hash(str(i).encode() + seeds[3], p) for i in range(N)]
+        b = [mod_hash(str(i).encode() + seeds[4], p) for i in range(N)]
+        P = vector_commitment(g, h, a, b)
+        c = inner_product(a, b)
+        proof = NIProver(g, h, u, P, c, a, b, CURVE, seed=seeds[5]).prove()
+        data = proof.to_bytes()
+        self.assertEqual(len(data), 6 + 32 + 2 * 33 + 2 * 32 + 1 + 2 * 4 * 33)
+        decoded = Proof1.from_bytes(data)
+        self.assertEqual(decoded.transcript, proof.transcript)
+        self.assertEqual(decoded.proof2.transcript, proof.proof2.transcript)
+        self.assertEqual(decoded.proof2.xs, proof.proof2.xs)
+        self.assertTrue(Verifier1(g, h, u, P, c, decoded).verify())
+
+        proof2 = FastNIProver2(g, h, u, P + c * u, a, b, CURVE).prove()
+        decoded2 = Proof2.from_bytes(proof2.to_bytes())
+        self.assertEqual(decoded2.transcript, proof2.transcript)
+        self.assertTrue(Verifier2(g, h, u, P + c * u, decoded2).verify())
+        with self.assertRaises(ValueError):
+            Proof2.from_bytes(data)
+
     def test_different_N(self):
         for i in range(9):
             seeds = [os.urandom(10) for _ in range(6)]
@@ -133,7 +187,7 @@ class InnerProductArgumentTest(unittest.TestCase):
             b = [mod_hash(str(i).encode() + seeds[4], p) for i in range(N)]
             P = vector_commitment(g, h, a, b)
             c = inner_product(a, b)
-            Prov = NIProver(g, h, u, P, c, a, b, CURVE, seeds[5])
+            Prov = NIProver(g, h, u, P, c, a, b, CURVE, seed=seeds[5])
             proof = Prov.prove()
             Verif = Verifier1(g, h, u, P, c, proof)
             with self.subTest(N=N, seeds=seeds):
@@ -150,7 +204,7 @@ class InnerProductArgumentTest(unittest.TestCase):
         b = [mod_hash(str(i).encode() + seeds[4], p) for i in range(N)]
         P = vector_commitment(g, h, a, b)
         c = inner_product(a, b)
-        Prov = NIProver(g, h, u, P, c + 1, a, b, CURVE, seeds[5])
+        Prov = NIProver(g, h, u, P, c + 1, a, b, CURVE, seed=seeds[5])
         proof = Prov.prove()
         Verif = Verifier1(g, h, u, P, c, proof)
         with self.assertRaisesRegex(Exception, "Proof invalid"):
@@ -167,7 +221,7 @@ class InnerProductArgumentTest(unittest.TestCase):
         b = [mod_hash(str(i).encode() + seeds[4], p) for i in range(N)]
         P = vector_commitment(g, h, a, b)
         c = inner_product(a, b)
-        Prov = NIProver(g, h, u, P, c, a, b, CURVE, seeds[5])
+        Prov = NIProver(g, h, u, P, c, a, b, CURVE, seed=seeds[5])
         proof = Prov.prove()
         Verif = Verifier1(g, h, u, 2 * P, c, proof)
         with self.assertRaisesRegex(Exception, "Proof invalid"):
@@ -185,7 +239,7 @@ class InnerProductArgumentTest(unittest.TestCase):
         P = vector_commitment(g, h, a, b)
         c = inner_product(a, b)
         a[randint(0, N - 1)] *= 2
-        Prov = NIProver(g, h, u, P, c, a, b, CURVE, seeds[5])
+        Prov = NIProver(g, h, u, P, c, a, b, CURVE, seed=seeds[5])
         proof = Prov.prove()
         Verif = Verifier1(g, h, u, P, c, proof)
         with self.assertRaisesRegex(Exception, "Proof invalid"):
@@ -203,7 +257,7 @@ class InnerProductArgumentTest(unittest.TestCase):
         P = vector_commitment(g, h, a, b)
         c = inner_product(a, b)
         b[randint(0, N - 1)] *= 2
-        Prov = NIProver(g, h, u, P, c, a, b, CURVE, seeds[5])
+        Prov = NIProver(g, h, u, P, c, a, b, CURVE, seed=seeds[5])
         proof = Prov.prove()
         Verif = Verifier1(g, h, u, P, c, proof)
         with self.assertRaisesRegex(Exception, "Proof invalid"):
@@ -221,7 +275,7 @@ class InnerProductArgumentTest(unittest.TestCase):
         b = [mod_hash(str(i).encode() + seeds[4], p) for i in range(N)]
         P = vector_commitment(g, h, a, b)
         c = inner_product(a, b)
-        Prov = NIProver(g, h, u, P, c, a, b, CURVE, seeds[5])
+        Prov = NIProver(g, h, u, P, c, a, b, CURVE, seed=seeds[5])
         proof = Prov.prove()
         Verif = Verifier1(g, h, 2 * u, P, c, proof)
         with self.assertRaisesRegex(Exception, "Proof invalid"):
@@ -238,11 +292,14 @@ class InnerProductArgumentTest(unittest.TestCase):
         b = [mod_hash(str(i).encode() + seeds[4], p) for i in range(N)]
         P = vector_commitment(g, h, a, b)
         c = inner_product(a, b)
-        Prov = NIProver(g, h, u, P, c, a, b, CURVE, seeds[5])
+        Prov = NIProver(g, h, u, P, c, a, b, CURVE, seed=seeds[5])
         proof = Prov.prove()
         randind = randint(0, len(proof.transcript) - 1)
+        x = proof.transcript[randind]
         proof.transcript = (
-            proof.transcript[:randind] + os.urandom(1) + proof.transcript[randind + 1 :]
+            proof.transcript[:randind]
+            + [2 * x if isinstance(x, Point) else x + 1]
+            + proof.transcript[randind + 1 :]
         )
         Verif = Verifier1(g, h, u, P, c, proof)
         with self.assertRaisesRegex(Exception, "Proof invalid"):
@@ -259,12 +316,13 @@ class InnerProductArgumentTest(unittest.TestCase):
         b = [mod_hash(str(i).encode() + seeds[4], p) for i in range(N)]
         P = vector_commitment(g, h, a, b)
         c = inner_product(a, b)
-        Prov = NIProver(g, h, u, P, c, a, b, CURVE, seeds[5])
+        Prov = NIProver(g, h, u, P, c, a, b, CURVE, seed=seeds[5])
         proof = Prov.prove()
         randind = randint(0, len(proof.proof2.transcript) - 1)
-        proof.transcript = (
+        x = proof.proof2.transcript[randind]
+        proof.proof2.transcript = (
             proof.proof2.transcript[:randind]
-            + os.urandom(1)
+            + [2 * x if isinstance(x, Point) else x + 1]
             + proof.proof2.transcript[randind + 1 :]
         )
         Verif = Verifier1(g, h, u, P, c, proof)
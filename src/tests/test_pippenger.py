@@ -0,0 +1,198 @@
+import unittest
+from random import randint
+from fastecdsa.point import Point
+
+from src.group import EC, JacobianEC, MultIntModP
+from src.pippenger import (
+    Pippenger, PipCURVE, CURVE, FixedBaseTable, FixedBasePoint, linear_combination, straus, wnaf,
+    STRATEGIES,
+)
+from src.utils.commitments import commitment, vector_commitment
+from src.utils.utils import ModP
+from src.utils.elliptic_curve_hash import elliptic_hash
+
+
+class PippengerTest(unittest.TestCase):
+    def test_bucket_modp(self):
+        p, order = 1000003, 1000002
+        Pip = Pippenger(MultIntModP(p, order))
+        for N in [1, 2, 3, 10, 33, 100]:
+            gs = [ModP(randint(1, p - 1), p) for _ in range(N)]
+            es = [randint(0, order - 1) for _ in range(N)]
+            expected = ModP(1, p)
+            for g, e in zip(gs, es):
+                expected = expected * (g ** e)
+            with self.subTest(N=N):
+                self.assertEqual(Pip.multiexp(gs, es, method="bucket"), expected)
+                self.assertEqual(Pip.multiexp(gs, es, method="subset"), expected)
+
+    def test_strategies(self):
+        p, order = 1000003, 1000002
+        modp = [ModP(randint(1, p - 1), p) for _ in range(12)]
+        ec = [elliptic_hash(str(i).encode() + b"strategy", CURVE) for i in range(12)]
+        for group, gs, unit in [
+            (MultIntModP(p, order), modp, ModP(1, p)),
+            (EC(CURVE), ec, Point.IDENTITY_ELEMENT),
+        ]:
+            Pip = Pippenger(group)
+            for N in [0, 1, 2, 7, 12]:
+                es = [randint(0, order - 1) for _ in range(N)]
+                expected = Pippenger(group).multiexp(gs[:N], es, method="naive")
+                for method in STRATEGIES:
+                    with self.subTest(group=type(group).__name__, N=N, method=method):
+                        self.assertEqual(Pip.multiexp(gs[:N], es, method=method), expected)
+                self.assertEqual(Pip.multiexp(gs[:N], es), expected)
+            self.assertEqual(Pip.multiexp(gs[:2], [0, 0], method="naive"), unit)
+        with self.assertRaises(ValueError):
+            PipCURVE.multiexp(ec[:1], [1], method="unknown")
+
+    def test_auto_selection(self):
+        Pip = Pippenger(EC(CURVE), thresholds=[(1, "naive"), (4, "straus"), (None, "bucket")])
+        gs = [elliptic_hash(str(i).encode() + b"auto", CURVE) for i in range(4)]
+        self.assertEqual([Pip.select(gs[:N]) for N in [1, 2, 4]], ["naive", "straus", "straus"])
+        self.assertEqual(Pip.select(gs * 2), "bucket")
+        self.assertEqual(Pip.select(FixedBaseTable(gs)), "fixed")
+        timings = Pip.calibrate(gs, sizes=[1, 4], methods=("naive", "straus"), repeat=1)
+        self.assertEqual(sorted(timings), [1, 4])
+        self.assertEqual(Pip.thresholds[-1][0], None)
+        self.assertIn(Pip.select(gs), ("naive", "straus"))
+
+    def test_bucket_ec(self):
+        Pip = Pippenger(EC(CURVE))
+        for N in [1, 2, 5, 16]:
+            gs = [elliptic_hash(str(i).encode(), CURVE) for i in range(N)]
+            es = [randint(0, CURVE.q - 1) for _ in range(N)]
+            expected = Point.IDENTITY_ELEMENT
+            for g, e in zip(gs, es):
+                expected = expected + e * g
+            with self.subTest(N=N):
+                self.assertEqual(Pip.multiexp(gs, es), expected)
+
+    def test_bucket_edge_cases(self):
+        Pip = Pippenger(EC(CURVE))
+        g = elliptic_hash(b"edge", CURVE)
+        self.assertEqual(Pip.multiexp([], []), Point.IDENTITY_ELEMENT)
+        self.assertEqual(Pip.multiexp([g, g], [0, 0]), Point.IDENTITY_ELEMENT)
+        self.assertEqual(Pip.multiexp([g, g], [1, -1]), Point.IDENTITY_ELEMENT)
+        self.assertEqual(Pip.multiexp([g], [CURVE.q - 1]), -g)
+
+    def test_jacobian(self):
+        J = EC(CURVE).internal
+        self.assertIsInstance(J, JacobianEC)
+        g = elliptic_hash(b"jacobian", CURVE)
+        h = elliptic_hash(b"coordinates", CURVE)
+        x, y = J.lift(g), J.lift(h)
+        # Points with Z != 1 go through add-2007-bl instead of madd-2007-bl
+        x2, y2 = J.square(x), J.square(y)
+        self.assertEqual(J.lower(x), g)
+        self.assertEqual(J.lower(x2), g + g)
+        self.assertEqual(J.lower(J.mult(x, y)), g + h)
+        self.assertEqual(J.lower(J.mult(x2, y)), 2 * g + h)
+        self.assertEqual(J.lower(J.mult(x, y2)), g + 2 * h)
+        self.assertEqual(J.lower(J.mult(x2, y2)), 2 * g + 2 * h)
+        self.assertEqual(J.lower(J.mult(x2, J.mult(x, x))), 4 * g)
+        self.assertEqual(J.lower(J.mult(x2, J.inverse(J.mult(x, x)))), Point.IDENTITY_ELEMENT)
+        self.assertEqual(J.lower(J.mult(J.unit, y2)), 2 * h)
+        self.assertEqual(J.lift(Point.IDENTITY_ELEMENT), J.unit)
+
+    def test_batch_affine(self):
+        G = EC(CURVE)
+        J = G.internal
+        ps = [elliptic_hash(str(i).encode() + b"batch", CURVE) for i in range(6)]
+        xs = [Point.IDENTITY_ELEMENT, ps[1], ps[2], ps[3], ps[4], -ps[5]]
+        ys = [ps[0], Point.IDENTITY_ELEMENT, ps[2], -ps[3], ps[5], ps[0]]
+        self.assertEqual(G.add_many(xs, ys), [x + y for x, y in zip(xs, ys)])
+        Js = [J.square(J.lift(P)) for P in ps] + [J.unit, J.lift(ps[0])]
+        self.assertEqual(G.lower_many(Js), [J.lower(x) for x in Js])
+        self.assertEqual(G.lower_many([]), [])
+        # Enough additions per round to go through the affine rounds
+        lists = [[J.lift(P) for P in ps] * 6, [], [J.lift(ps[0]), J.inverse(J.lift(ps[0]))], Js]
+        sums = J.sum_many(lists)
+        self.assertIsNone(sums[1])
+        for elems, total in zip(lists, sums):
+            if elems:
+                self.assertEqual(J.lower(total), sum(map(J.lower, elems), Point.IDENTITY_ELEMENT))
+
+    def test_signed_digits(self):
+        for c in range(2, 9):
+            for _ in range(50):
+                e = randint(0, 2 ** 252)
+                n_windows = 252 // c + 2
+                digits = Pippenger.signed_digits(e, c, n_windows)
+                self.assertTrue(all(abs(d) <= 2 ** (c - 1) for d in digits))
+                self.assertEqual(sum(d << (c * k) for k, d in enumerate(digits)), e)
+
+
+class StrausTest(unittest.TestCase):
+    def test_wnaf(self):
+        for w in range(2, 7):
+            for e in [0, 1, 2 ** 252 - 1] + [randint(0, 2 ** 252) for _ in range(20)]:
+                digits = wnaf(e, w)
+                self.assertEqual(sum(d << k for k, d in enumerate(digits)), e)
+                nonzero = [k for k, d in enumerate(digits) if d]
+                self.assertTrue(all(d % 2 and abs(d) < 2 ** (w - 1) for d in digits if d))
+                self.assertTrue(all(b - a >= w for a, b in zip(nonzero, nonzero[1:])))
+
+    def test_straus_modp(self):
+        p, order = 1000003, 1000002
+        G = MultIntModP(p, order)
+        gs = [ModP(randint(1, p - 1), p) for _ in range(5)]
+        es = [randint(0, order - 1) for _ in range(5)]
+        expected = ModP(1, p)
+        for g, e in zip(gs, es):
+            expected = expected * (g ** e)
+        self.assertEqual(straus(G, gs, es), expected)
+        self.assertEqual(straus(G, gs, [0] * 5), G.unit)
+
+    def test_linear_combination(self):
+        ps = [elliptic_hash(str(i).encode() + b"straus", CURVE) for i in range(4)]
+        fixed = FixedBasePoint.from_point(ps[3])
+        cases = [
+            ([ps[0], ps[1]], [randint(0, CURVE.q - 1), randint(0, CURVE.q - 1)]),
+            ([ps[0], ps[1], ps[2]], [1, -1, CURVE.q - 2]),
+            ([ps[0], fixed, ps[2]], [randint(0, CURVE.q - 1), 5, 0]),
+            ([ps[0], Point.IDENTITY_ELEMENT], [3, 4]),
+            ([ps[0], ps[0]], [1, -1]),
+            ([Point.IDENTITY_ELEMENT], [1]),
+        ]
+        for points, scalars in cases:
+            expected = Point.IDENTITY_ELEMENT
+            for P, e in zip(points, scalars):
+                if P != Point.IDENTITY_ELEMENT:
+                    expected = expected + (e % CURVE.q) * P
+            with self.subTest(scalars=scalars):
+                self.assertEqual(linear_combination(points, scalars), expected)
+        x = ModP(randint(0, CURVE.q - 1), CURVE.q)
+        self.assertEqual(commitment(ps[0], ps[1], x, 7), x * ps[0] + 7 * ps[1])
+        with self.assertRaises(Exception):
+            linear_combination(ps[:2], [1, 2, 3])
+
+
+class FixedBaseTest(unittest.TestCase):
+    def test_fixed_base_table(self):
+        gs = [elliptic_hash(str(i).encode() + b"g", CURVE) for i in range(8)]
+        hs = [elliptic_hash(str(i).encode() + b"h", CURVE) for i in range(8)]
+        gs_table, hs_table = FixedBaseTable(gs), FixedBaseTable(hs)
+        a = [randint(0, CURVE.q - 1) for _ in range(8)]
+        b = [ModP(randint(0, CURVE.q - 1), CURVE.q) for _ in range(8)]
+        expected = PipCURVE.multiexp(gs + hs, a + b)
+        self.assertEqual(vector_commitment(gs_table, hs_table, a, b), expected)
+        self.assertEqual(vector_commitment(gs_table, hs, a, b), expected)
+        self.assertEqual(list(gs_table[2:5]), gs[2:5])
+        self.assertEqual(gs_table[3], gs[3])
+        self.assertEqual(
+            gs_table[4:].multiexp(a[4:]), PipCURVE.multiexp(gs[4:], a[4:])
+        )
+        self.assertEqual(gs_table.multiexp([0] * 8), Point.IDENTITY_ELEMENT)
+
+    def test_fixed_base_point(self):
+        g = elliptic_hash(b"fixed", CURVE)
+        h = elliptic_hash(b"base", CURVE)
+        fg, fh = FixedBasePoint.from_point(g), FixedBasePoint.from_point(h, window=4)
+        self.assertEqual(fg, g)
+        for _ in range(10):
+            x, r = ModP(randint(0, CURVE.q - 1), CURVE.q), randint(0, CURVE.q - 1)
+            with self.subTest(x=x, r=r):
+                self.assertEqual(commitment(fg, fh, x, r), commitment(g, h, x, r))
+        self.assertEqual(0 * fg, Point.IDENTITY_ELEMENT)
+        self.assertEqual(-1 * fg, -g)
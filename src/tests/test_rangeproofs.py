@@ -1,19 +1,50 @@
 import unittest
 import os
 from random import randint
+from fastecdsa.point import Point
 from src.innerproduct.inner_product_prover import NIProver, FastNIProver2
 from src.innerproduct.inner_product_verifier import Verifier1, Verifier2
 from src.pippenger import CURVE
 from src.utils.commitments import vector_commitment, commitment
-from src.utils.utils import mod_hash, inner_product, ModP
+from src.utils.utils import mod_hash, mod_hash_many, inner_product, ModP
+from src.utils.transcript import Transcript
 from src.utils.elliptic_curve_hash import elliptic_hash
-from src.rangeproofs import NIRangeProver, RangeVerifier
+from src.rangeproofs.rangeproof_verifier import Proof
+from src.rangeproofs import (
+    NIRangeProver,
+    RangeVerifier,
+    prove_many,
+    RangeProofParams,
+    ProvingStats,
+    ChallengePowers,
+    delta,
+)
 
 
 p = CURVE.q
 
 
 class RangeProofTest(unittest.TestCase):
+    def test_challenge_powers(self):
+        y0, z0 = mod_hash(os.urandom(10), p), mod_hash(os.urandom(10), p)
+        one = ModP(1, p)
+        cases = [(y0, z0, 1, 1), (y0, z0, 8, 1), (y0, z0, 4, 3), (one, z0, 4, 3), (y0, one, 4, 3)]
+        for y, z, n, m in cases:
+            powers = ChallengePowers(y, z, n, m)
+            self.assertEqual(list(powers.y_n), [y ** i for i in range(n * m)])
+            self.assertEqual(list(powers.y_inv_n), [y.inv() ** i for i in range(n * m)])
+            self.assertEqual(list(powers.z_j), [z ** (2 + j) for j in range(m)])
+            self.assertEqual(
+                list(powers.z_two),
+                [z ** (2 + i // n) * ModP(2 ** (i % n), p) for i in range(n * m)],
+            )
+            expected = (z - z ** 2) * sum([y ** i for i in range(n * m)], ModP(0, p)) - sum(
+                [z ** (j + 2) * ModP(2 ** n - 1, p) for j in range(1, m + 1)], ModP(0, p)
+            )
+            self.assertEqual(delta(y, z, n, m), expected)
+            self.assertEqual(powers.delta(), expected)
+        self.assertIs(ChallengePowers(y0, z0, 8).two_n, ChallengePowers(z0, y0, 8, 2).two_n)
+
     def test_different_seeds(self):
         for _ in range(10):
             seeds = [os.urandom(10) for _ in range(7)]
@@ -96,18 +127,108 @@ class RangeProofTest(unittest.TestCase):
         h = elliptic_hash(seeds[3], CURVE)
         u = elliptic_hash(seeds[4], CURVE)
         gamma = mod_hash(seeds[5], p)
-        V = commitment(g, h, v+1, gamma)
+        V = commitment(g, h, v, gamma)
         Prov = NIRangeProver(v, n, g, h, gs, hs, gamma, u, CURVE, seeds[6])
         proof = Prov.prove()
-        while True:
-            randind = randint(0, len(proof.transcript) - 1)
-            new = str(randint(0,9)).encode()
-            if proof.transcript[randind] not in [b'&', new]:
-                proof.transcript = (
-                    proof.transcript[:randind] + new + proof.transcript[randind + 1 :]
-                )
-                break
+        randind = randint(0, len(proof.transcript) - 1)
+        x = proof.transcript[randind]
+        proof.transcript = (
+            proof.transcript[:randind]
+            + [2 * x if isinstance(x, Point) else x + 1]
+            + proof.transcript[randind + 1 :]
+        )
         Verif = RangeVerifier(V, g, h, gs, hs, u, proof)
         with self.subTest(v=v, n=n, randind=randind):
             with self.assertRaisesRegex(Exception, "Proof invalid"):
                 Verif.verify()
+
+    def test_blindings_depend_on_witness(self):
+        seeds = [os.urandom(10) for _ in range(7)]
+        n = 16
+        gs = [elliptic_hash(str(i).encode() + seeds[0], CURVE) for i in range(n)]
+        hs = [elliptic_hash(str(i).encode() + seeds[1], CURVE) for i in range(n)]
+        g = elliptic_hash(seeds[2], CURVE)
+        h = elliptic_hash(seeds[3], CURVE)
+        u = elliptic_hash(seeds[4], CURVE)
+        v, gamma = ModP(randint(0, 2 ** n - 1), p), mod_hash(seeds[5], p)
+        proof = NIRangeProver(v, n, g, h, gs, hs, gamma, u, CURVE, seeds[6]).prove()
+        # S only commits to blindings, which change with the witness under the same seed
+        other = NIRangeProver(v, n, g, h, gs, hs, gamma + 1, u, CURVE, seeds[6]).prove()
+        self.assertNotEqual(other.S, proof.S)
+        # tau1 and tau2 cannot be recomputed from the public transcript to solve for gamma
+        tau1, tau2 = mod_hash_many(b"tau" + Transcript.digest_to_bytes(proof.transcript[:5]), 2, p)
+        z, x = ModP(proof.transcript[4], p), ModP(proof.transcript[7], p)
+        self.assertNotEqual((proof.taux - tau2 * x * x - tau1 * x) * (z * z).inv(), gamma)
+
+    def test_fused_verification(self):
+        for i in range(1, 7):
+            seeds = [os.urandom(10) for _ in range(7)]
+            v, n = ModP(randint(0, 2 ** (2 ** i) - 1), p), 2 ** i
+            gs = [elliptic_hash(str(i).encode() + seeds[0], CURVE) for i in range(n)]
+            hs = [elliptic_hash(str(i).encode() + seeds[1], CURVE) for i in range(n)]
+            g = elliptic_hash(seeds[2], CURVE)
+            h = elliptic_hash(seeds[3], CURVE)
+            u = elliptic_hash(seeds[4], CURVE)
+            gamma = mod_hash(seeds[5], p)
+            V = commitment(g, h, v, gamma)
+            Prov = NIRangeProver(v, n, g, h, gs, hs, gamma, u, CURVE, seeds[6])
+            proof = Prov.prove()
+            with self.subTest(v=v, n=n, seeds=seeds):
+                self.assertTrue(RangeVerifier(V, g, h, gs, hs, u, proof).verify(fused=True))
+                Verif = RangeVerifier(V + g, g, h, gs, hs, u, proof)
+                with self.assertRaisesRegex(Exception, "Proof invalid"):
+                    Verif.verify(fused=True)
+
+    def test_prove_many(self):
+        seeds = [os.urandom(10) for _ in range(5)]
+        n = 16
+        gs = [elliptic_hash(str(i).encode() + seeds[0], CURVE) for i in range(n)]
+        hs = [elliptic_hash(str(i).encode() + seeds[1], CURVE) for i in range(n)]
+        g = elliptic_hash(seeds[2], CURVE)
+        h = elliptic_hash(seeds[3], CURVE)
+        u = elliptic_hash(seeds[4], CURVE)
+        params = RangeProofParams(n, g, h, gs, hs, u, CURVE)
+        vs = [randint(0, 2 ** n - 1) for _ in range(5)]
+        gammas = [mod_hash(os.urandom(10), p) for _ in range(5)]
+        stats = ProvingStats()
+        proofs = dict(prove_many(vs, gammas, params, workers=2, stats=stats))
+        self.assertEqual(sorted(proofs), list(range(5)))
+        self.assertEqual(stats.count, 5)
+        for i, proof in proofs.items():
+            V = commitment(g, h, ModP(vs[i], p), gammas[i])
+            with self.subTest(i=i):
+                self.assertTrue(RangeVerifier(V, g, h, gs, hs, u, proof).verify())
+
+    def test_serialization(self):
+        seeds = [os.urandom(10) for _ in range(5)]
+        n = 16
+        gs = [elliptic_hash(str(i).encode() + seeds[0], CURVE) for i in range(n)]
+        hs = [elliptic_hash(str(i).encode() + seeds[1], CURVE) for i in range(n)]
+        g = elliptic_hash(seeds[2], CURVE)
+        h = elliptic_hash(seeds[3], CURVE)
+        u = elliptic_hash(seeds[4], CURVE)
+        Vs, proofs = [], []
+        for _ in range(3):
+            v, gamma = ModP(randint(0, 2 ** n - 1), p), mod_hash(os.urandom(10), p)
+            Vs.append(commitment(g, h, v, gamma))
+            proofs.append(NIRangeProver(v, n, g, h, gs, hs, gamma, u, CURVE, os.urandom(10)).prove())
+        data = [proof.to_bytes() for proof in proofs]
+        decoded = Proof.from_bytes(data[0])
+        self.assertEqual(decoded.transcript, proofs[0].transcript)
+        self.assertEqual(decoded.innerProof.proof2.transcript, proofs[0].innerProof.proof2.transcript)
+        self.assertEqual(
+            [(d.taux, d.mu, d.t_hat) for d in Proof.iter_from_bytes(b"".join(data))],
+            [(d.taux, d.mu, d.t_hat) for d in proofs],
+        )
+        for V, proof in zip(Vs, Proof.iter_from_bytes(bytearray(b"".join(data)))):
+            self.assertTrue(RangeVerifier(V, g, h, gs, hs, u, proof).verify())
+        with self.assertRaisesRegex(ValueError, "Truncated"):
+            Proof.from_bytes(data[0][:-1])
+        with self.assertRaisesRegex(ValueError, "version"):
+            Proof.from_bytes(b"\x02" + data[0][1:])
+        # Int seeds are reduced like bytes seeds, so any seed can be encoded
+        v, gamma = ModP(5, p), mod_hash(os.urandom(10), p)
+        proof = NIRangeProver(v, n, g, h, gs, hs, gamma, u, CURVE, 2 ** 300 + 1).prove()
+        decoded = Proof.from_bytes(proof.to_bytes())
+        self.assertEqual(decoded.transcript, proof.transcript)
+        self.assertTrue(RangeVerifier(commitment(g, h, v, gamma), g, h, gs, hs, u, decoded).verify())
@@ -1,13 +1,33 @@
 import unittest
 import os
+import tempfile
+import threading
 from random import randint
-from src.pippenger import CURVE
+from src.pippenger import CURVE, PipCURVE
 
 from src.utils.utils import (
     mod_hash,
+    mod_hash_many,
     point_to_bytes,
+    bytes_to_point,
+    mod_sqrt,
+    inner_product,
+    ModP,
+    ScalarVector,
+    batch_inverse,
+    egcd,
+    set_inverse_backend,
+    DEFAULT_INVERSE_BACKEND,
+    INVERSE_BACKENDS,
+    gmpy2,
 )
 from src.utils.elliptic_curve_hash import elliptic_hash
+from src.utils.transcript import Transcript
+from src.utils.generators import GeneratorSet, GeneratorVector, _point_to_bytes
+from src.benchmarks import harness
+from src.utils import instrumentation, utils
+from src.rangeproofs import NIRangeProver, RangeVerifier
+from src.utils.commitments import commitment
 
 
 class HashTest(unittest.TestCase):
@@ -16,12 +36,26 @@ class HashTest(unittest.TestCase):
         x = mod_hash(b"test", p)
         self.assertLess(x.x, p)
         self.assertEqual(x, mod_hash(b"test", p))
+        # Mod a small prime every residue, 0 included, is hit by about 1 message in 17
         p = 17
+        residues = set()
         for _ in range(100):
             msg = os.urandom(10)
             x = mod_hash(msg, p)
             with self.subTest(msg=msg, p=p):
-                self.assertNotEqual(x.x, 0)
+                self.assertTrue(0 <= x.x < p)
+            residues.add(x.x)
+        self.assertGreater(len(residues), 1)
+
+    def test_mod_hash_many(self):
+        p = CURVE.q
+        xs = mod_hash_many(b"prefix", 10, p)
+        self.assertEqual(len(xs), 10)
+        self.assertEqual(xs, mod_hash_many(b"prefix", 10, p))
+        self.assertEqual(xs[:4], mod_hash_many(b"prefix", 4, p))
+        self.assertEqual(xs[3], mod_hash(b"prefix" + (3).to_bytes(4, "little"), p))
+        self.assertEqual(len(set(xs.xs)), 10)
+        self.assertNotEqual(xs, mod_hash_many(b"prefiy", 10, p))
 
     def test_elliptic_hash(self):
         for _ in range(100):
@@ -29,3 +63,337 @@ class HashTest(unittest.TestCase):
             x = elliptic_hash(msg, CURVE)
             with self.subTest(msg=msg):
                 self.assertTrue(CURVE.is_point_on_curve((x.x, x.y)))
+
+    def test_point_compression(self):
+        for _ in range(20):
+            P = elliptic_hash(os.urandom(10), CURVE)
+            for Q in [P, -P]:
+                data = point_to_bytes(Q)
+                self.assertEqual(len(data), 33)
+                self.assertEqual(bytes_to_point(data, CURVE), Q)
+        identity = point_to_bytes(P + -P)
+        self.assertEqual(bytes_to_point(identity, CURVE), P + -P)
+        with self.assertRaises(ValueError):
+            bytes_to_point(b"\x05" + data[1:], CURVE)
+
+    def test_mod_sqrt(self):
+        for p in [1009, 17, CURVE.p, CURVE.q]:
+            for _ in range(20):
+                x = randint(0, p - 1)
+                with self.subTest(p=p, x=x):
+                    self.assertIn(mod_sqrt(x * x % p, p), [x, (p - x) % p])
+            with self.assertRaises(ValueError):
+                mod_sqrt(11, 1009)
+
+
+class TranscriptTest(unittest.TestCase):
+    def test_incremental_transcript(self):
+        p = CURVE.q
+        seed = os.urandom(10)
+        transcripts = [Transcript(seed), Transcript(seed, incremental=False)]
+        positions = []
+        for i in range(5):
+            P = elliptic_hash(str(i).encode() + seed, CURVE)
+            challenges = []
+            for t in transcripts:
+                t.add_list_points([P, -P])
+                t.extend([ModP(i, p), i])
+                challenges.append(t.get_modp(p))
+                t.add_number(challenges[-1])
+            positions.append(len(transcripts[0].digest) - 1)
+            self.assertEqual(challenges[0], challenges[1])
+            self.assertEqual(challenges[0], Transcript.digest_to_hash(transcripts[0].digest[:-1], p))
+        self.assertEqual(transcripts[0].digest, transcripts[1].digest)
+        digest = transcripts[0].digest
+        self.assertEqual(
+            Transcript.prefix_hashes(digest, positions, p), [digest[i] for i in positions]
+        )
+
+class ScalarVectorTest(unittest.TestCase):
+    def test_operations(self):
+        p = 1009
+        a = [ModP(randint(0, p - 1), p) for _ in range(8)]
+        b = [ModP(randint(0, p - 1), p) for _ in range(8)]
+        x = ModP(randint(1, p - 1), p)
+        va, vb = ScalarVector(a, p), ScalarVector(b, p)
+        self.assertEqual(list(va + vb), [ai + bi for ai, bi in zip(a, b)])
+        self.assertEqual(list(va - vb), [ai - bi for ai, bi in zip(a, b)])
+        self.assertEqual(list(va * vb), [ai * bi for ai, bi in zip(a, b)])
+        self.assertEqual(list(va * x), [ai * x for ai in a])
+        self.assertEqual(list(va - 1), [ai - 1 for ai in a])
+        self.assertEqual(va.inner(vb), inner_product(a, b))
+        self.assertEqual(inner_product(va, vb), inner_product(a, b))
+        self.assertEqual(inner_product(va, b), inner_product(a, b))
+        self.assertEqual(inner_product(a, vb), inner_product(a, b))
+        self.assertEqual(list(ScalarVector.powers(x, 8, p)), [x ** i for i in range(8)])
+        self.assertEqual(
+            list(va.fold(x, x.inv())),
+            [x * a[i] + x.inv() * a[i + 4] for i in range(4)],
+        )
+        self.assertEqual(va[2:5], ScalarVector(a[2:5], p))
+        self.assertEqual(va[3], a[3])
+
+    def test_batch_inverse(self):
+        p = CURVE.q
+        xs = [ModP(randint(1, p - 1), p) for _ in range(20)]
+        self.assertEqual(batch_inverse(xs), [x.inv() for x in xs])
+        self.assertEqual(batch_inverse([]), [])
+        with self.assertRaisesRegex(Exception, "modular inverse does not exist"):
+            batch_inverse(xs + [ModP(0, p)])
+
+    def test_inverse_backends(self):
+        p = CURVE.q
+        xs = [randint(1, p - 1) for _ in range(20)]
+        g, a, b = egcd(xs[0], p)
+        self.assertEqual((g, a * xs[0] + b * p), (1, 1))
+        try:
+            for name in INVERSE_BACKENDS:
+                if name == "gmpy2" and gmpy2 is None:
+                    continue
+                for cache_size in [0, 16]:
+                    set_inverse_backend(name, cache_size)
+                    with self.subTest(backend=name, cache_size=cache_size):
+                        for x in xs + xs:
+                            self.assertEqual(ModP(x, p).inv() * x, 1)
+                        with self.assertRaisesRegex(Exception, "modular inverse does not exist"):
+                            ModP(p, p).inv()
+            # Batch inversions and normalizations do not evict the cached challenges
+            set_inverse_backend(DEFAULT_INVERSE_BACKEND, 16)
+            batch_inverse([ModP(x, p) for x in xs])
+            PipCURVE.multiexp([CURVE.G] * 4, xs[:4])
+            self.assertEqual(utils._inverse.cache_info().currsize, 0)
+            ModP(xs[0], p).inv()
+            self.assertEqual(utils._inverse.cache_info().currsize, 1)
+        finally:
+            set_inverse_backend(DEFAULT_INVERSE_BACKEND)
+
+
+class GeneratorSetTest(unittest.TestCase):
+    def test_generator_set(self):
+        seed = os.urandom(10)
+        gs = [elliptic_hash(str(i).encode() + seed, CURVE) for i in range(12)]
+        gens = GeneratorSet(seed, CURVE, 4)
+        self.assertEqual(list(gens), gs[:4])
+        gens.ensure(8)
+        self.assertEqual(gens[:8], gs[:8])
+        es = [randint(0, CURVE.q - 1) for _ in range(12)]
+        self.assertEqual(gens.table(6).multiexp(es[:6]), PipCURVE.multiexp(gs[:6], es[:6]))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "generators.bin")
+            shared = GeneratorSet.get(seed, CURVE, 8, path=path)
+            self.assertIs(GeneratorSet.get(seed, CURVE, 4), shared)
+            shared.table()
+            GeneratorSet._sets.clear()
+            loaded = GeneratorSet.get(seed, CURVE, 12, path=path)
+            self.assertIsNot(loaded, shared)
+            self.assertEqual(list(loaded), gs)
+            self.assertEqual(loaded.table().multiexp(es), PipCURVE.multiexp(gs, es))
+            self.assertEqual(len(GeneratorSet.load(path)), 12)
+            with self.assertRaises(ValueError):
+                GeneratorSet.get(os.urandom(10), CURVE, path=path)
+            with self.assertRaisesRegex(ValueError, "already saved"):
+                GeneratorSet.get(seed, CURVE, path=os.path.join(tmp, "other.bin"))
+
+            # Concurrent callers share a single set
+            GeneratorSet._sets.clear()
+            results = []
+            threads = [
+                threading.Thread(target=lambda: results.append(GeneratorSet.get(seed, path=path)))
+                for _ in range(4)
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(len(set(map(id, results))), 1)
+            loaded = results[0]
+
+            # Swapped generators are caught by the digest, or by a full check if the
+            # digest matches them
+            with open(path, "rb") as f:
+                data = f.read()
+            g5, g6 = [_point_to_bytes(P) for P in gs[5:7]]
+            with open(path, "wb") as f:
+                f.write(data.replace(g5 + g6, g6 + g5))
+            with self.assertRaisesRegex(ValueError, "corrupted"):
+                GeneratorSet.load(path)
+            loaded.points[5], loaded.points[6] = gs[6], gs[5]
+            loaded.save(path)
+            with self.assertRaisesRegex(ValueError, "seed"):
+                GeneratorSet.load(path, check=12)
+            loaded.points[5], loaded.points[6] = gs[5], gs[6]
+            loaded.save(path)
+
+            with open(path, "r+b") as f:
+                f.truncate(os.path.getsize(path) - 1)
+            with self.assertRaisesRegex(ValueError, "truncated"):
+                GeneratorSet.load(path)
+        GeneratorSet._sets.clear()
+
+    def test_generator_vector(self):
+        seed = os.urandom(10)
+        gs = [elliptic_hash(str(i).encode() + seed, CURVE) for i in range(16)]
+        gens = GeneratorSet(seed)
+        vector = gens.vector()
+        self.assertEqual(len(vector), 0)
+        self.assertEqual(vector[3], gs[3])
+        prefix = vector[:8]
+        self.assertIsInstance(prefix, GeneratorVector)
+        self.assertEqual(list(prefix), gs[:8])
+        self.assertEqual(list(prefix[2:5]), gs[2:5])
+        self.assertEqual(prefix[-1], gs[7])
+        self.assertEqual(prefix + gs[8:10], gs[:10])
+        self.assertEqual(gs[:2] + prefix[:2], gs[:2] + gs[:2])
+        with self.assertRaises(IndexError):
+            prefix[8]
+        with self.assertRaises(IndexError):
+            vector[2:]
+
+        # Indexing an unbounded vector element by element grows a persisted set by doubling
+        with tempfile.TemporaryDirectory() as tmp:
+            persisted = GeneratorSet(seed, path=os.path.join(tmp, "generators.bin"))
+            saves = []
+            save = persisted.save
+            persisted.save = lambda path: saves.append(path) or save(path)
+            self.assertEqual([persisted.vector()[i] for i in range(16)], gs)
+            self.assertEqual(len(saves), 5)
+
+        threads = [threading.Thread(target=gens.ensure, args=(k,)) for k in range(4, 17, 3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(gens.points, gs)
+
+
+class BenchmarkTest(unittest.TestCase):
+    def test_harness(self):
+        self.assertEqual(harness.percentile([3, 1, 2], 50), 2)
+        self.assertEqual(harness.percentile([1, 2], 99), 1.99)
+        result = harness.measure("sum", lambda: sum(range(1000)), {"size": 1000}, runs=3)
+        self.assertEqual(result.key, "sum size=1000")
+        self.assertTrue(0 < result.p50 <= result.p99)
+        self.assertGreater(result.ops_per_s, 0)
+
+        # The tracer only sees the timed calls, and is removed even if one fails
+        def traced():
+            with instrumentation.phase("traced"):
+                pass
+
+        flame = instrumentation.FlameGraph()
+        harness.measure("traced", traced, runs=3, tracer=flame)
+        self.assertEqual(flame.spans["traced"][0], 3)
+        calls = []
+
+        def failing():
+            calls.append(1)
+            if len(calls) > 1:
+                raise ValueError("timed call")
+
+        with self.assertRaises(ValueError):
+            harness.measure("failing", failing, runs=1, tracer=flame)
+        self.assertEqual(instrumentation._tracers, [])
+
+        old = [result, result._replace(name="other", p50=1.0)]
+        new = [result._replace(p50=result.p50 * 2), result._replace(name="other", p50=0.5)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "results.json")
+            harness.save(new, path)
+            self.assertEqual(harness.load(path), new)
+        regressions, improvements, changes = harness.compare(old, new, threshold=0.1)
+        self.assertEqual([c.key for c in regressions], ["sum size=1000"])
+        self.assertEqual([c.key for c in improvements], ["other size=1000"])
+        self.assertEqual(len(changes), 2)
+
+
+class InstrumentationTest(unittest.TestCase):
+    def test_count_operations(self):
+        n = 8
+        gs = GeneratorSet.get(b"instrumentation/gs").vector()[:n]
+        hs = GeneratorSet.get(b"instrumentation/hs").vector()[:n]
+        g, h, u = [elliptic_hash(str(i).encode() + b"instrumentation", CURVE) for i in range(3)]
+        v, gamma = ModP(5, CURVE.q), mod_hash(b"gamma", CURVE.q)
+        mul = ModP.__mul__
+        prover = NIRangeProver(v, n, g, h, list(gs), list(hs), gamma, u, CURVE, b"seed")
+        with instrumentation.count_operations() as report:
+            proof = prover.prove()
+            with self.assertRaises(RuntimeError):
+                with instrumentation.count_operations():
+                    pass
+            RangeVerifier(commitment(g, h, v, gamma), g, h, list(gs), list(hs), u, proof).verify()
+        self.assertIsNone(instrumentation.active)
+        self.assertIs(ModP.__mul__, mul)
+
+        for path in ["prove;A/S commit", "prove;t1/t2", "prove;P", "prove;IPA", "verify;verify P"]:
+            self.assertIn(path, report.phases)
+        self.assertIn("prove;IPA;IPA round 3", report.phases)
+        self.assertNotIn("prove;IPA;IPA round 4", report.phases)
+        self.assertGreater(report.phase("A/S commit")["multiexp"], 0)
+        self.assertGreater(report.phase("IPA round 1")["hash"], 0)
+        totals = report.totals()
+        self.assertEqual(totals["multiexp_size"], sum(sum(v) for v in report.multiexp_sizes.values()))
+        for op in ["ec_add", "ec_double", "modp_mult", "inversion", "hash", "hash_bytes"]:
+            self.assertGreater(totals[op], 0, op)
+        self.assertEqual(report.as_dict()["totals"], dict(totals))
+
+        # Nothing is counted outside of the block
+        prover.transcript = Transcript(b"seed")
+        prover.prove()
+        self.assertEqual(report.totals(), totals)
+
+    def test_count_inversions(self):
+        x = ModP(randint(1, CURVE.q - 1), CURVE.q)
+        try:
+            with instrumentation.count_operations() as report:
+                x.inv()
+                x.inv()
+                set_inverse_backend("egcd")
+            # The second inversion hits the cache
+            self.assertEqual(report.totals()["inversion"], 1)
+            self.assertIs(utils._backend, utils.INVERSE_BACKENDS["egcd"])
+        finally:
+            set_inverse_backend(DEFAULT_INVERSE_BACKEND)
+
+    def test_tracing(self):
+        events = []
+
+        class Recorder(instrumentation.Tracer):
+            def start(self, path, sizes):
+                events.append(("start", path, sizes))
+
+            def stop(self, path, sizes):
+                events.append(("stop", path, sizes))
+
+        flame = instrumentation.FlameGraph(sizes=True)
+        with instrumentation.tracing(Recorder(), flame):
+            with instrumentation.phase("prove", n=4):
+                with instrumentation.phase("IPA round 1", size=2):
+                    pass
+                with instrumentation.phase("IPA round 2", size=1):
+                    pass
+        with instrumentation.phase("untraced"):
+            pass
+        self.assertEqual(
+            events,
+            [
+                ("start", "prove", {"n": 4}),
+                ("start", "prove;IPA round 1", {"size": 2}),
+                ("stop", "prove;IPA round 1", {"size": 2}),
+                ("start", "prove;IPA round 2", {"size": 1}),
+                ("stop", "prove;IPA round 2", {"size": 1}),
+                ("stop", "prove", {"n": 4}),
+            ],
+        )
+        self.assertEqual(
+            list(flame.spans),
+            ["prove n=4;IPA round 1 size=2", "prove n=4;IPA round 2 size=1", "prove n=4"],
+        )
+        calls, total, self_time = flame.spans["prove n=4"]
+        self.assertEqual(calls, 1)
+        children = sum(flame.spans[path][1] for path in flame.spans if ";" in path)
+        self.assertAlmostEqual(self_time, total - children)
+        for line in flame.folded(unit=1e-9).splitlines():
+            path, value = line.rsplit(" ", 1)
+            self.assertIn(path, flame.spans)
+            self.assertGreater(int(value), 0)
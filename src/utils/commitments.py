@@ -1,16 +1,21 @@
 from fastecdsa.point import Point
-from src.pippenger import PipCURVE
+from src.pippenger import PipCURVE, FixedBaseTable, linear_combination
 
 
 def commitment(g, h, x, r):
-    return x * g + r * h
+    """Returns x * g + r * h with a double-scalar multiplication (see src.pippenger.straus)"""
+    return linear_combination([g, h], [x, r])
 
 
 def vector_commitment(g, h, a, b):
     assert len(g) == len(h) == len(a) == len(b)
     # return sum([ai*gi for ai,gi in zip(a,g)], Point(None,None,None)) \
     #         + sum([bi*hi for bi,hi in zip(b,h)], Point(None,None,None))
-    return PipCURVE.multiexp(g + h, a + b)
+    gh = g + h
+    if isinstance(gh, FixedBaseTable):
+        # Both halves carry precomputed tables with the same window
+        return gh.multiexp(list(a) + list(b))
+    return PipCURVE.multiexp(list(gh), list(a) + list(b))
 
 
 def _mult(a: int, g: Point) -> Point:
@@ -0,0 +1,317 @@
+"""
+Generators derived from a seed, shared between callers and persisted on disk.
+
+File layout of a persisted GeneratorSet (integers are big-endian):
+    - the magic bytes b"BPGENS02"
+    - the curve name and the seed, each one prefixed by its length as a uint16
+    - the number N of generators (uint64) and the window of the fixed-base table (uint8,
+      0 if the table is not stored)
+    - the sha256 digest of the points that follow
+    - the N generators, x and y in 32 bytes each
+    - if the window is not 0, for every generator the n_windows - 1 multiples of its
+      table row that follow the generator itself
+Points have a fixed size so that the file can be memory-mapped and read in place.
+"""
+
+import mmap
+import os
+import struct
+import threading
+from hashlib import sha256
+from typing import List
+
+from fastecdsa.point import Point
+
+from src.group import EC
+from src.pippenger import CURVE, FixedBasePoint, FixedBaseTable, Pippenger
+
+MAGIC = b"BPGENS02"
+COORD_SIZE = 32
+POINT_SIZE = 2 * COORD_SIZE
+LENGTH = struct.Struct(">H")
+COUNTS = struct.Struct(">QB")
+DIGEST_SIZE = 32
+
+# Tables of the base point of each curve, to derive the generators faster
+_base_points = {}
+
+
+def _base_point(curve) -> FixedBasePoint:
+    if curve.name not in _base_points:
+        _base_points[curve.name] = FixedBasePoint(curve.gx, curve.gy, curve)
+    return _base_points[curve.name]
+
+
+def derive_generator(seed: bytes, i: int, curve=CURVE) -> Point:
+    """Same point as elliptic_hash(str(i).encode() + seed, curve), with a fixed-base table"""
+    x = int(sha256(b"0" + str(i).encode() + seed).hexdigest(), 16) % curve.p
+    return _base_point(curve) * x
+
+
+class GeneratorSet:
+    """
+    The generators elliptic_hash(str(i).encode() + seed, curve) for i < len(self), as
+    used for gs and hs. Missing generators are derived when a larger set is requested.
+    GeneratorSet.get shares a set per (seed, curve) between its callers and, given a
+    path, loads it from disk and saves it back when it grows. The fixed-base table of
+    the generators can be built with table() and is then persisted along with them.
+    A set can be grown from several threads. vector() returns a GeneratorVector over it.
+    """
+
+    # Sets returned by get, keyed on (seed, curve name), and the lock guarding them
+    _sets = {}
+    _sets_lock = threading.Lock()
+
+    def __init__(self, seed: bytes, curve=CURVE, size: int = 0, path: str = None):
+        self.seed = seed
+        self.curve = curve
+        self.path = path
+        self.points = []
+        self.pip = Pippenger(EC(curve))
+        self.window = None
+        # Table rows of the generators, see FixedBaseTable
+        self.rows = []
+        self.lock = threading.RLock()
+        self.ensure(size)
+
+    @classmethod
+    def get(cls, seed: bytes, curve=CURVE, size: int = 0, path: str = None) -> "GeneratorSet":
+        """
+        Returns the shared set of generators of (seed, curve) with at least size elements.
+        If path is given, the set is loaded from it if it exists and saved to it when it
+        grows.
+        """
+        key = (seed, curve.name)
+        with cls._sets_lock:
+            gens = cls._sets.get(key)
+            if gens is not None and path is not None and gens.path is not None:
+                if os.path.abspath(path) != os.path.abspath(gens.path):
+                    raise ValueError(
+                        "The generators of this seed are already saved to {}".format(gens.path)
+                    )
+            if gens is None:
+                if path is not None and os.path.exists(path):
+                    gens = cls.load(path, curve)
+                    if gens.seed != seed:
+                        raise ValueError("{} holds the generators of another seed".format(path))
+                else:
+                    gens = cls(seed, curve)
+                cls._sets[key] = gens
+            gens.ensure(size)
+            if path is not None and gens.path is None:
+                # Under the lock of the set too, not to save it along with a growing ensure
+                with gens.lock:
+                    gens.path = path
+                    gens.save(path)
+        return gens
+
+    def ensure(self, size: int):
+        """Derives the generators up to size, and their table rows if there is a table"""
+        if size <= len(self.points):
+            return
+        with self.lock:
+            start = len(self.points)
+            if size <= start:
+                return
+            new_points = [
+                derive_generator(self.seed, i, self.curve) for i in range(start, size)
+            ]
+            if self.window is not None:
+                self.rows += FixedBaseTable(new_points, self.window, self.pip).rows
+            # Points are only appended, readers of the first len(self) ones need no lock
+            self.points += new_points
+            if self.path is not None:
+                self.save(self.path)
+
+    def __len__(self):
+        return len(self.points)
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def __getitem__(self, i):
+        return self.points[i]
+
+    def table(self, size: int = None, window: int = None) -> FixedBaseTable:
+        """
+        Returns a FixedBaseTable of the first size generators (all by default).
+        The rows are computed once, with the window of the first call.
+        """
+        size = len(self.points) if size is None else size
+        self.ensure(size)
+        with self.lock:
+            if self.window is None:
+                table = FixedBaseTable(self.points, window, self.pip)
+                self.window = table.window
+                self.rows = table.rows
+                if self.path is not None:
+                    self.save(self.path)
+            return FixedBaseTable._from_rows(self.rows[:size], self.window, self.pip)
+
+    def vector(self) -> "GeneratorVector":
+        """Returns an unbounded GeneratorVector of the set"""
+        return GeneratorVector(self)
+
+    def save(self, path: str):
+        """Writes the set to path, atomically"""
+        name = self.curve.name.encode()
+        parts = [
+            MAGIC,
+            LENGTH.pack(len(name)),
+            name,
+            LENGTH.pack(len(self.seed)),
+            self.seed,
+            COUNTS.pack(len(self.points), self.window or 0),
+        ]
+        points = [_point_to_bytes(P) for P in self.points]
+        for row in self.rows:
+            points += [_point_to_bytes(P) for P in row[1:]]
+        points = b"".join(points)
+        parts += [sha256(points).digest(), points]
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(parts))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, curve=CURVE, check: int = 2) -> "GeneratorSet":
+        """
+        Reads a set saved to path. The points are checked against the digest of the file
+        and to be on the curve, and the first and last check generators (and their table
+        rows) are derived again to check that they match the seed. The digest catches
+        corrupted files, check=len(set) derives everything again for untrusted ones.
+        """
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            with memoryview(data) as view:
+                gens = cls._read(view, curve, path)
+        gens.path = path
+        gens._check(check)
+        return gens
+
+    @classmethod
+    def _read(cls, view: memoryview, curve, path: str) -> "GeneratorSet":
+        if bytes(view[: len(MAGIC)]) != MAGIC:
+            raise ValueError("{} is not a generator file".format(path))
+        offset = len(MAGIC)
+        fields = []
+        for _ in range(2):
+            (length,) = LENGTH.unpack_from(view, offset)
+            offset += LENGTH.size
+            fields.append(bytes(view[offset : offset + length]))
+            offset += length
+        name, seed = fields
+        if name != curve.name.encode():
+            raise ValueError("{} holds generators of the curve {}".format(path, name.decode()))
+        count, window = COUNTS.unpack_from(view, offset)
+        offset += COUNTS.size
+        digest = bytes(view[offset : offset + DIGEST_SIZE])
+        offset += DIGEST_SIZE
+        gens = cls(seed, curve)
+        n_windows = (gens.pip.lamb + window - 1) // window if window else 1
+        if len(view) != offset + count * n_windows * POINT_SIZE:
+            raise ValueError("{} is truncated or corrupted".format(path))
+        if sha256(view[offset:]).digest() != digest:
+            raise ValueError("{} is corrupted".format(path))
+        gens.points = _read_points(view, offset, count, curve)
+        offset += count * POINT_SIZE
+        if window:
+            gens.window = window
+            for P in gens.points:
+                row = _read_points(view, offset, n_windows - 1, curve)
+                gens.rows.append([P] + row)
+                offset += (n_windows - 1) * POINT_SIZE
+        return gens
+
+    def _check(self, check: int):
+        n = len(self.points)
+        checked = sorted(set(range(min(check, n))) | set(range(max(n - check, 0), n)))
+        for i in checked:
+            if self.points[i] != derive_generator(self.seed, i, self.curve):
+                raise ValueError("The generators do not match their seed")
+        if self.rows:
+            expected = FixedBaseTable([self.points[i] for i in checked], self.window, self.pip)
+            if [self.rows[i] for i in checked] != expected.rows:
+                raise ValueError("The fixed-base table does not match the generators")
+
+
+class GeneratorVector:
+    """
+    The generators start to stop of a GeneratorSet, viewed without copying them.
+    Without stop, the vector is unbounded: slicing or indexing it derives the missing
+    generators of the set. Slicing a vector returns a vector over the same points, and
+    concatenating it returns a list, so it can be used where a list of points is expected.
+    AggregNIRangeProver, AggregRangeVerifier and BatchRangeVerifier take the prefix of
+    an unbounded vector that they need.
+    """
+
+    def __init__(self, gens: GeneratorSet, start: int = 0, stop: int = None):
+        self.gens = gens
+        self.start = start
+        self.stop = stop
+        if stop is not None:
+            gens.ensure(stop)
+
+    @property
+    def bounded(self) -> bool:
+        return self.stop is not None
+
+    def __len__(self):
+        stop = len(self.gens) if self.stop is None else self.stop
+        return stop - self.start
+
+    def __iter__(self):
+        points = self.gens.points
+        return (points[i] for i in range(self.start, self.start + len(self)))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            if i.step not in (None, 1):
+                return list(self)[i]
+            if self.stop is None and (i.stop is None or i.stop < 0):
+                raise IndexError("Unbounded generator vectors need an explicit stop")
+            start, stop, _ = i.indices(len(self) if self.stop is not None else i.stop)
+            return GeneratorVector(self.gens, self.start + start, self.start + max(start, stop))
+        if i < 0:
+            if self.stop is None:
+                raise IndexError("Unbounded generator vectors need a positive index")
+            i += len(self)
+        if self.stop is not None and not 0 <= i < len(self):
+            raise IndexError("Generator index out of range")
+        needed = self.start + i + 1
+        if needed > len(self.gens):
+            # The set grows by doubling, so that indexing the generators one after the
+            # other derives them in a few batches and saves a persisted set a few times
+            self.gens.ensure(max(needed, 2 * len(self.gens)))
+        return self.gens.points[self.start + i]
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def table(self) -> FixedBaseTable:
+        """FixedBaseTable of the generators of a bounded vector"""
+        return self.gens.table(self.stop)[self.start :]
+
+
+def generator_prefix(gs, size: int):
+    """Returns the first size generators of a GeneratorVector, other sequences are kept as is"""
+    return gs[:size] if isinstance(gs, GeneratorVector) else gs
+
+
+def _point_to_bytes(P: Point) -> bytes:
+    return P.x.to_bytes(COORD_SIZE, "big") + P.y.to_bytes(COORD_SIZE, "big")
+
+
+def _read_points(view: memoryview, offset: int, count: int, curve) -> List[Point]:
+    """Decodes count points at offset, the Point constructor checks that they are on the curve"""
+    points = []
+    for k in range(offset, offset + count * POINT_SIZE, POINT_SIZE):
+        x = int.from_bytes(view[k : k + COORD_SIZE], "big")
+        y = int.from_bytes(view[k + COORD_SIZE : k + POINT_SIZE], "big")
+        points.append(Point(x, y, curve))
+    return points
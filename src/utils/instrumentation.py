@@ -0,0 +1,306 @@
+"""
+Opt-in counting of the group and field operations, attributed to the phases of the protocols.
+
+    with count_operations() as report:
+        proof = prover.prove()
+    print(report)                      # one line of counts per phase
+    report.totals()["ec_add"]          # or report.as_dict() for a JSON-ready structure
+
+Counted operations:
+    ec_add, ec_double       point additions and doublings, affine (fastecdsa) or Jacobian
+    ec_scalar_mult          scalar multiplications of a single point
+    modp_mult               products of ModP elements and of ScalarVector entries
+    inversion               modular inversions computed by the backend (batch
+                            inversions count as one, hits of the inverse cache none)
+    hash, hash_bytes        blake2s digests (mod_hash, mod_hash_many, transcript
+                            challenges) and the bytes they absorbed
+    multiexp, multiexp_size multiexps and their total number of points
+
+Outside of count_operations nothing is counted and nothing is slower: the hot methods
+(ModP.__mul__, Point.__add__, ...) are only wrapped while a report is active. Coarser
+functions like mod_hash and the inversion backends check `active` themselves.
+
+Phases are named with phase(name), nested phases are joined with ";" as in the
+flame-graph folded format (e.g. "prove;IPA round 2"). Operations outside of any phase
+are attributed to the empty path "".
+
+Phases are also reported to tracers, which get a start and a stop event per phase:
+
+    flame = FlameGraph(sizes=True)
+    with tracing(flame):
+        proof = prover.prove()
+    open("prove.folded", "w").write(flame.folded())   # input of flamegraph.pl
+
+A tracer is any object with start(path, sizes) and stop(path, sizes) methods, see Tracer.
+"""
+
+from collections import Counter
+from time import perf_counter
+from typing import Dict, List
+
+# Report of the count_operations block in progress, None when not counting
+active = None
+
+# Names of the phases entered so far, innermost last
+_phases: List[str] = []
+
+# Tracers receiving the events of the phases, see add_tracer
+_tracers: list = []
+
+
+class OperationReport:
+    """Counts of operations per phase path, and sizes of the multiexps"""
+
+    def __init__(self):
+        self.phases: Dict[str, Counter] = {}
+        self.multiexp_sizes: Dict[str, List[int]] = {}
+
+    def count(self, op: str, n: int = 1):
+        path = ";".join(_phases)
+        counts = self.phases.get(path)
+        if counts is None:
+            counts = self.phases[path] = Counter()
+        counts[op] += n
+
+    def multiexp(self, size: int):
+        self.count("multiexp")
+        self.count("multiexp_size", size)
+        self.multiexp_sizes.setdefault(";".join(_phases), []).append(size)
+
+    def totals(self) -> Counter:
+        """Counts over all the phases"""
+        total = Counter()
+        for counts in self.phases.values():
+            total.update(counts)
+        return total
+
+    def phase(self, name: str) -> Counter:
+        """Counts of the phases named name, including their sub-phases"""
+        total = Counter()
+        for path, counts in self.phases.items():
+            if name in path.split(";"):
+                total.update(counts)
+        return total
+
+    def as_dict(self) -> dict:
+        return {
+            "phases": {path: dict(counts) for path, counts in self.phases.items()},
+            "totals": dict(self.totals()),
+            "multiexp_sizes": self.multiexp_sizes,
+        }
+
+    def __str__(self):
+        lines = []
+        for path, counts in list(self.phases.items()) + [("total", self.totals())]:
+            ops = " ".join("{}={}".format(op, n) for op, n in sorted(counts.items()))
+            lines.append("{:<32} {}".format(path or "(no phase)", ops))
+        return "\n".join(lines)
+
+
+class phase:
+    """
+    Context manager marking a phase of a protocol, e.g. with phase("A/S commit"): ...
+    sizes (e.g. n=64) describe the phase. Without an active report or a tracer it
+    does nothing.
+    """
+
+    __slots__ = ("name", "sizes", "entered", "tracers")
+
+    def __init__(self, name: str, **sizes: int):
+        self.name = name
+        self.sizes = sizes
+        self.entered = False
+        self.tracers = ()
+
+    def __enter__(self):
+        if active is not None or _tracers:
+            _phases.append(self.name)
+            self.entered = True
+            # The tracers started are the ones stopped, even if the list changes meanwhile
+            self.tracers = tuple(_tracers)
+            if self.tracers:
+                path = ";".join(_phases)
+                for tracer in self.tracers:
+                    tracer.start(path, self.sizes)
+        return self
+
+    def __exit__(self, *exc):
+        if self.entered:
+            if self.tracers:
+                path = ";".join(_phases)
+                for tracer in reversed(self.tracers):
+                    tracer.stop(path, self.sizes)
+                self.tracers = ()
+            _phases.pop()
+            self.entered = False
+
+
+class Tracer:
+    """
+    Receives the events of the phases: start when a phase is entered and stop when it
+    is left, with the path of the phase (e.g. "prove;IPA;IPA round 2") and its sizes.
+    Subclasses override the methods they need, e.g. to forward the events as spans.
+    Events come from every thread of the process.
+    """
+
+    def start(self, path: str, sizes: Dict[str, int]):
+        pass
+
+    def stop(self, path: str, sizes: Dict[str, int]):
+        pass
+
+
+def add_tracer(tracer: Tracer):
+    _tracers.append(tracer)
+
+
+def remove_tracer(tracer: Tracer):
+    _tracers.remove(tracer)
+
+
+class tracing:
+    """Context manager adding tracers for the duration of its block"""
+
+    def __init__(self, *tracers: Tracer):
+        self.tracers = tracers
+
+    def __enter__(self):
+        for tracer in self.tracers:
+            add_tracer(tracer)
+        return self.tracers[0] if len(self.tracers) == 1 else self.tracers
+
+    def __exit__(self, *exc):
+        for tracer in self.tracers:
+            remove_tracer(tracer)
+
+
+class FlameGraph(Tracer):
+    """
+    Tracer aggregating the time spent in each phase path over all the calls.
+    With sizes=True, the sizes are part of the frame names (e.g. "prove n=16 m=4"), so
+    that the calls of different sizes are kept apart.
+    """
+
+    def __init__(self, sizes: bool = False):
+        self.sizes = sizes
+        # path -> [calls, total time, self time], in seconds
+        self.spans: Dict[str, list] = {}
+        # Frames entered: [path, start time, time spent in the sub-phases]
+        self.stack: list = []
+
+    def _frame(self, path: str, sizes: Dict[str, int]) -> str:
+        name = path.rsplit(";", 1)[-1]
+        if self.sizes and sizes:
+            name += " " + " ".join("{}={}".format(k, v) for k, v in sizes.items())
+        return name if not self.stack else self.stack[-1][0] + ";" + name
+
+    def start(self, path: str, sizes: Dict[str, int]):
+        self.stack.append([self._frame(path, sizes), perf_counter(), 0.0])
+
+    def stop(self, path: str, sizes: Dict[str, int]):
+        frame, start, children = self.stack.pop()
+        elapsed = perf_counter() - start
+        if self.stack:
+            self.stack[-1][2] += elapsed
+        span = self.spans.setdefault(frame, [0, 0.0, 0.0])
+        span[0] += 1
+        span[1] += elapsed
+        span[2] += elapsed - children
+
+    def folded(self, unit: float = 1e-6) -> str:
+        """
+        The self time of every path in the folded format of flamegraph.pl and speedscope,
+        one "path value" line per path, in multiples of unit (microseconds by default)
+        """
+        return "".join(
+            "{} {}\n".format(path, round(self_time / unit))
+            for path, (_, _, self_time) in self.spans.items()
+            if round(self_time / unit)
+        )
+
+    def __str__(self):
+        lines = ["{:<48} {:>8} {:>12} {:>12}".format("phase", "calls", "total ms", "self ms")]
+        for path, (calls, total, self_time) in self.spans.items():
+            lines.append(
+                "{:<48} {:>8} {:>12.3f} {:>12.3f}".format(path, calls, total * 1e3, self_time * 1e3)
+            )
+        return "\n".join(lines)
+
+
+def _wrap(f, counter):
+    def wrapper(*args, **kwargs):
+        for op, n in counter(*args):
+            active.count(op, n)
+        return f(*args, **kwargs)
+
+    wrapper.__wrapped__ = f
+    return wrapper
+
+
+def _point_add(P, Q):
+    return [("ec_double" if P == Q else "ec_add", 1)]
+
+
+def _vector_mult(v, y, *_):
+    return [("modp_mult", len(v))]
+
+
+def _patches() -> list:
+    """(owner, attribute, counter) of the wrapped methods, counter(*args) -> [(op, n)]"""
+    from fastecdsa.point import Point
+
+    from src.group import JacobianEC
+    from src.pippenger import FixedBasePoint
+    from . import utils
+
+    return [
+        (utils.ModP, "__mul__", lambda x, y: [] if isinstance(y, Point) else [("modp_mult", 1)]),
+        (utils.ScalarVector, "__mul__", _vector_mult),
+        (utils.ScalarVector, "inner", _vector_mult),
+        (utils.ScalarVector, "fold", lambda v, *_: [("modp_mult", len(v))]),
+        (utils.ScalarVector, "powers", lambda cls, x, n, p: [("modp_mult", n)]),
+        (Point, "__add__", _point_add),
+        (Point, "__mul__", lambda *_: [("ec_scalar_mult", 1)]),
+        (FixedBasePoint, "__mul__", lambda *_: [("ec_scalar_mult", 1)]),
+        (JacobianEC, "_add", lambda *_: [("ec_add", 1)]),
+        (JacobianEC, "_madd", lambda *_: [("ec_add", 1)]),
+        (JacobianEC, "_double", lambda *_: [("ec_double", 1)]),
+        (JacobianEC, "add_affine_many", lambda J, pairs: [("ec_add", len(pairs))]),
+    ]
+
+
+class count_operations:
+    """
+    Context manager counting the operations done in its block, see the module docstring.
+    Blocks cannot be nested, and counting is global to the process: operations of its
+    other threads are counted too, those of worker processes are not.
+    """
+
+    def __init__(self):
+        self.report = OperationReport()
+        self.saved = []
+
+    def __enter__(self) -> OperationReport:
+        global active
+        if active is not None:
+            raise RuntimeError("Operations are already being counted")
+        active = self.report
+        for owner, name, counter in _patches():
+            original = owner.__dict__[name]
+            if isinstance(original, classmethod):
+                wrapped = classmethod(_wrap(original.__func__, counter))
+            else:
+                wrapped = _wrap(original, counter)
+            self.saved.append((owner, name, original, wrapped))
+            setattr(owner, name, wrapped)
+        return self.report
+
+    def __exit__(self, *exc):
+        global active
+        active = None
+        for owner, name, original, wrapped in reversed(self.saved):
+            # An attribute replaced in the block keeps its new value
+            if owner.__dict__.get(name) is wrapped:
+                setattr(owner, name, original)
+        self.saved = []
+
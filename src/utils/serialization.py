@@ -0,0 +1,118 @@
+"""
+Binary encoding of the proofs.
+Every proof is encoded as a 6 bytes header (format version, kind of proof and length of
+the body as a big-endian uint32) followed by its body. Points are compressed in 33 bytes
+(see point_to_bytes) and scalars take 32 big-endian bytes. Transcripts are not encoded,
+only their seeds: the challenges are recomputed when decoding.
+"""
+
+import struct
+
+from .utils import ModP, Point, bytes_to_point, point_to_bytes
+
+FORMAT_VERSION = 1
+SCALAR_SIZE = 32
+POINT_SIZE = 33
+HEADER = struct.Struct(">BBI")
+
+# Kinds of proofs
+RANGE_PROOF = 1
+INNER_PRODUCT_PROOF_1 = 2
+INNER_PRODUCT_PROOF_2 = 3
+
+
+class ProofWriter:
+    """Accumulates the body of an encoded proof"""
+
+    def __init__(self):
+        self.parts = []
+
+    def scalar(self, x):
+        x = x if isinstance(x, int) else x.x % x.p
+        self.parts.append(x.to_bytes(SCALAR_SIZE, "big"))
+
+    def int(self, x: int):
+        """An unsigned int below 2^256, read back by ProofReader.int"""
+        if not 0 <= x < 1 << (8 * SCALAR_SIZE):
+            raise ValueError("Integer out of range: {}".format(x))
+        self.parts.append(x.to_bytes(SCALAR_SIZE, "big"))
+
+    def point(self, P: Point):
+        self.parts.append(point_to_bytes(P))
+
+    def points(self, Ps):
+        for P in Ps:
+            self.point(P)
+
+    def byte(self, n: int):
+        self.parts.append(bytes([n]))
+
+    def body(self) -> bytes:
+        return b"".join(self.parts)
+
+    def to_bytes(self, kind: int) -> bytes:
+        body = self.body()
+        return HEADER.pack(FORMAT_VERSION, kind, len(body)) + body
+
+
+class ProofReader:
+    """Reads the body of an encoded proof from a memoryview, without copying it"""
+
+    def __init__(self, data, curve, prime):
+        self.view = memoryview(data)
+        self.offset = 0
+        self.curve = curve
+        self.prime = prime
+
+    @classmethod
+    def from_bytes(cls, data, kind: int, curve, prime) -> "ProofReader":
+        """Checks the header of a single encoded proof and returns a reader of its body"""
+        view = memoryview(data)
+        found, body, end = read_header(view, 0)
+        if found != kind:
+            raise ValueError("Expected a proof of kind {}, got {}".format(kind, found))
+        if end != len(view):
+            raise ValueError("Trailing bytes after the proof")
+        return cls(body, curve, prime)
+
+    def _take(self, n: int) -> memoryview:
+        if self.offset + n > len(self.view):
+            raise ValueError("Truncated proof")
+        chunk = self.view[self.offset : self.offset + n]
+        self.offset += n
+        return chunk
+
+    def scalar(self) -> ModP:
+        return ModP(int.from_bytes(self._take(SCALAR_SIZE), "big"), self.prime)
+
+    def int(self) -> int:
+        return int.from_bytes(self._take(SCALAR_SIZE), "big")
+
+    def point(self) -> Point:
+        return bytes_to_point(self._take(POINT_SIZE), self.curve)
+
+    def points(self, n: int) -> list:
+        return [self.point() for _ in range(n)]
+
+    def byte(self) -> int:
+        return self._take(1)[0]
+
+    def end(self):
+        if self.offset != len(self.view):
+            raise ValueError("Trailing bytes in the proof body")
+
+
+def read_header(view: memoryview, offset: int):
+    """
+    Parses the header of the proof at offset in view.
+    Returns (kind, view of the body, offset of the end of the proof).
+    """
+    if offset + HEADER.size > len(view):
+        raise ValueError("Truncated proof header")
+    version, kind, length = HEADER.unpack_from(view, offset)
+    if version != FORMAT_VERSION:
+        raise ValueError("Unsupported proof format version {}".format(version))
+    start = offset + HEADER.size
+    if start + length > len(view):
+        raise ValueError("Truncated proof")
+    return kind, view[start : start + length], start + length
@@ -1,7 +1,10 @@
+from hashlib import blake2s
+
 from fastecdsa.point import Point
 from src.group import EC
 
-from .utils import ModP, mod_hash
+from . import instrumentation
+from .utils import ModP, mod_hash, CAIRO_PRIME
 
 
 # Transcript now uses a mod hash to separate and hash
@@ -10,10 +13,50 @@ class Transcript:
     Transcript class.
     Contains all parameters used to generate randomness using Fiat-Shamir
     Every entity is an integer and an element in a list
+    The digest list keeps the felt layout used by convert_to_cairo. By default the
+    transcript also absorbs every element in a running blake2s state as it is added,
+    and challenges are squeezed from a copy of that state instead of hashing the whole
+    digest again. Both give the same challenges, incremental=False rehashes the digest.
+    The digest must only be extended through the add_* methods and extend.
     """
 
-    def __init__(self, seed=0):
+    def __init__(self, seed=0, incremental=True):
+        # Seeds are felts like the other digest elements
+        if isinstance(seed, bytes):
+            seed = int.from_bytes(seed, "little")
+        seed %= CAIRO_PRIME
         self.digest = [seed]
+        self.incremental = incremental
+        self.state = blake2s()
+        Transcript.absorb(self.state, seed)
+
+    def absorb(state, x):
+        """Absorbs a digest element in the blake2s state, as mod_hash would hash it"""
+        for e in Transcript.digest_to_int_list([x]):
+            state.update(e.to_bytes(8 * 4, "little"))
+            if instrumentation.active is not None:
+                instrumentation.active.count("hash_bytes", 8 * 4)
+
+    def squeeze(state, p) -> ModP:
+        """Returns the hash of what was absorbed in state so far, leaving state untouched"""
+        if instrumentation.active is not None:
+            instrumentation.active.count("hash")
+        return ModP(int.from_bytes(state.copy().digest(), "little") % p, p)
+
+    def prefix_hashes(digest: list, positions: list[int], p) -> list[ModP]:
+        """
+        Returns the hashes of digest[:i] for the increasing positions i, i.e. the challenges
+        expected at these positions, absorbing the digest in a single pass
+        """
+        state = blake2s()
+        hashes = []
+        absorbed = 0
+        for pos in positions:
+            for x in digest[absorbed:pos]:
+                Transcript.absorb(state, x)
+            absorbed = pos
+            hashes.append(Transcript.squeeze(state, p))
+        return hashes
 
     def convert_to_cairo(ids, memory, segments, digest: list):
         """
@@ -39,6 +82,7 @@ class Transcript:
     def add_point(self, g: Point):
         """Add an elliptic curve point to the transcript"""
         self.digest += [g]
+        Transcript.absorb(self.state, g)
         # Up next is get the verifier to change the way it checks the transcript for Python
         # (helps with testing purposes...)
 
@@ -50,8 +94,17 @@ class Transcript:
     def add_number(self, x):
         """Add a number to the transcript"""
         self.digest += [x]
+        Transcript.absorb(self.state, x)
+
+    def extend(self, digest: list):
+        """Add the elements of another digest to the transcript"""
+        self.digest += digest
+        for x in digest:
+            Transcript.absorb(self.state, x)
 
     def get_modp(self, p):
+        if self.incremental:
+            return Transcript.squeeze(self.state, p)
         return Transcript.digest_to_hash(self.digest, p)
 
     def digest_to_hash(digest: list, p):
@@ -59,6 +112,14 @@ class Transcript:
         int_list = Transcript.digest_to_int_list(digest)
         return mod_hash(int_list, p)
 
+    def to_bytes(self) -> bytes:
+        """Serialize the digest, e.g. to derive prover randomness from it"""
+        return Transcript.digest_to_bytes(self.digest)
+
+    def digest_to_bytes(digest: list) -> bytes:
+        int_list = Transcript.digest_to_int_list(digest)
+        return b"".join(e.to_bytes(8 * 4, "little") for e in int_list)
+
     def digest_to_int_list(digest: list) -> list[int]:
         int_list = []
         for i in digest:
@@ -1,23 +1,106 @@
 """Contains various utilities"""
 
+import os
+from functools import lru_cache
 from hashlib import blake2s
 from typing import List, Union
 
 
 from fastecdsa.point import Point
 
+from . import instrumentation
+
+try:
+    import gmpy2
+except ImportError:  # gmpy2 is an optional inversion backend
+    gmpy2 = None
+
 
 
 CAIRO_PRIME = 2 ** 251 + 17 * 2 ** 192 + 1
 
 
 def egcd(a, b):
-    """Extended euclid algorithm"""
-    if a == 0:
-        return (b, 0, 1)
-    else:
-        g, y, x = egcd(b % a, a)
-        return (g, x - (b // a) * y, y)
+    """Extended euclid algorithm, returns (g, x, y) such that a*x + b*y = g"""
+    x0, x1, y0, y1 = 1, 0, 0, 1
+    while b:
+        q = a // b
+        a, b = b, a - q * b
+        x0, x1 = x1, x0 - q * x1
+        y0, y1 = y1, y0 - q * y1
+    return (a, x0, y0)
+
+
+def _inverse_egcd(x: int, p: int) -> int:
+    g, a, _ = egcd(x, p)
+    if g != 1:
+        raise Exception("modular inverse does not exist")
+    return a % p
+
+
+def _inverse_pow(x: int, p: int) -> int:
+    try:
+        return pow(x, -1, p)
+    except ValueError:
+        raise Exception("modular inverse does not exist")
+
+
+def _inverse_gmpy2(x: int, p: int) -> int:
+    try:
+        return int(gmpy2.invert(x, p))
+    except ZeroDivisionError:
+        raise Exception("modular inverse does not exist")
+
+
+INVERSE_BACKENDS = {
+    "egcd": _inverse_egcd,
+    "pow": _inverse_pow,
+    "gmpy2": _inverse_gmpy2,
+}
+INVERSE_CACHE_SIZE = 1024
+# Selected backend, and the same behind the LRU cache of mod_inverse
+_backend = None
+_inverse = None
+
+
+def set_inverse_backend(name: str, cache_size: int = INVERSE_CACHE_SIZE):
+    """
+    Selects the modular inversion backend.
+    The results of mod_inverse (hence ModP.inv) are kept in an LRU cache of cache_size
+    entries (0 disables it), so repeated challenges like y, x or z are only inverted
+    once. One-off inversions (batch inversions, Jacobian normalizations) bypass it.
+    """
+    global _backend, _inverse
+    if name not in INVERSE_BACKENDS:
+        raise ValueError("Unknown inversion backend: {}".format(name))
+    if name == "gmpy2" and gmpy2 is None:
+        raise ImportError("The gmpy2 inversion backend requires gmpy2")
+    _backend = INVERSE_BACKENDS[name]
+    _inverse = lru_cache(maxsize=cache_size)(_call_backend) if cache_size else _call_backend
+
+
+def _call_backend(x: int, p: int) -> int:
+    # Counted here rather than in mod_inverse, so that the cache hits are not
+    if instrumentation.active is not None:
+        instrumentation.active.count("inversion")
+    return _backend(x, p)
+
+
+def mod_inverse(x: int, p: int) -> int:
+    """Returns the inverse of x mod p with the selected backend, through the cache"""
+    return _inverse(x % p, p)
+
+
+def _inverse_raw(x: int, p: int) -> int:
+    """Same as mod_inverse without the cache, for values unlikely to be inverted again"""
+    return _call_backend(x % p, p)
+
+
+# The backend can be chosen at import with the BULLETPROOFS_INVERSE_BACKEND variable
+DEFAULT_INVERSE_BACKEND = os.environ.get(
+    "BULLETPROOFS_INVERSE_BACKEND", "pow" if gmpy2 is None else "gmpy2"
+)
+set_inverse_backend(DEFAULT_INVERSE_BACKEND)
 
 
 class ModP:
@@ -69,11 +152,7 @@ class ModP:
 
     def inv(self):
         """Returns the modular inverse"""
-        g, a, _ = egcd(self.x, self.p)
-        if g != 1:
-            raise Exception("modular inverse does not exist")
-        else:
-            return ModP(a % self.p, self.p)
+        return ModP(mod_inverse(self.x, self.p), self.p)
     
     def to_uint256(self):
         x = self.x % self.p
@@ -94,36 +173,286 @@ class ModP:
         return str(self.x)
 
 
+def batch_inverse(xs: List[ModP]) -> List[ModP]:
+    """
+    Inverts all the elements of xs with Montgomery's trick:
+    a single modular inversion and 3(n-1) multiplications.
+    """
+    if not xs:
+        return []
+    p = xs[0].p
+    return [ModP(x, p) for x in batch_inverse_ints([x.x for x in xs], p)]
+
+
+def batch_inverse_ints(xs: List[int], p: int) -> List[int]:
+    """Same as batch_inverse on a list of ints mod p"""
+    n = len(xs)
+    if n == 0:
+        return []
+    prefix = [1] * n
+    acc = 1
+    for i, x in enumerate(xs):
+        prefix[i] = acc
+        acc = acc * x % p
+    acc_inv = _inverse_raw(acc, p)
+    out = [0] * n
+    for i in range(n - 1, -1, -1):
+        out[i] = acc_inv * prefix[i] % p
+        acc_inv = acc_inv * xs[i] % p
+    return out
+
+
+class _SquareRoots:
+    """
+    Square roots modulo a prime p with p - 1 = 2^s * q, q odd.
+    Tonelli-Shanks needs up to s^2 / 2 squarings, which is slow for the Starknet prime
+    (s = 192). Instead, the discrete log of a^q in the subgroup of order 2^s is found
+    w bits at a time with precomputed tables, for about w * (s / w)^2 / 2 squarings.
+    """
+
+    def __init__(self, p: int):
+        s, q = 0, p - 1
+        while q % 2 == 0:
+            s, q = s + 1, q // 2
+        w = max(d for d in range(1, 9) if s % d == 0)
+        z = 2
+        while pow(z, (p - 1) // 2, p) != p - 1:
+            z += 1
+        self.p, self.s, self.q, self.w = p, s, q, w
+        self.n_digits = s // w
+        # tables[k][d] = g^(-d * 2^(w*k)) with g = z^q of order 2^s
+        self.tables = []
+        gk = pow(pow(z, q, p), -1, p)
+        for _ in range(self.n_digits):
+            row = [1]
+            for _ in range((1 << w) - 1):
+                row.append(row[-1] * gk % p)
+            self.tables.append(row)
+            gk = pow(gk, 1 << w, p)
+        # g^(d * 2^(s-w)) -> d
+        last = pow(self.tables[-1][1], -1, p) if self.n_digits else 1
+        self.digits = {pow(last, d, p): d for d in range(1 << w)}
+
+    def sqrt(self, a: int) -> int:
+        """Returns a square root of a mod p, raises ValueError if there is none"""
+        p, w = self.p, self.w
+        a %= p
+        if a == 0:
+            return 0
+        b = pow(a, (self.q - 1) // 2, p)
+        r = a * b % p
+        t = r * b % p
+        # Find e such that a^q = t = g^e, one w-bit digit at a time
+        e = 0
+        for k in range(self.n_digits):
+            u = t
+            for _ in range(self.s - w * (k + 1)):
+                u = u * u % p
+            d = self.digits[u]
+            t = t * self.tables[k][d] % p
+            e += d << (w * k)
+        if e & 1:
+            raise ValueError("{} is not a square mod {}".format(a, p))
+        # a^((q+1)/2) * g^(-e/2) squares to a
+        e //= 2
+        mask = (1 << w) - 1
+        for k in range(self.n_digits):
+            r = r * self.tables[k][(e >> (w * k)) & mask] % p
+        return r
+
+
+@lru_cache(maxsize=None)
+def _square_roots(p: int) -> _SquareRoots:
+    return _SquareRoots(p)
+
+
+def mod_sqrt(a: int, p: int) -> int:
+    """Returns a square root of a modulo the prime p"""
+    return _square_roots(p).sqrt(a)
+
+
+def point_to_bytes(P: Point) -> bytes:
+    """
+    Compressed encoding of P in 33 bytes: a flag byte, 2 or 3 with the parity of y
+    (0 for the point at infinity), followed by x as 32 big-endian bytes.
+    """
+    if P == Point.IDENTITY_ELEMENT:
+        return bytes(33)
+    return bytes([2 | (P.y & 1)]) + P.x.to_bytes(32, "big")
+
+
+def bytes_to_point(data, curve) -> Point:
+    """Decodes a point of curve encoded with point_to_bytes"""
+    if len(data) != 33:
+        raise ValueError("A point is encoded in 33 bytes")
+    flag = data[0]
+    x = int.from_bytes(data[1:], "big")
+    if flag == 0 and x == 0:
+        return Point.IDENTITY_ELEMENT
+    if flag not in (2, 3) or x >= curve.p:
+        raise ValueError("Invalid point encoding")
+    y = mod_sqrt(x * x * x + curve.a * x + curve.b, curve.p)
+    if y & 1 != flag & 1:
+        y = curve.p - y
+    return Point(x, y, curve)
+
+
 def mod_hash(msg: Union[bytes, list[int]], p: int) -> ModP:
     """
     Takes a message and a prime and returns a hash in ModP using blake2s.
+    A list of ints is hashed as the concatenation of their 32 bytes little-endian encodings.
     """
-    digest = None
-    if isinstance(msg, bytes):
-        digest = blake2s(msg).digest()
-    else:
-        _bytes = bytes([])
-        for e in msg:
-            _bytes += e.to_bytes(8 * 4, "little")
-        digest = blake2s(_bytes).digest()
-
-    int_list = []
-    digest = list(digest)
-    # Digest is a list of 8 32 bit words
-    for pos in range(0, len(digest), 4):
-        int_list += [int.from_bytes(digest[pos: pos + 4], 'little')]
-
-    ret = 0
-    for i, elem in enumerate(int_list):
-        ret += elem * (2 ** (32 * i))
-    return ModP(ret % p, p)
+    if not isinstance(msg, bytes):
+        msg = b"".join(e.to_bytes(8 * 4, "little") for e in msg)
+    if instrumentation.active is not None:
+        instrumentation.active.count("hash")
+        instrumentation.active.count("hash_bytes", len(msg))
+    # The digest is read as a little-endian integer
+    return ModP(int.from_bytes(blake2s(msg).digest(), "little") % p, p)
+
+
+def mod_hash_many(prefix: bytes, count: int, p: int) -> "ScalarVector":
+    """
+    Derives count scalars mod p from prefix: the i-th one is the blake2s hash of
+    prefix followed by i as 4 little-endian bytes. prefix is only absorbed once, every
+    scalar is squeezed from a copy of that state.
+    """
+    if instrumentation.active is not None:
+        instrumentation.active.count("hash", count)
+        instrumentation.active.count("hash_bytes", len(prefix) + 4 * count)
+    state = blake2s(prefix)
+    out = [0] * count
+    for i in range(count):
+        h = state.copy()
+        h.update(i.to_bytes(4, "little"))
+        out[i] = int.from_bytes(h.digest(), "little") % p
+    return ScalarVector._raw(out, p)
+
 
 def inner_product(a: List[ModP], b: List[ModP]) -> ModP:
     """Inner-product of vectors in Z_p"""
     assert len(a) == len(b)
+    if isinstance(a, ScalarVector) or isinstance(b, ScalarVector):
+        if not isinstance(a, ScalarVector):
+            a = ScalarVector(a, b.p)
+        if not isinstance(b, ScalarVector):
+            b = ScalarVector(b, a.p)
+        return a.inner(b)
     return sum([ai * bi for ai, bi in zip(a, b)], ModP(0, a[0].p))
 
 
+class ScalarVector:
+    """
+    Vector of integers mod p, stored as a list of ints sharing the same modulus.
+    Vector operations do a single modular reduction per element.
+    Indexing returns ModP elements, slicing returns ScalarVectors.
+    Note that + is the element-wise addition, not the list concatenation.
+    """
+
+    __slots__ = ("xs", "p")
+
+    def __init__(self, xs, p: int):
+        self.xs = [x % p if isinstance(x, int) else x.x % p for x in xs]
+        self.p = p
+
+    @classmethod
+    def _raw(cls, xs: List[int], p: int) -> "ScalarVector":
+        """Wraps a list of already reduced ints without copying it"""
+        v = cls.__new__(cls)
+        v.xs = xs
+        v.p = p
+        return v
+
+    @classmethod
+    def powers(cls, x, n: int, p: int) -> "ScalarVector":
+        """Returns (1, x, x^2, ..., x^(n-1))"""
+        x = x % p if isinstance(x, int) else x.x % p
+        xs = [1] * n
+        for i in range(1, n):
+            xs[i] = xs[i - 1] * x % p
+        return cls._raw(xs, p)
+
+    @classmethod
+    def concat(cls, vectors: List["ScalarVector"]) -> "ScalarVector":
+        xs = []
+        for v in vectors:
+            xs += v.xs
+        return cls._raw(xs, vectors[0].p)
+
+    def _scalar(self, y) -> int:
+        if isinstance(y, int):
+            return y
+        assert self.p == y.p
+        return y.x
+
+    def __len__(self):
+        return len(self.xs)
+
+    def __iter__(self):
+        p = self.p
+        return (ModP(x, p) for x in self.xs)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return ScalarVector._raw(self.xs[i], self.p)
+        return ModP(self.xs[i], self.p)
+
+    def __add__(self, y):
+        p = self.p
+        if isinstance(y, ScalarVector):
+            assert p == y.p and len(self) == len(y)
+            return ScalarVector._raw([(a + b) % p for a, b in zip(self.xs, y.xs)], p)
+        y = self._scalar(y)
+        return ScalarVector._raw([(a + y) % p for a in self.xs], p)
+
+    def __sub__(self, y):
+        p = self.p
+        if isinstance(y, ScalarVector):
+            assert p == y.p and len(self) == len(y)
+            return ScalarVector._raw([(a - b) % p for a, b in zip(self.xs, y.xs)], p)
+        y = self._scalar(y)
+        return ScalarVector._raw([(a - y) % p for a in self.xs], p)
+
+    def __neg__(self):
+        p = self.p
+        return ScalarVector._raw([-a % p for a in self.xs], p)
+
+    def __mul__(self, y):
+        """Hadamard product with a vector, or multiplication by a scalar"""
+        p = self.p
+        if isinstance(y, ScalarVector):
+            assert p == y.p and len(self) == len(y)
+            return ScalarVector._raw([a * b % p for a, b in zip(self.xs, y.xs)], p)
+        y = self._scalar(y)
+        return ScalarVector._raw([a * y % p for a in self.xs], p)
+
+    def __rmul__(self, y):
+        return self * y
+
+    def __eq__(self, y):
+        return isinstance(y, ScalarVector) and self.p == y.p and self.xs == y.xs
+
+    def inner(self, y: "ScalarVector") -> ModP:
+        """Inner-product with y"""
+        assert self.p == y.p and len(self) == len(y)
+        return ModP(sum(a * b for a, b in zip(self.xs, y.xs)) % self.p, self.p)
+
+    def fold(self, x, y) -> "ScalarVector":
+        """Returns x * self[:n/2] + y * self[n/2:]"""
+        p = self.p
+        x, y = self._scalar(x), self._scalar(y)
+        np = len(self.xs) // 2
+        return ScalarVector._raw(
+            [(x * a + y * b) % p for a, b in zip(self.xs[:np], self.xs[np:])], p
+        )
+
+    def __str__(self):
+        return str(self.xs)
+
+    def __repr__(self):
+        return str(self.xs)
+
+
 def set_ec_points(ids, segments, memory, name: str, ps: list[Point]):
     points_cairo = segments.add()
     ids.get_or_set_value(name, points_cairo)